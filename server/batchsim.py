@@ -0,0 +1,148 @@
+import math
+import random
+
+import numpy as np
+
+from simulation import (
+    SCREEN_WIDTH, SCREEN_HEIGHT, PADDLE_WIDTH, PADDLE_HEIGHT, PADDLE_Y, SQUARE_SIZE,
+    INITIAL_LIVES, TICK_RATE, FALL_SPEED, PADDLE_SPEED, SPAWN_INTERVAL,
+)
+
+
+class BatchSimulator:
+    """
+    Advances many independent matches in lockstep, one NumPy operation per
+    rule per tick for the whole batch.
+
+    Game i follows exactly the rules of simulation.GameState: given the same
+    tick rate, a GameState seeded with seeds[i] and given the same
+    paddle moves, it reaches the same paddle position, score, lives and
+    game_over on every tick. Square positions use the same base-plus-fall-
+    offset arithmetic as SquareStore so floating point results match bit for
+    bit. fall_speed, paddle_width and spawn_interval can be overridden for
+    balancing experiments (GameState always uses the module constants).
+
+    Squares live in per-game ring buffers of `capacity` slots, sized so the
+    oldest slot is always dead by the time it is reused.
+    """
+    def __init__(self, games, tick_rate=TICK_RATE, seeds=None, fall_speed=FALL_SPEED,
+                 paddle_width=PADDLE_WIDTH, spawn_interval=SPAWN_INTERVAL):
+        self.games = games
+        self.tick_rate = tick_rate
+        self.fall_step = fall_speed / tick_rate
+        self.paddle_width = paddle_width
+        self.spawn_interval_ticks = max(1, round(spawn_interval * tick_rate))
+        # A square spawns at y >= -100 and is gone once its top passes the bottom edge
+        lifetime = math.ceil((SCREEN_HEIGHT + 100) / self.fall_step) + 1
+        self.capacity = lifetime // self.spawn_interval_ticks + 2
+
+        if seeds is None:
+            seeds = [random.randrange(2 ** 32) for _ in range(games)]
+        self.rngs = [random.Random(seed) for seed in seeds]
+
+        self.tick = 0
+        self.paddle_x = np.zeros(games)
+        self.score = np.zeros(games, dtype=np.int64)
+        self.lives = np.zeros(games, dtype=np.int64)
+        self.game_over = np.zeros(games, dtype=bool)
+        self.ticks_played = np.zeros(games, dtype=np.int64) # Ticks until game over, per match
+        self.spawn_countdown = np.zeros(games, dtype=np.int64)
+        self.spawned = np.zeros(games, dtype=np.int64) # Squares spawned, also the next ring slot
+        self.offset = np.zeros(games) # Distance fallen since the match started
+        self.x = np.zeros((games, self.capacity))
+        self.base = np.zeros((games, self.capacity)) # Square y minus the fall offset
+        self.alive = np.zeros((games, self.capacity), dtype=bool)
+        self.reset()
+
+    def reset(self, mask=None):
+        """Starts new matches in the games selected by the boolean `mask` (all by default)."""
+        if mask is None:
+            mask = np.ones(self.games, dtype=bool)
+        self.paddle_x[mask] = float(SCREEN_WIDTH // 2 - self.paddle_width // 2)
+        self.score[mask] = 0
+        self.lives[mask] = INITIAL_LIVES
+        self.game_over[mask] = False
+        self.ticks_played[mask] = 0
+        self.spawn_countdown[mask] = self.spawn_interval_ticks
+        self.spawned[mask] = 0
+        self.offset[mask] = 0.0
+        self.alive[mask] = False
+
+    def _spawn(self, games):
+        """Spawns one square in each of the given games, drawing from each game's own rng."""
+        slots = self.spawned[games] % self.capacity
+        xs = np.empty(len(games))
+        ys = np.empty(len(games))
+        for i, g in enumerate(games.tolist()):
+            rng = self.rngs[g]
+            xs[i] = rng.randrange(0, SCREEN_WIDTH - SQUARE_SIZE)
+            ys[i] = rng.randrange(-100, -SQUARE_SIZE)
+        self.x[games, slots] = xs
+        self.base[games, slots] = ys - self.offset[games]
+        self.alive[games, slots] = True
+        self.spawned[games] += 1
+
+    def step(self, paddle_moves=None):
+        """
+        Advances every game by one tick. `paddle_moves` holds the pixels each
+        paddle moves this tick (None for no movement). Finished games stay
+        frozen until reset.
+        """
+        self.tick += 1
+        active = ~self.game_over
+        self.ticks_played += active
+
+        self.spawn_countdown -= active
+        spawning = active & (self.spawn_countdown <= 0)
+        if spawning.any():
+            self.spawn_countdown[spawning] = self.spawn_interval_ticks
+            self._spawn(np.flatnonzero(spawning))
+
+        # Keep paddles within screen bounds
+        if paddle_moves is not None:
+            moved = np.minimum(np.maximum(self.paddle_x + paddle_moves, 0.0),
+                               float(SCREEN_WIDTH - self.paddle_width))
+            self.paddle_x = np.where(active, moved, self.paddle_x)
+
+        self.offset += np.where(active, self.fall_step, 0.0)
+        offset = self.offset[:, None]
+        alive = self.alive & active[:, None]
+
+        # Caught squares score a point (same band and overlap tests as SquareStore.catch)
+        left = self.paddle_x[:, None]
+        in_band = (self.base > (PADDLE_Y - SQUARE_SIZE) - offset) & (self.base < (PADDLE_Y + PADDLE_HEIGHT) - offset)
+        clear = (self.x >= left + self.paddle_width) | (self.x + SQUARE_SIZE <= left)
+        caught = alive & in_band & ~clear
+        self.score += caught.sum(axis=1)
+
+        # Squares that fell off screen cost a life
+        missed = alive & ~caught & (self.base > SCREEN_HEIGHT - offset)
+        self.lives -= missed.sum(axis=1)
+        self.alive &= ~(caught | missed)
+
+        self.game_over |= self.lives <= 0
+
+
+def chase_policy(sim):
+    """
+    Reference paddle policy for balancing runs: move at desktop arrow-key
+    speed towards the lowest live square, or stay put if there is none.
+    """
+    y = np.where(sim.alive, sim.base + sim.offset[:, None], -np.inf)
+    lowest = y.argmax(axis=1)
+    target = sim.x[np.arange(sim.games), lowest] + SQUARE_SIZE / 2 - sim.paddle_width / 2
+    target = np.where(sim.alive.any(axis=1), target, sim.paddle_x)
+    step = PADDLE_SPEED / sim.tick_rate
+    return np.clip(target - sim.paddle_x, -step, step)
+
+
+def run_matches(games, policy=chase_policy, max_ticks=100_000, **options):
+    """
+    Plays `games` matches to game over (or `max_ticks`) with `policy`, which
+    maps the simulator to an array of paddle moves. Returns the simulator so
+    scores, lives and ticks_played can be inspected.
+    """
+    sim = BatchSimulator(games, **options)
+    while sim.tick < max_ticks and not sim.game_over.all():
+        sim.step(policy(sim))
+    return sim
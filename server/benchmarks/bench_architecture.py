@@ -0,0 +1,139 @@
+"""
+Benchmark: tick jitter and server CPU, threaded vs single-thread vs gateway processes.
+
+Starts the server in a child process, either as serve() runs it (the
+WebSocket server on its own thread and event loop, the simulation on the
+main thread), with --single-thread (the simulation as a task on the
+server's event loop) or with --gateways (the simulation alone in its
+process, --gateways gateway processes serving the clients through shared
+memory), and connects --clients web clients from this process. Each client
+reads every state frame and sends a tick-stamped control every
+--input-interval seconds. Reports the server's CPU use (gateways included)
+and the gaps between simulation passes (ideally 1000/TICK_RATE ms each).
+On one core the gateways still share the CPU with the simulation, but the
+kernel preempts them on time rather than waiting for the GIL.
+
+Usage (from the server directory):
+    python benchmarks/bench_architecture.py [--clients 10,100,500] [--seconds 5] [--squares 0] [--gateways 1]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import websockets
+
+from simulation import CLIENT_FRAME, TICK_RATE, swarm_options
+
+PORT = 5101
+
+
+def run_server(mode, seconds, squares, gateways, results):
+    """Child process: serves for `seconds` and puts (CPU seconds, pass gaps in ms) on `results`."""
+    sys.stdout = open(os.devnull, 'w') # Connection logging
+    import catchthesquares as cts
+    game_options = swarm_options(squares) if squares else None
+    cts.rooms.set_game_options(game_options)
+    step_all = cts.rooms.step_all
+    passes = []
+    def timed_step_all(ticks, key_move=0.0):
+        passes.append(time.perf_counter())
+        return step_all(ticks, key_move)
+    cts.rooms.step_all = timed_step_all
+
+    max_ticks = int((seconds + 1) * TICK_RATE) # One extra second for the clients to connect
+    start = time.process_time()
+    if mode == 'threads':
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=cts.run_websocket_server, args=(loop, cts.BROADCAST_RATE, PORT),
+                         daemon=True).start()
+        cts.game(headless=True, max_ticks=max_ticks)
+    elif mode == 'single-thread':
+        asyncio.run(cts.run_single_thread(port=PORT, max_ticks=max_ticks))
+    else:
+        cts.serve_gateways(gateways, port=PORT, game_options=game_options, max_ticks=max_ticks)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN) # Gateways, once they have exited
+    cpu = time.process_time() - start + children.ru_utime + children.ru_stime
+    passes = passes[TICK_RATE:] # Skip the connecting second
+    results.put((cpu, [(b - a) * 1000 for a, b in zip(passes, passes[1:])]))
+
+
+async def client(port, seconds, input_interval):
+    """One web client: reads frames and sends stamped controls until `seconds` have passed."""
+    for _ in range(50): # Wait for the server to start listening
+        try:
+            websocket = await websockets.connect(f"ws://localhost:{port}/")
+            break
+        except OSError:
+            await asyncio.sleep(0.05)
+    else:
+        raise RuntimeError("server did not start")
+    end = time.perf_counter() + seconds
+    next_input = time.perf_counter()
+    tick = None
+    frames = 0
+    async with websocket:
+        try:
+            while time.perf_counter() < end:
+                frame = await asyncio.wait_for(websocket.recv(), max(0.0, end - time.perf_counter()))
+                tick = struct.unpack_from(CLIENT_FRAME.format, frame)[1]
+                frames += 1
+                if time.perf_counter() >= next_input:
+                    next_input += input_interval
+                    await websocket.send(json.dumps({'type': 'control', 'direction': 'left', 'tick': tick}))
+        except (asyncio.TimeoutError, websockets.exceptions.ConnectionClosed):
+            pass # Out of time, or the server finished first (many clients take a while to connect)
+    return frames
+
+
+async def clients(count, ports, seconds, input_interval):
+    """Runs `count` clients spread over `ports`; returns the frames they received."""
+    return sum(await asyncio.gather(*(client(ports[index % len(ports)], seconds, input_interval)
+                                      for index in range(count))))
+
+
+def run(mode, count, seconds, squares, gateways, input_interval):
+    """Returns (server CPU share, frames received, gap p50, p99 and max in ms)."""
+    results = multiprocessing.Queue()
+    server = multiprocessing.Process(target=run_server, args=(mode, seconds, squares, gateways, results))
+    server.start()
+    ports = [PORT + index for index in range(gateways)] if mode == 'gateways' else [PORT]
+    frames = asyncio.run(clients(count, ports, seconds, input_interval))
+    cpu, gaps = results.get()
+    server.join()
+    gaps.sort()
+    return cpu / (seconds + 1), frames, gaps[len(gaps) // 2], gaps[int(len(gaps) * 0.99)], gaps[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', default='10,100,500', help="comma-separated client counts")
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--squares', type=int, default=0, help="play a stress match with this many squares")
+    parser.add_argument('--input-interval', type=float, default=0.1, help="seconds between each client's controls")
+    parser.add_argument('--gateways', type=int, default=1, help="gateway processes in the gateways mode")
+    args = parser.parse_args()
+
+    # Each client needs a socket on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    print(f"target: one pass every {1000 / TICK_RATE:.1f}ms")
+    print(f"{'clients':>8} {'mode':>14} {'server CPU':>11} {'frames/s':>9} {'gap p50':>8} {'p99':>8} {'max':>8}")
+    for count in (int(n) for n in args.clients.split(',')):
+        for mode in ('threads', 'single-thread', 'gateways'):
+            cpu, frames, p50, p99, worst = run(mode, count, args.seconds, args.squares, args.gateways,
+                                               args.input_interval)
+            print(f"{count:>8} {mode:>14} {cpu:>10.1%} {frames / args.seconds:>9,.0f} "
+                  f"{p50:>6.2f}ms {p99:>6.2f}ms {worst:>6.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
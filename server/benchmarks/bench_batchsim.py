@@ -0,0 +1,67 @@
+"""
+Benchmark: game-ticks per second of the batch simulator on one core.
+
+Runs N matches in lockstep with the chase policy (and with idle paddles) and
+reports game-ticks per second. --verify first replays a few matches through
+simulation.GameState with the same seeds and moves and checks that paddle,
+score and lives agree on every tick.
+
+Usage (from the server directory):
+    python benchmarks/bench_batchsim.py [--games 1000,10000,100000] [--ticks 600] [--verify]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from batchsim import BatchSimulator, chase_policy
+from simulation import GameState
+
+
+def verify(games=32, ticks=3000):
+    """Checks the batch simulator against GameState, tick by tick."""
+    sim = BatchSimulator(games, seeds=range(games))
+    refs = [GameState(seed=seed, record=False) for seed in range(games)]
+    jitter = np.random.default_rng(0)
+    for tick in range(ticks):
+        moves = chase_policy(sim) * jitter.uniform(0.5, 1.5, games) # Imperfect play, so games end
+        sim.step(moves)
+        for move, ref in zip(moves.tolist(), refs):
+            ref.step(move)
+        assert sim.paddle_x.tolist() == [ref.paddle_x for ref in refs], f"paddle differs at tick {tick}"
+        assert sim.score.tolist() == [ref.score for ref in refs], f"score differs at tick {tick}"
+        assert sim.lives.tolist() == [ref.lives for ref in refs], f"lives differ at tick {tick}"
+    print(f"verified {games} games x {ticks} ticks against GameState "
+          f"({int(sim.game_over.sum())} reached game over)")
+
+
+def bench(games, ticks, policy):
+    sim = BatchSimulator(games, seeds=range(games))
+    start = time.perf_counter()
+    for _ in range(ticks):
+        sim.step(policy(sim) if policy else None)
+    return games * ticks / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--games', default='1000,10000,100000')
+    parser.add_argument('--ticks', type=int, default=600)
+    parser.add_argument('--verify', action='store_true')
+    args = parser.parse_args()
+
+    if args.verify:
+        verify()
+    print(f"{'games':>8} {'idle game-ticks/s':>18} {'chase game-ticks/s':>19}")
+    for games in (int(g) for g in args.games.split(',')):
+        idle = bench(games, args.ticks, None)
+        chase = bench(games, args.ticks, chase_policy)
+        print(f"{games:>8} {idle:>18,.0f} {chase:>19,.0f}")
+
+
+if __name__ == '__main__':
+    main()
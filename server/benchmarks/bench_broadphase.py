@@ -0,0 +1,75 @@
+"""
+Benchmark: catching with many paddles, all-pairs vs y band + column grid.
+
+The all-pairs variant tests every paddle against every live square (what
+spritecollide per paddle amounts to), claiming each square for the first
+paddle that touches it. SquareStore.catch_paddles only looks at the paddle
+row's band and, per paddle, at the x columns it overlaps. Caught squares are
+put back before each run so every tick sees the same board.
+
+Usage (from the server directory):
+    python benchmarks/bench_broadphase.py [--paddles 1,8,64] [--squares 1000,20000]
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from simulation import (
+    SCREEN_WIDTH, SCREEN_HEIGHT, PADDLE_WIDTH, PADDLE_HEIGHT, PADDLE_Y, SQUARE_SIZE,
+    FALL_SPEED, TICK_RATE, SquareStore,
+)
+
+REPEATS = 50
+
+
+def board(count, seed=1):
+    rng = np.random.default_rng(seed)
+    return (rng.integers(0, SCREEN_WIDTH - SQUARE_SIZE, count).astype(np.float64),
+            rng.uniform(-100, SCREEN_HEIGHT, count))
+
+
+def bench_all_pairs(xs, ys, lefts):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        caught = np.zeros(len(xs), dtype=bool)
+        for left in lefts:
+            hit = ((xs < left + PADDLE_WIDTH) & (xs + SQUARE_SIZE > left)
+                   & (ys < PADDLE_Y + PADDLE_HEIGHT) & (ys + SQUARE_SIZE > PADDLE_Y) & ~caught)
+            caught |= hit
+    return (time.perf_counter() - start) / REPEATS
+
+
+def bench_grid(xs, ys, lefts):
+    store = SquareStore(FALL_SPEED / TICK_RATE)
+    store.spawn_many(xs, ys, np.arange(len(xs)))
+    copies = [copy.deepcopy(store) for _ in range(REPEATS)]
+    start = time.perf_counter()
+    for store in copies:
+        store.catch_paddles(lefts, PADDLE_Y, PADDLE_WIDTH, PADDLE_HEIGHT)
+    return (time.perf_counter() - start) / REPEATS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--paddles', default='1,8,64')
+    parser.add_argument('--squares', default='1000,20000')
+    args = parser.parse_args()
+
+    print(f"{'paddles':>8} {'squares':>8} {'all-pairs us':>13} {'grid us':>9} {'speedup':>8}")
+    for count in (int(c) for c in args.squares.split(',')):
+        xs, ys = board(count)
+        for paddles in (int(p) for p in args.paddles.split(',')):
+            lefts = np.linspace(0, SCREEN_WIDTH - PADDLE_WIDTH, paddles).tolist()
+            pairs = bench_all_pairs(xs, ys, lefts)
+            grid = bench_grid(xs, ys, lefts)
+            print(f"{paddles:>8} {count:>8} {pairs * 1e6:>13,.1f} {grid * 1e6:>9,.1f} {pairs / grid:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
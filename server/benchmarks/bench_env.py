@@ -0,0 +1,65 @@
+"""
+Benchmark: environment steps per second for each env flavour.
+
+Random actions, episodes auto-reset at game over. An env-step is one match
+advancing one tick, so a vector env with N matches counts N per call.
+
+Usage (from the server directory):
+    python benchmarks/bench_env.py [--envs 8] [--steps 2000]
+"""
+import argparse
+import functools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from env import AsyncVectorEnv, CatchEnv, SyncVectorEnv, VectorCatchEnv
+
+
+def bench_single(steps):
+    env = CatchEnv(seed=0)
+    env.reset()
+    actions = np.random.default_rng(0).integers(0, 3, steps).tolist()
+    start = time.perf_counter()
+    for action in actions:
+        _, _, terminated, truncated, _ = env.step(action)
+        if terminated or truncated:
+            env.reset()
+    return steps / (time.perf_counter() - start)
+
+
+def bench_vector(env, steps):
+    env.reset(seed=0)
+    actions = np.random.default_rng(0).integers(0, 3, (steps, env.num_envs))
+    start = time.perf_counter()
+    for batch in actions:
+        env.step(batch)
+    elapsed = time.perf_counter() - start
+    env.close()
+    return steps * env.num_envs / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--envs', type=int, default=8, help="environments per vector env")
+    parser.add_argument('--steps', type=int, default=2000, help="calls to step()")
+    args = parser.parse_args()
+
+    env_fns = [functools.partial(CatchEnv, seed=i) for i in range(args.envs)]
+    results = [
+        ("CatchEnv", bench_single(args.steps)),
+        (f"SyncVectorEnv x{args.envs}", bench_vector(SyncVectorEnv(env_fns), args.steps)),
+        (f"AsyncVectorEnv x{args.envs}", bench_vector(AsyncVectorEnv(env_fns), args.steps // 4)),
+        (f"VectorCatchEnv x{args.envs}", bench_vector(VectorCatchEnv(args.envs), args.steps)),
+        ("VectorCatchEnv x4096", bench_vector(VectorCatchEnv(4096), args.steps // 10)),
+    ]
+    for name, rate in results:
+        print(f"{name:<24} {rate:>14,.0f} env-steps/s")
+
+
+if __name__ == '__main__':
+    main()
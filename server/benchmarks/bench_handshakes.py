@@ -0,0 +1,117 @@
+"""
+Benchmark: connection storm against 1, 2 and 4 gateway processes sharing one port.
+
+Starts the server in a child process as `--gateways N --reuse-port` runs it
+(the simulation in one process, N gateway processes accepting on the same
+port with SO_REUSEPORT), then --client-processes processes each keep
+--concurrency connections cycling for --seconds: open a WebSocket, read the
+first state frame, close. Reports completed handshakes per second and the
+p50 and p99 time from connecting to the first frame. Handshake throughput
+can only scale with gateways while there are cores to spare for them and
+for the clients.
+
+Usage (from the server directory):
+    python benchmarks/bench_handshakes.py [--gateways 1,2,4] [--seconds 5] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import signal
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import websockets
+
+PORT = 5103
+
+
+def run_server(gateways):
+    """Child process: the simulation plus `gateways` gateways on PORT, until interrupted."""
+    sys.stdout = open(os.devnull, 'w') # Connection logging, in the gateways too
+    import catchthesquares as cts
+    try:
+        cts.serve_gateways(gateways, port=PORT, reuse_port=True)
+    except KeyboardInterrupt:
+        pass # serve_gateways() has stopped the gateways
+
+
+async def storm(seconds, concurrency):
+    """Cycles `concurrency` connections for `seconds`; returns the connect-to-first-frame times."""
+    times = []
+    end = time.perf_counter() + seconds
+
+    async def cycle():
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            try:
+                async with websockets.connect(f"ws://localhost:{PORT}/", open_timeout=None) as websocket:
+                    await websocket.recv()
+            except (OSError, websockets.exceptions.WebSocketException):
+                continue
+            times.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(cycle() for _ in range(concurrency)))
+    return times
+
+
+def run_clients(seconds, concurrency, results):
+    """Client process entry point."""
+    results.put(asyncio.run(storm(seconds, concurrency)))
+
+
+def wait_for_port(timeout=10):
+    """Waits until the server accepts connections."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            socket.create_connection(('localhost', PORT)).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("server did not start")
+
+
+def run(gateways, seconds, client_processes, concurrency):
+    """Returns (handshakes per second, p50 and p99 connect-to-first-frame time in ms)."""
+    server = multiprocessing.Process(target=run_server, args=(gateways,))
+    server.start()
+    wait_for_port()
+    time.sleep(0.5) # Let every gateway start listening
+    results = multiprocessing.Queue()
+    clients = [multiprocessing.Process(target=run_clients, args=(seconds, concurrency, results))
+               for _ in range(client_processes)]
+    for client in clients:
+        client.start()
+    times = sorted(t for _ in clients for t in results.get())
+    for client in clients:
+        client.join()
+    os.kill(server.pid, signal.SIGINT)
+    server.join()
+    return len(times) / seconds, times[len(times) // 2] * 1000, times[int(len(times) * 0.99)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--gateways', default='1,2,4', help="comma-separated gateway process counts")
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--client-processes', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=50, help="connections each client process keeps cycling")
+    args = parser.parse_args()
+
+    # Connections in TIME_WAIT and in flight need descriptors on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    print(f"{os.cpu_count()} cores, {args.client_processes} client processes x {args.concurrency} connections")
+    print(f"{'gateways':>8} {'handshakes/s':>13} {'p50':>9} {'p99':>9}")
+    for gateways in (int(n) for n in args.gateways.split(',')):
+        rate, p50, p99 = run(gateways, args.seconds, args.client_processes, args.concurrency)
+        print(f"{gateways:>8} {rate:>13,.0f} {p50:>7.2f}ms {p99:>7.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
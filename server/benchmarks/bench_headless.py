@@ -0,0 +1,60 @@
+"""
+Benchmark: simulation ticks per second with and without the Pygame window.
+
+Runs the game loop unpaced (realtime=False) for a fixed number of ticks in headless
+mode and in windowed mode. When no display is available the windowed run uses
+SDL's dummy video driver, which still pays for drawing, font rendering and the
+display flip. --warmup first plays that many ticks and both runs start from a
+snapshot of the resulting mid-game board instead of an empty one.
+
+Usage (from the server directory):
+    python benchmarks/bench_headless.py [--ticks 5000] [--warmup 0]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import catchthesquares as cts
+
+
+def warm_snapshot(ticks):
+    """Returns a snapshot of a game that never ends, after `ticks` ticks."""
+    room = cts.rooms.get(cts.DEFAULT_ROOM)
+    with room.lock:
+        room.state.reset()
+        room.state.lives = 10 ** 9
+        for _ in range(ticks):
+            room.state.step()
+    return room.snapshot()
+
+
+def run(headless, ticks, snapshot):
+    """Returns ticks/sec for one unpaced run of the game loop."""
+    cts.rooms.get(cts.DEFAULT_ROOM).restore(snapshot)
+    start = time.perf_counter()
+    done = cts.game(headless=headless, max_ticks=ticks, realtime=False)
+    return done / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ticks', type=int, default=5000)
+    parser.add_argument('--warmup', type=int, default=0, help="ticks played before the measured runs")
+    args = parser.parse_args()
+
+    snapshot = warm_snapshot(args.warmup)
+    headless = run(True, args.ticks, snapshot)
+    windowed = run(False, args.ticks, snapshot)
+    print(f"headless: {headless:12,.0f} ticks/sec")
+    print(f"windowed: {windowed:12,.0f} ticks/sec")
+    print(f"speedup:  {headless / windowed:12.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: per-tick control input cost while one client floods inputs.
+
+Each tick, --clients clients send one control input and one more client
+sends FLOOD inputs, then the simulation drains them. Compares the original
+single control list drained with pop(0) against rooms.Room's per-client
+input counters, which coalesce inputs into a net displacement as they
+arrive (capped at rooms.MAX_QUEUED_INPUTS per tick). Reports the time to
+push one input and drain time per tick, the most inputs waiting at once
+(held as a list by the original, only counted by the coalesced design) and
+how many were dropped.
+
+Usage (from the server directory):
+    python benchmarks/bench_inputs.py [--clients 10] [--flood 10,100,1000,10000] [--ticks 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rooms import Room
+from simulation import PADDLE_NUDGE
+
+
+class ListInputs:
+    """The original approach: one list for every client's inputs, drained with pop(0)."""
+    def __init__(self):
+        self.control_queue = []
+
+    def push_control(self, client, direction):
+        self.control_queue.append(direction)
+
+    def drain_controls(self):
+        move = 0
+        while self.control_queue:
+            control = self.control_queue.pop(0)
+            if control == 'left':
+                move -= PADDLE_NUDGE
+            elif control == 'right':
+                move += PADDLE_NUDGE
+        return move
+
+    def queued(self):
+        return len(self.control_queue)
+
+    def dropped(self):
+        return 0
+
+
+class CoalescedInputs:
+    """Per-client input counters, as in rooms.Room."""
+    def __init__(self):
+        self.room = Room('bench')
+        self.push_control = self.room.push_control
+        self.drain_controls = self.room.drain_controls
+
+    def queued(self):
+        return sum(stats['depth'] for stats in self.room.input_stats().values())
+
+    def dropped(self):
+        return sum(queue.dropped for queue in self.room.inputs.values())
+
+
+def run(inputs, clients, flood, ticks):
+    """Returns (push us per input, drain ms per tick, most inputs queued at once, inputs dropped)."""
+    push = 0.0
+    drain = 0.0
+    most = 0
+    for tick in range(ticks):
+        start = time.perf_counter()
+        for client in range(clients):
+            inputs.push_control(client, 'left' if tick % 2 else 'right')
+        for _ in range(flood):
+            inputs.push_control('flooder', 'right')
+        push += time.perf_counter() - start
+        most = max(most, inputs.queued())
+        start = time.perf_counter()
+        inputs.drain_controls()
+        drain += time.perf_counter() - start
+    return push / (ticks * (clients + flood)) * 1e6, drain / ticks * 1000, most, inputs.dropped()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=10, help="well-behaved clients, one input per tick each")
+    parser.add_argument('--flood', default='10,100,1000,10000', help="comma-separated inputs per tick from the flooder")
+    parser.add_argument('--ticks', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'flood':>7} {'design':>10} {'push':>9} {'drain/tick':>11} {'max queued':>11} {'dropped':>9}")
+    for flood in (int(n) for n in args.flood.split(',')):
+        for name, inputs in (('list', ListInputs()), ('coalesced', CoalescedInputs())):
+            us, ms, most, dropped = run(inputs, args.clients, flood, args.ticks)
+            print(f"{flood:>7,} {name:>10} {us:>7.3f}us {ms:>9.3f}ms {most:>11,} {dropped:>9,}")
+
+
+if __name__ == '__main__':
+    main()
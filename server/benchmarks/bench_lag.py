@@ -0,0 +1,87 @@
+"""
+Benchmark: catch rate of a lagged web player with and without lag compensation.
+
+A bot plays one room through Room.push_control() the way a web client would:
+it sees state frames half a round trip late, steers its (locally predicted)
+paddle towards the lowest square it can still reach with up to two nudges
+per tick, and its controls, stamped with the tick of the frame it saw,
+arrive half a round trip later. Each round trip time is played with lag
+compensation off and with a --rewind-window; reports the share of squares
+caught, how many were only caught thanks to the rewind, the most memory the
+missed square history used and the time per tick.
+
+Usage (from the server directory):
+    python benchmarks/bench_lag.py [--rtt-ms 0,50,150,250] [--rewind-window 0.25] [--seconds 120]
+"""
+import argparse
+import collections
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rooms import Room
+from simulation import PADDLE_NUDGE, PADDLE_WIDTH, PADDLE_Y, SCREEN_WIDTH, SQUARE_SIZE, TICK_RATE
+
+LIVES = 10 ** 9
+MAX_NUDGES = 2 # Control messages the bot sends per tick at most
+
+
+def play(rtt_ms, rewind_window, seconds, spawn_interval):
+    """Returns (share caught, rewind catches, most history bytes, ms per tick)."""
+    room = Room('bench', game_options={'seed': 0, 'initial_lives': LIVES, 'rewind_window': rewind_window,
+                                       'spawn_interval': spawn_interval})
+    one_way = round(rtt_ms / 2000 * TICK_RATE)
+    frames = collections.deque() # (arrival tick, seen tick, x and y of the squares) on their way to the bot
+    controls = collections.deque() # (arrival tick, direction, seen tick) on their way to the server
+    predicted = room.state.paddle_x # Where the bot expects its paddle to be once its controls land
+    view = None
+    most_bytes = 0
+    elapsed = 0.0
+    for tick in range(int(seconds * TICK_RATE)):
+        state = room.state
+        frames.append((tick + one_way, state.tick, *state.squares.positions()))
+        while frames and frames[0][0] <= tick:
+            view = frames.popleft()[1:]
+        if view is not None:
+            seen_tick, xs, ys = view
+            reachable = ys < PADDLE_Y
+            if reachable.any():
+                lowest = int(ys[reachable].argmax())
+                target = xs[reachable][lowest] + SQUARE_SIZE / 2 - PADDLE_WIDTH / 2
+                target = min(max(target, 0.0), SCREEN_WIDTH - PADDLE_WIDTH)
+                nudges = int(max(-MAX_NUDGES, min(MAX_NUDGES, round((target - predicted) / PADDLE_NUDGE))))
+                for _ in range(abs(nudges)):
+                    controls.append((tick + one_way, 'right' if nudges > 0 else 'left', seen_tick))
+                predicted = min(max(predicted + nudges * PADDLE_NUDGE, 0.0), SCREEN_WIDTH - PADDLE_WIDTH)
+        while controls and controls[0][0] <= tick:
+            _, direction, seen_tick = controls.popleft()
+            room.push_control('bot', direction, seen_tick)
+        start = time.perf_counter()
+        room.step(1)
+        elapsed += time.perf_counter() - start
+        most_bytes = max(most_bytes, state.rewind_stats()['bytes'])
+    state = room.state
+    lost = LIVES - state.lives
+    return (state.score / max(1, state.score + lost), state.rewind_catches, most_bytes,
+            elapsed / (seconds * TICK_RATE) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rtt-ms', default='0,50,150,250', help="comma-separated round trip times")
+    parser.add_argument('--rewind-window', type=float, default=0.25, help="seconds of lag compensated")
+    parser.add_argument('--seconds', type=float, default=120, help="game time played per run")
+    parser.add_argument('--spawn-interval', type=float, default=0.25)
+    args = parser.parse_args()
+
+    print(f"{'rtt':>6} {'caught, off':>12} {'caught, on':>11} {'rewound':>8} {'history':>8} {'tick':>8}")
+    for rtt in (int(ms) for ms in args.rtt_ms.split(',')):
+        off, _, _, _ = play(rtt, 0.0, args.seconds, args.spawn_interval)
+        on, rewound, history, tick_ms = play(rtt, args.rewind_window, args.seconds, args.spawn_interval)
+        print(f"{rtt:>4}ms {off:>12.1%} {on:>11.1%} {rewound:>8,} {history:>7,}B {tick_ms:>6.3f}ms")
+
+
+if __name__ == '__main__':
+    main()
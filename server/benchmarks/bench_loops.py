@@ -0,0 +1,132 @@
+"""
+Benchmark: state broadcast throughput and latency, asyncio vs uvloop event loop.
+
+Starts the WebSocket server in a child process on the chosen event loop
+(catchthesquares.new_event_loop()), connects --clients web clients to one
+room from another process, then broadcasts the room's state frame to all of
+them BROADCAST_RATE times a second for --seconds, as the server's sender
+does. Reports messages sent per second and the time each broadcast took to
+hand every message to the transports (p50 and p99). The uvloop runs are
+skipped when uvloop is not installed. The clients share the CPU with the
+server; run it on a machine with spare cores for cleaner numbers.
+
+Usage (from the server directory):
+    python benchmarks/bench_loops.py [--clients 100,1000,5000] [--seconds 5]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import websockets
+
+PORT = 5102
+
+
+def run_server(use_uvloop, clients, seconds, ready, results):
+    """Child process: waits for `clients` connections, broadcasts for `seconds`, reports on `results`."""
+    sys.stdout = open(os.devnull, 'w') # Connection logging
+    import catchthesquares as cts
+    room = cts.rooms.get(cts.DEFAULT_ROOM)
+
+    async def serve():
+        server = await websockets.serve(cts.websocket_handler, "0.0.0.0", PORT)
+        ready.set()
+        while len(room.clients) < clients:
+            await asyncio.sleep(0.05)
+        room.step(1) # Publish a frame for the connected clients
+        interval = 1 / cts.BROADCAST_RATE
+        durations = []
+        sent = 0
+        start = time.perf_counter()
+        due = start
+        while time.perf_counter() - start < seconds:
+            due += interval
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            began = time.perf_counter()
+            sent += await cts.broadcast()
+            durations.append(time.perf_counter() - began)
+        elapsed = time.perf_counter() - start
+        server.close()
+        return sent / elapsed, sorted(durations)
+
+    loop = cts.new_event_loop(use_uvloop)
+    try:
+        results.put(loop.run_until_complete(serve()))
+    finally:
+        loop.close()
+
+
+async def connect_clients(count, done):
+    """Connects `count` clients that read frames until `done` is set."""
+    sockets = []
+    for _ in range(count):
+        sockets.append(await websockets.connect(f"ws://localhost:{PORT}/", max_queue=None))
+
+    async def drain(websocket):
+        try:
+            async for _ in websocket:
+                pass
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    readers = [asyncio.create_task(drain(websocket)) for websocket in sockets]
+    while not done.is_set():
+        await asyncio.sleep(0.1)
+    for websocket in sockets:
+        await websocket.close()
+    await asyncio.gather(*readers)
+
+
+def run_clients(count, done):
+    """Client process entry point."""
+    asyncio.run(connect_clients(count, done))
+
+
+def run(use_uvloop, clients, seconds):
+    """Returns (messages per second, p50 and p99 broadcast time in ms)."""
+    ready = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    server = multiprocessing.Process(target=run_server, args=(use_uvloop, clients, seconds, ready, results))
+    server.start()
+    ready.wait(10)
+    done = multiprocessing.Event()
+    client_process = multiprocessing.Process(target=run_clients, args=(clients, done))
+    client_process.start()
+    rate, durations = results.get()
+    done.set()
+    client_process.join()
+    server.join()
+    return rate, durations[len(durations) // 2] * 1000, durations[int(len(durations) * 0.99)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', default='100,1000,5000', help="comma-separated client counts")
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    # Each client needs a socket on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    loops = [('asyncio', False)]
+    try:
+        import uvloop # noqa: F401
+        loops.append(('uvloop', True))
+    except ImportError:
+        print("uvloop is not installed; only the asyncio loop is measured")
+
+    print(f"{'clients':>8} {'loop':>8} {'messages/s':>11} {'broadcast p50':>14} {'p99':>9}")
+    for clients in (int(n) for n in args.clients.split(',')):
+        for name, use_uvloop in loops:
+            rate, p50, p99 = run(use_uvloop, clients, args.seconds)
+            print(f"{clients:>8,} {name:>8} {rate:>11,.0f} {p50:>12.2f}ms {p99:>7.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
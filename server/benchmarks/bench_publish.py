@@ -0,0 +1,150 @@
+"""
+Benchmark: simulation tick timing with readers on other threads, locked vs published state.
+
+Runs one room with a stress board (swarm_options) at the real-time tick rate
+while other threads do what the server's do: a broadcaster reads the client
+frame at --broadcast-rate, a renderer reads a snapshot and restores it at
+--fps, and an input thread pushes --inputs-per-sec control inputs. Once with
+the old design, where every reader takes the room lock and builds its copy
+from the live state (so a tick waits for whichever reader holds the lock),
+and once with rooms.Room publishing an immutable frame and snapshot after
+each step for lock-free reads. Reports how long ticks waited for the room
+lock, how long they took (wall clock, and CPU time of the simulation thread
+alone) and how late they started, and how long reads took. On one core both
+designs also share the GIL, so ticks can start late, and take longer by the
+wall clock, even when no lock is held; the lock wait column isolates the
+lock and the tick CPU column what each tick itself costs. The published
+room builds a snapshot only when the renderer has asked for one, so its
+tick CPU falls with --fps.
+
+Usage (from the server directory):
+    python benchmarks/bench_publish.py [--squares 10000] [--seconds 10] [--broadcast-rate 60] [--fps 60]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rooms import Room
+from simulation import TICK_RATE, GameState, swarm_options
+
+
+class LockedRoom(Room):
+    """The design before publishing: readers build what they need from the state under the room lock."""
+    def push_control(self, client, direction, seen_tick=None):
+        with self.lock:
+            super().push_control(client, direction, seen_tick)
+
+    def publish(self):
+        pass
+
+    def client_message(self):
+        with self.lock:
+            return self.state.to_client_frame()
+
+    def latest_snapshot(self):
+        with self.lock:
+            return self.state.snapshot()
+
+
+class TimedLock:
+    """Room lock that records how long one thread (the simulation's) waited to acquire it."""
+    def __init__(self, owner):
+        self.lock = threading.Lock()
+        self.owner = owner # threading.get_ident() of the thread whose waits are recorded
+        self.waits = []
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self.lock.acquire()
+        if threading.get_ident() == self.owner:
+            self.waits.append(time.perf_counter() - start)
+
+    def __exit__(self, *exc_info):
+        self.lock.release()
+
+
+def percentiles(times):
+    """Returns (p50, p99, max) of a list of seconds, in milliseconds."""
+    times = sorted(times)
+    return tuple(t * 1000 for t in (times[len(times) // 2], times[int(len(times) * 0.99)], times[-1]))
+
+
+def run(room_class, squares, seconds, broadcast_rate, fps, inputs_per_sec):
+    """Returns ({'wait', 'tick', 'late'}: step lock waits, durations and start delays, {reader: read durations})."""
+    room = room_class('bench', game_options=swarm_options(squares))
+    room.lock = TimedLock(threading.get_ident())
+    room.clients.add(object()) # Rooms only publish client frames while someone is watching
+    room.state.lives = 10 ** 9
+    for _ in range(TICK_RATE * 5): # Fill the board
+        room.state.step()
+    room.start_publishing()
+    stop = threading.Event()
+    reads = {'broadcast': [], 'render': []}
+
+    def broadcaster():
+        while not stop.wait(1 / broadcast_rate):
+            start = time.perf_counter()
+            room.client_message()
+            reads['broadcast'].append(time.perf_counter() - start)
+
+    def renderer():
+        frame_state = GameState(record=False)
+        while not stop.wait(1 / fps):
+            start = time.perf_counter()
+            frame_state.restore(room.latest_snapshot())
+            reads['render'].append(time.perf_counter() - start)
+
+    def inputs():
+        while not stop.wait(1 / inputs_per_sec):
+            room.push_control(None, 'left')
+
+    threads = [threading.Thread(target=target, daemon=True) for target in (broadcaster, renderer, inputs)]
+    for thread in threads:
+        thread.start()
+    ticks = {'tick': [], 'tick cpu': [], 'late': []}
+    dt = 1 / TICK_RATE
+    due = time.perf_counter()
+    for _ in range(int(seconds * TICK_RATE)):
+        due += dt
+        time.sleep(max(0.0, due - time.perf_counter()))
+        start = time.perf_counter()
+        start_cpu = time.thread_time()
+        room.step(1)
+        ticks['tick cpu'].append(time.thread_time() - start_cpu)
+        ticks['late'].append(start - due)
+        ticks['tick'].append(time.perf_counter() - start)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    room.stop_publishing()
+    ticks['wait'] = room.lock.waits[-len(ticks['tick']):]
+    return ticks, reads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--squares', type=int, default=10000)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--broadcast-rate', type=float, default=60)
+    parser.add_argument('--fps', type=float, default=60)
+    parser.add_argument('--inputs-per-sec', type=float, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.squares:,} squares, {TICK_RATE} ticks/sec; times in ms as p50 / p99 / max")
+    for name, room_class in (('locked', LockedRoom), ('published', Room)):
+        ticks, reads = run(room_class, args.squares, args.seconds, args.broadcast_rate, args.fps,
+                           args.inputs_per_sec)
+        columns = [('lock wait', ticks['wait']), ('tick', ticks['tick']), ('tick cpu', ticks['tick cpu']),
+                   ('late', ticks['late']),
+                   ('broadcast read', reads['broadcast']), ('render read', reads['render'])]
+        print(f"{name}:")
+        for label, times in columns:
+            print(f"  {label:>15}: {'%7.3f / %7.3f / %7.3f' % percentiles(times)}")
+
+
+if __name__ == '__main__':
+    main()
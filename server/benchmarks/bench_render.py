@@ -0,0 +1,70 @@
+"""
+Benchmark: desktop window CPU per frame, full redraw vs dirty rectangles.
+
+Plays a game with a paddle chasing the lowest square and draws one frame per
+tick through render.DesktopView, once repainting and flipping the whole
+window every frame (full_redraw=True, the old behaviour) and once repainting
+only the changed regions. Reports CPU time per frame, the share of the
+window pushed to the display and the HUD text cache hit rate. Without a
+display SDL's dummy video driver is used, which measures the drawing work
+but not the cost of presenting it.
+
+Usage (from the server directory):
+    python benchmarks/bench_render.py [--frames 3000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from render import DesktopView
+from simulation import PADDLE_SPEED, PADDLE_WIDTH, SCREEN_HEIGHT, SCREEN_WIDTH, SQUARE_SIZE, TICK_RATE, GameState
+
+
+def run(screen, font, frames, full_redraw):
+    """Returns (CPU seconds per frame, average share of the window updated, view stats)."""
+    view = DesktopView(screen, font, full_redraw)
+    state = GameState(seed=0, record=False)
+    state.lives = 10 ** 9
+    key_step = PADDLE_SPEED / TICK_RATE
+    repainted = 0
+    start = time.process_time()
+    for _ in range(frames):
+        xs, _ = state.squares.lowest(1)
+        target = xs[0] + SQUARE_SIZE / 2 - PADDLE_WIDTH / 2 if len(xs) else state.paddle_x
+        move = 0.0
+        if abs(target - state.paddle_x) > key_step:
+            move = key_step if target > state.paddle_x else -key_step
+        state.step(move)
+        view.draw(state)
+        repainted += view.repainted
+    elapsed = time.process_time() - start
+    return elapsed / frames, repainted / frames / (SCREEN_WIDTH * SCREEN_HEIGHT), view.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=3000)
+    args = parser.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    font = pygame.font.Font(None, 36)
+    full, full_area, _ = run(screen, font, args.frames, True)
+    dirty, dirty_area, stats = run(screen, font, args.frames, False)
+    print(f"full redraw:  {full * 1000:7.3f}ms CPU per frame, {full_area:6.1%} of the window updated")
+    print(f"dirty rects:  {dirty * 1000:7.3f}ms CPU per frame, {dirty_area:6.1%} of the window updated")
+    print(f"CPU ratio:    {dirty / full:7.1%}")
+    print(f"HUD text cache: {stats['text_cache']}")
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
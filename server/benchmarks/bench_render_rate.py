@@ -0,0 +1,74 @@
+"""
+Benchmark: simulation tick timing while the desktop window renders slowly.
+
+Runs the real-time game loop with the window open (SDL's dummy video driver
+when there is no display) and makes every rendered frame spike by busy-
+looping in Python for --spike-ms, at several render rates. Reports the
+simulation's achieved tick rate and how late its passes ran against the
+schedule: with rendering on its own thread, spikes no longer cost ticks,
+but passes still wait for interpreter switches (see sys.getswitchinterval()),
+so they can run a few milliseconds late.
+
+Usage (from the server directory):
+    python benchmarks/bench_render_rate.py [--seconds 5] [--fps 10,60] [--spike-ms 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import catchthesquares as cts
+import render
+from simulation import TICK_RATE
+
+
+def run(seconds, fps, spike_ms):
+    """Returns (ticks/sec, worst pass gap in ms, 99th percentile pass gap in ms)."""
+    draw = render.DesktopView.draw
+    def slow_draw(view, state):
+        end = time.perf_counter() + spike_ms / 1000
+        while time.perf_counter() < end: # Holds the GIL, unlike a sleep
+            pass
+        return draw(view, state)
+
+    step_all = cts.rooms.step_all
+    passes = []
+    def timed_step_all(ticks, key_move=0.0):
+        passes.append(time.perf_counter())
+        return step_all(ticks, key_move)
+
+    render.DesktopView.draw = slow_draw
+    cts.rooms.step_all = timed_step_all
+    try:
+        start = time.perf_counter()
+        ticks = cts.game(fps=fps, max_ticks=int(seconds * TICK_RATE))
+        elapsed = time.perf_counter() - start
+    finally:
+        render.DesktopView.draw = draw
+        cts.rooms.step_all = step_all
+    gaps = sorted((b - a) * 1000 for a, b in zip(passes, passes[1:]))
+    return ticks / elapsed, gaps[-1], gaps[int(len(gaps) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--fps', default='10,60', help="comma-separated render rates")
+    parser.add_argument('--spike-ms', type=float, default=50, help="busy time added to every frame")
+    args = parser.parse_args()
+
+    print(f"target: {TICK_RATE} ticks/sec, one pass every {1000 / TICK_RATE:.1f}ms")
+    for fps in (int(n) for n in args.fps.split(',')):
+        for spike in (0, args.spike_ms):
+            rate, worst, p99 = run(args.seconds, fps, spike)
+            print(f"render {fps:>3} fps, {spike:>4.0f}ms spikes: {rate:6.1f} ticks/sec, "
+                  f"pass gap p99 {p99:5.1f}ms, worst {worst:5.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: replay file size, recording overhead and seek latency.
+
+Plays one long game with a keyboard-style chasing paddle (and effectively
+unlimited lives), streaming it to a replay file with ReplayWriter. Reports
+the simulation-thread cost of capture(), the file size against the JSON
+state snapshots the same game would take at one per tick, and the latency
+of seeking to random ticks.
+
+Usage (from the server directory):
+    python benchmarks/bench_replay.py [--minutes 10] [--keyframe-interval 600] [--seeks 200]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from replay import ReplayReader, ReplayWriter, _background_writer
+from simulation import PADDLE_SPEED, PADDLE_WIDTH, TICK_RATE, GameState
+
+
+def play(path, ticks, keyframe_interval):
+    """Plays and records `ticks` ticks; returns (capture seconds, JSON snapshot bytes)."""
+    state = GameState(seed=0)
+    state.lives = 10 ** 9
+    key_step = PADDLE_SPEED / TICK_RATE
+    writer = ReplayWriter(path, state, keyframe_interval)
+    capture_time = 0.0
+    json_bytes = 0
+    for _ in range(ticks):
+        xs, _ = state.squares.lowest(1)
+        target = xs[0] + 15 - PADDLE_WIDTH / 2 if len(xs) else state.paddle_x
+        move = 0.0
+        if abs(target - state.paddle_x) > key_step:
+            move = key_step if target > state.paddle_x else -key_step
+        state.step(move)
+        start = time.perf_counter()
+        writer.capture(state)
+        capture_time += time.perf_counter() - start
+        json_bytes += len(json.dumps(state.to_client_state()))
+    writer.close()
+    return capture_time, json_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--minutes', type=float, default=10, help="length of the recorded game")
+    parser.add_argument('--keyframe-interval', type=int, default=600)
+    parser.add_argument('--seeks', type=int, default=200)
+    args = parser.parse_args()
+
+    ticks = int(args.minutes * 60 * TICK_RATE)
+    path = os.path.join(tempfile.mkdtemp(), 'bench.ctsr')
+    capture_time, json_bytes = play(path, ticks, args.keyframe_interval)
+    _background_writer().shutdown() # Wait for the file to be finished
+    size = os.path.getsize(path)
+    print(f"{ticks:,} ticks ({args.minutes:g} min at {TICK_RATE} ticks/sec)")
+    print(f"capture(): {capture_time / ticks * 1e6:.2f}us per tick on the simulation thread")
+    print(f"replay file: {size:,} bytes ({size / args.minutes / 1024:.1f} KiB/min); "
+          f"JSON snapshots every tick: {json_bytes:,} bytes ({json_bytes / size:.0f}x larger)")
+
+    reader = ReplayReader(path)
+    targets = [random.randrange(reader.ticks + 1) for _ in range(args.seeks)]
+    start = time.perf_counter()
+    for tick in targets:
+        reader.seek(tick)
+    elapsed = time.perf_counter() - start
+    print(f"seek: {elapsed / args.seeks * 1000:.2f}ms average over {args.seeks} random ticks "
+          f"({len(reader.keyframes)} keyframes, every {args.keyframe_interval} ticks)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark: how many concurrent rooms one core can host.
+
+Each room runs a match that never ends, with squares falling at the normal
+spawn rate and one (placeholder) client watching. A "room-second" is
+TICK_RATE simulation ticks, each publishing the room's binary state frame
+(to_client_frame), plus BROADCAST_RATE reads of the published frame, i.e.
+the work one room costs the process per wall-clock second. Rooms per core is
+how many room-seconds fit into one second of CPU time.
+
+With --processes the same room count is run in each of N worker processes at
+once, as in sharded mode (--workers), and the aggregate room-seconds per
+wall-clock second is reported to show how throughput scales with cores.
+
+Usage (from the server directory):
+    python benchmarks/bench_rooms.py [--rooms 100,500] [--seconds 5] [--processes 1,2,4]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rooms import RoomManager
+from simulation import TICK_RATE
+
+BROADCAST_RATE = 60
+
+
+def run(room_count, seconds):
+    """Returns (room-seconds simulated per CPU second, step share of the time)."""
+    manager = RoomManager()
+    for i in range(room_count - 1):
+        manager.get_or_create(f"room_{i}")
+    for room in manager.snapshot():
+        room.clients.add(object()) # Rooms only publish client frames while someone is watching
+        room.state.lives = 10 ** 9
+        for _ in range(TICK_RATE * 4): # Warm up to a steady number of live squares
+            room.state.step()
+
+    sim_time = 0.0
+    send_time = 0.0
+    for _ in range(seconds):
+        for tick in range(TICK_RATE):
+            start = time.process_time()
+            manager.step_all(1)
+            sim_time += time.process_time() - start
+            if tick * BROADCAST_RATE % TICK_RATE < BROADCAST_RATE: # Broadcasts due this tick
+                start = time.process_time()
+                for room in manager.snapshot():
+                    room.client_message()
+                send_time += time.process_time() - start
+    total = sim_time + send_time
+    return room_count * seconds / total, sim_time / total
+
+
+def run_sharded(room_count, seconds, processes):
+    """Returns aggregate room-seconds per wall-clock second across `processes` workers."""
+    start = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        pool.starmap(run, [(room_count, seconds)] * processes)
+    return room_count * seconds * processes / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rooms', default='100,500')
+    parser.add_argument('--seconds', type=int, default=5, help="simulated seconds per room")
+    parser.add_argument('--processes', default='', help="comma-separated worker counts to compare")
+    args = parser.parse_args()
+
+    if args.processes:
+        room_count = int(args.rooms.split(',')[0])
+        print(f"{'workers':>8} {'room-seconds/s':>15} {'scaling':>8}")
+        baseline = None
+        for processes in (int(p) for p in args.processes.split(',')):
+            throughput = run_sharded(room_count, args.seconds, processes)
+            baseline = baseline or throughput
+            print(f"{processes:>8} {throughput:>15,.0f} {throughput / baseline:>7.2f}x")
+        return
+
+    print(f"{'rooms':>6} {'rooms/core':>11} {'step':>9} {'broadcast':>10}")
+    for count in (int(c) for c in args.rooms.split(',')):
+        per_core, sim_share = run(count, args.seconds)
+        print(f"{count:>6} {per_core:>11,.0f} {sim_share:>8.0%} {1 - sim_share:>9.0%}")
+
+
+if __name__ == '__main__':
+    main()
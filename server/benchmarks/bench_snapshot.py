@@ -0,0 +1,60 @@
+"""
+Benchmark: GameState.snapshot() and restore() latency and snapshot size.
+
+Fills a game's board with N falling squares and times taking a snapshot,
+restoring it into an existing game and building a new game from it.
+
+Usage (from the server directory):
+    python benchmarks/bench_snapshot.py [--squares 0,100,1000,10000] [--repeats 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from simulation import SCREEN_HEIGHT, SCREEN_WIDTH, SQUARE_SIZE, GameState
+
+
+def filled_state(squares):
+    """Returns a game that has run a while with `squares` squares on the board."""
+    state = GameState(seed=0)
+    for _ in range(300):
+        state.step()
+    rng = np.random.default_rng(0)
+    state.squares.spawn_many(rng.uniform(0, SCREEN_WIDTH - SQUARE_SIZE, squares),
+                             rng.uniform(-100, SCREEN_HEIGHT - 100, squares),
+                             np.arange(squares) + state.square_id_counter + 1)
+    state.square_id_counter += squares
+    return state
+
+
+def timed(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--squares', default='0,100,1000,10000')
+    parser.add_argument('--repeats', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'squares':>8} {'bytes':>10} {'snapshot':>10} {'restore':>10} {'new game':>10}")
+    for squares in (int(n) for n in args.squares.split(',')):
+        state = filled_state(squares)
+        snapshot = state.snapshot()
+        target = GameState()
+        take = timed(state.snapshot, args.repeats)
+        restore = timed(lambda: target.restore(snapshot), args.repeats)
+        build = timed(lambda: GameState.from_snapshot(snapshot, record=False), args.repeats)
+        print(f"{squares:>8,} {len(snapshot):>10,} {take:>8.1f}us {restore:>8.1f}us {build:>8.1f}us")
+
+
+if __name__ == '__main__':
+    main()
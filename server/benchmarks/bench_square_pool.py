@@ -0,0 +1,110 @@
+"""
+Benchmark: square sprite allocations and frame-time variance, pooled vs per-spawn.
+
+Plays a game with a raised spawn rate and draws every frame to an offscreen
+display (SDL's dummy driver when there is no display), once allocating a new
+sprite and filled Surface for every spawned square and killing it when the
+square disappears (the original FallingSquare pattern), and once through
+render.SquarePool. Reports sprites and surfaces allocated, garbage collector
+runs and frame-time mean, standard deviation and 99th percentile.
+
+Usage (from the server directory):
+    python benchmarks/bench_square_pool.py [--frames 3000] [--spawns-per-tick 5]
+"""
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from render import BLACK, GREEN, SquarePool
+from simulation import SCREEN_HEIGHT, SCREEN_WIDTH, SQUARE_SIZE, GameState
+
+
+class PerSpawnSquares:
+    """The original approach: one new sprite and Surface per spawned square."""
+    def __init__(self):
+        self.sprites = {} # Square id -> sprite
+        self.group = pygame.sprite.Group()
+        self.allocated = 0
+
+    def sync(self, squares):
+        xs, ys = squares.positions()
+        ids = squares.ids().tolist()
+        for square_id, x, y in zip(ids, xs.tolist(), ys.tolist()):
+            sprite = self.sprites.get(square_id)
+            if sprite is None:
+                sprite = pygame.sprite.Sprite(self.group)
+                sprite.image = pygame.Surface([SQUARE_SIZE, SQUARE_SIZE])
+                sprite.image.fill(GREEN)
+                sprite.rect = sprite.image.get_rect()
+                self.sprites[square_id] = sprite
+                self.allocated += 1
+            sprite.rect.topleft = (x, y)
+        for square_id in self.sprites.keys() - set(ids):
+            self.sprites.pop(square_id).kill()
+
+
+def run(screen, renderer, frames, spawns_per_tick):
+    """Returns (frame times in ms, garbage collections) for one run."""
+    state = GameState(seed=0, record=False)
+    state.lives = 10 ** 9
+    collections = [0]
+    def count_collections(phase, info):
+        if phase == 'start':
+            collections[0] += 1
+    gc.callbacks.append(count_collections)
+    times = []
+    try:
+        for _ in range(frames):
+            start = time.perf_counter()
+            state.step()
+            for _ in range(spawns_per_tick - 1):
+                state.spawn_square()
+            screen.fill(BLACK)
+            renderer.sync(state.squares)
+            renderer.group.draw(screen)
+            pygame.display.flip()
+            times.append((time.perf_counter() - start) * 1000)
+    finally:
+        gc.callbacks.remove(count_collections)
+    return times, collections[0]
+
+
+def report(name, sprites, surfaces, times, collections):
+    times = sorted(times)
+    print(f"{name:>10}: {sprites:>7,} sprites and {surfaces:>7,} surfaces allocated, {collections:>4} gc runs, "
+          f"frame {statistics.mean(times):6.3f}ms mean, {statistics.stdev(times):6.3f}ms stdev, "
+          f"{times[int(len(times) * 0.99)]:6.3f}ms p99")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=3000)
+    parser.add_argument('--spawns-per-tick', type=int, default=5)
+    args = parser.parse_args()
+
+    pygame.display.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+
+    per_spawn = PerSpawnSquares()
+    times, collections = run(screen, per_spawn, args.frames, args.spawns_per_tick)
+    report('per-spawn', per_spawn.allocated, per_spawn.allocated, times, collections)
+
+    pool = SquarePool()
+    times, collections = run(screen, pool, args.frames, args.spawns_per_tick)
+    report('pooled', pool.misses, 1, times, collections)
+    print(f"pool stats: {pool.stats()}")
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: one simulation tick over N falling squares, per-sprite vs SquareStore.
+
+The sprite variant mirrors the old game() loop: one pygame Sprite per square,
+Group.update(), spritecollide() against the paddle and a Python loop for
+misses. The store variant runs the same rules as array operations.
+
+Usage (from the server directory):
+    python benchmarks/bench_square_store.py [--counts 100,1000,10000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+
+from simulation import (
+    SCREEN_WIDTH, SCREEN_HEIGHT, PADDLE_WIDTH, PADDLE_HEIGHT, SQUARE_SIZE, FALL_SPEED, TICK_RATE,
+    SquareStore,
+)
+
+TICKS = 50
+
+
+class _Square(pygame.sprite.Sprite):
+    def __init__(self, x, y):
+        super().__init__()
+        self.image = pygame.Surface([SQUARE_SIZE, SQUARE_SIZE])
+        self.rect = self.image.get_rect(topleft=(x, y))
+
+    def update(self):
+        self.rect.y += FALL_SPEED // TICK_RATE
+
+
+def layout(count, seed=1):
+    rng = random.Random(seed)
+    return [(rng.randrange(0, SCREEN_WIDTH - SQUARE_SIZE), rng.randrange(-SCREEN_HEIGHT, SCREEN_HEIGHT))
+            for _ in range(count)]
+
+
+def bench_sprites(positions, paddle):
+    group = pygame.sprite.Group(_Square(x, y) for x, y in positions)
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        group.update()
+        pygame.sprite.spritecollide(paddle, group, True)
+        for square in [sq for sq in group if sq.rect.top > SCREEN_HEIGHT]:
+            square.kill()
+        [{'x': sq.rect.x, 'y': sq.rect.y} for sq in group]
+    return (time.perf_counter() - start) / TICKS
+
+
+def bench_store(positions, paddle):
+    store = SquareStore(FALL_SPEED / TICK_RATE)
+    for i, (x, y) in enumerate(positions):
+        store.spawn(x, y, i)
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        store.move()
+        store.catch(paddle.rect.x, paddle.rect.y, PADDLE_WIDTH, PADDLE_HEIGHT)
+        store.miss(SCREEN_HEIGHT)
+        store.positions()
+    return (time.perf_counter() - start) / TICKS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--counts', default='100,1000,10000')
+    args = parser.parse_args()
+
+    paddle = pygame.sprite.Sprite()
+    paddle.rect = pygame.Rect(SCREEN_WIDTH // 2 - PADDLE_WIDTH // 2, SCREEN_HEIGHT - 30,
+                              PADDLE_WIDTH, PADDLE_HEIGHT)
+    print(f"{'squares':>8} {'sprites us/tick':>16} {'store us/tick':>14} {'speedup':>8}")
+    for count in (int(c) for c in args.counts.split(',')):
+        positions = layout(count)
+        sprites = bench_sprites(positions, paddle)
+        store = bench_store(positions, paddle)
+        print(f"{count:>8} {sprites * 1e6:>16,.1f} {store * 1e6:>14,.1f} {sprites / store:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
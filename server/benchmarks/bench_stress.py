@@ -0,0 +1,90 @@
+"""
+Benchmark: stress matches with thousands of falling squares.
+
+Runs a match with swarm_options(N) (a batch of squares spawns every tick and
+lives never run out) until the board holds about N squares, then times per
+tick: simulate (GameState.step, including spawning, catching and missing),
+collide (a four-paddle catch_paddles() on the live board), serialize (the
+binary state frame broadcast to clients) and publish (the snapshot handed
+to the desktop renderer). The old JSON state message is timed for
+comparison. Each column is checked against the targets in TARGETS.
+
+Usage (from the server directory):
+    python benchmarks/bench_stress.py [--squares 1000,10000,50000] [--ticks 300]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from simulation import PADDLE_HEIGHT, PADDLE_WIDTH, PADDLE_Y, SCREEN_WIDTH, GameState, swarm_options
+
+# Per-tick budgets in milliseconds on one core; a tick at 60 Hz has 16.7ms
+TARGETS = {
+    1000: {'simulate': 0.25, 'collide': 0.2, 'serialize': 0.1, 'publish': 0.1},
+    10000: {'simulate': 0.5, 'collide': 0.3, 'serialize': 0.25, 'publish': 0.25},
+    50000: {'simulate': 1.5, 'collide': 0.5, 'serialize': 1.0, 'publish': 1.0},
+}
+
+
+def bench(squares, ticks):
+    """Returns (live squares, {phase: ms per tick}) for one board size."""
+    state = GameState(seed=0, record=False, **swarm_options(squares))
+    while len(state.squares) < squares * 0.95 and state.tick < 2000: # Fill the board
+        state.step()
+    paddles = np.random.default_rng(0).uniform(0, SCREEN_WIDTH - PADDLE_WIDTH, (ticks, 4))
+    times = dict.fromkeys(('simulate', 'collide', 'serialize', 'publish', 'json'), 0.0)
+    live = 0
+    for tick in range(ticks):
+        start = time.perf_counter()
+        state.squares.catch_paddles(paddles[tick].tolist(), PADDLE_Y, PADDLE_WIDTH, PADDLE_HEIGHT)
+        times['collide'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        state.step(8.0 if tick // 30 % 2 else -8.0)
+        times['simulate'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        state.to_client_frame()
+        times['serialize'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        state.snapshot()
+        times['publish'] += time.perf_counter() - start
+
+        if tick % 10 == 0: # The JSON message is slow at these sizes; sample it
+            start = time.perf_counter()
+            json.dumps(state.to_client_state())
+            times['json'] += (time.perf_counter() - start) * 10
+        live += len(state.squares)
+    return live // ticks, {phase: total / ticks * 1000 for phase, total in times.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--squares', default='1000,10000,50000')
+    parser.add_argument('--ticks', type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{'squares':>8} {'live':>7} {'simulate':>10} {'collide':>10} {'serialize':>10} {'publish':>10} "
+          f"{'old json':>10}  targets")
+    failed = False
+    for squares in (int(n) for n in args.squares.split(',')):
+        live, ms = bench(squares, args.ticks)
+        targets = TARGETS.get(squares, {})
+        misses = [phase for phase, budget in targets.items() if ms[phase] > budget]
+        failed = failed or bool(misses)
+        verdict = ('missed: ' + ', '.join(misses)) if misses else ('met' if targets else '-')
+        print(f"{squares:>8,} {live:>7,} {ms['simulate']:>8.3f}ms {ms['collide']:>8.3f}ms "
+              f"{ms['serialize']:>8.3f}ms {ms['publish']:>8.3f}ms {ms['json']:>8.3f}ms  {verdict}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
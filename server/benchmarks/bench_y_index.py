@@ -0,0 +1,88 @@
+"""
+Benchmark: catch and miss detection at 10k live squares, full scan vs y index.
+
+The full-scan variant tests every live square against the paddle and the
+bottom edge each tick and compacts the survivors, as the game did before
+squares were kept ordered by y. The indexed variant is SquareStore, which binary-searches the paddle band
+and the bottom edge and only touches the squares inside them. Squares that
+are caught or missed are replaced at the top so the live count stays level.
+
+Usage (from the server directory):
+    python benchmarks/bench_y_index.py [--squares 10000] [--ticks 500]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from simulation import (
+    SCREEN_WIDTH, SCREEN_HEIGHT, PADDLE_WIDTH, PADDLE_HEIGHT, PADDLE_Y, SQUARE_SIZE,
+    FALL_SPEED, TICK_RATE, SquareStore,
+)
+
+SPEED = FALL_SPEED / TICK_RATE
+
+
+def initial_squares(count, seed=1):
+    """Spreads `count` squares evenly over the screen height."""
+    rng = np.random.default_rng(seed)
+    return list(zip(rng.integers(0, SCREEN_WIDTH - SQUARE_SIZE, count).tolist(),
+                    rng.uniform(-100, SCREEN_HEIGHT, count).tolist()))
+
+
+def bench_full_scan(squares, ticks, paddle_x):
+    x = np.array([sq[0] for sq in squares], dtype=np.float64)
+    y = np.array([sq[1] for sq in squares], dtype=np.float64)
+    ids = np.arange(len(squares), dtype=np.int64)
+    rng = np.random.default_rng(2)
+    start = time.perf_counter()
+    for tick in range(ticks):
+        y += SPEED
+        caught = ((x < paddle_x + PADDLE_WIDTH) & (x + SQUARE_SIZE > paddle_x)
+                  & (y < PADDLE_Y + PADDLE_HEIGHT) & (y + SQUARE_SIZE > PADDLE_Y))
+        alive = ~(caught | (y > SCREEN_HEIGHT))
+        dead = len(x) - int(np.count_nonzero(alive))
+        # Compact the survivors and respawn the dead at the top
+        x = np.concatenate((x[alive], rng.integers(0, SCREEN_WIDTH - SQUARE_SIZE, dead)))
+        y = np.concatenate((y[alive], np.full(dead, -100.0)))
+        ids = np.concatenate((ids[alive], np.full(dead, tick)))
+    return (time.perf_counter() - start) / ticks
+
+
+def bench_indexed(squares, ticks, paddle_x):
+    store = SquareStore(SPEED)
+    store.spawn_many([sq[0] for sq in squares], [sq[1] for sq in squares], range(len(squares)))
+    rng = np.random.default_rng(2)
+    start = time.perf_counter()
+    for tick in range(ticks):
+        store.move()
+        dead = store.catch(paddle_x, PADDLE_Y, PADDLE_WIDTH, PADDLE_HEIGHT)
+        dead += store.miss(SCREEN_HEIGHT)
+        # Respawn the dead at the top
+        store.spawn_many(rng.integers(0, SCREEN_WIDTH - SQUARE_SIZE, dead), np.full(dead, -100.0),
+                         np.full(dead, tick))
+    return (time.perf_counter() - start) / ticks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--squares', type=int, default=10000)
+    parser.add_argument('--ticks', type=int, default=500)
+    args = parser.parse_args()
+
+    squares = initial_squares(args.squares)
+    paddle_x = SCREEN_WIDTH // 2 - PADDLE_WIDTH // 2
+    full = bench_full_scan(squares, args.ticks, paddle_x)
+    indexed = bench_indexed(squares, args.ticks, paddle_x)
+    print(f"{args.squares} live squares, move + catch + miss per tick:")
+    print(f"full scan: {full * 1e6:10,.1f} us/tick")
+    print(f"y index:   {indexed * 1e6:10,.1f} us/tick")
+    print(f"speedup:   {full / indexed:10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
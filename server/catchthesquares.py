@@ -1,138 +1,96 @@
 import pygame
-import random
 import asyncio
 import websockets
 import json
 import threading
 import time
+import argparse
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+
+from simulation import (
+    SCREEN_WIDTH, SCREEN_HEIGHT, TICK_RATE, PADDLE_SPEED, SPAWN_INTERVAL, SPAWN_COUNT, INITIAL_LIVES,
+    REWIND_WINDOW, GameState, swarm_options,
+)
+from gateway import FrameRing, GatewayLink, GatewayRooms, InputRing
+from render import DesktopView
+from replay import finish_replays
+from rooms import DEFAULT_ROOM, RoomManager, clean_room_name, room_name_from_path
+from sharding import ShardMap, run_router
 
 # --- Game Constants ---
-SCREEN_WIDTH = 800
-SCREEN_HEIGHT = 600
-PADDLE_WIDTH = 100
-PADDLE_HEIGHT = 20
-SQUARE_SIZE = 30
-FALL_SPEED = 3
-INITIAL_LIVES = 3
 FONT_SIZE = 36
-FPS = 60 # Game frames per second and WebSocket update rate
-
-# --- Colors ---
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-RED = (255, 0, 0)
-BLUE = (0, 0, 255)
-GREEN = (0, 255, 0)
-
-# --- Game State (shared between Pygame thread and WebSocket server) ---
-# This dictionary holds the current state of the game
-# It must be defined AFTER its dependent constants like SCREEN_WIDTH, INITIAL_LIVES
-game_state = {
-    'paddle_x': SCREEN_WIDTH // 2 - PADDLE_WIDTH // 2,
-    'squares': [], # List of dictionaries: [{'x': int, 'y': int, 'id': str}]
-    'score': 0,
-    'lives': INITIAL_LIVES,
-    'game_over': False
-}
-# A lock to ensure thread-safe access to game_state
-game_state_lock = threading.Lock()
-
-# --- Game Control Input Queue ---
-# Stores control inputs received from web clients, to be processed by Pygame thread
-control_queue = []
-
-# --- Pygame Classes ---
-class Paddle(pygame.sprite.Sprite):
-    """Player-controlled paddle at the bottom of the screen."""
-    def __init__(self):
-        super().__init__()
-        self.image = pygame.Surface([PADDLE_WIDTH, PADDLE_HEIGHT])
-        self.image.fill(BLUE)
-        self.rect = self.image.get_rect()
-        self.rect.centerx = SCREEN_WIDTH // 2
-        self.rect.bottom = SCREEN_HEIGHT - 10
-        self.speed = 8
-
-        # Initialize the shared game_state with the paddle's initial position
-        with game_state_lock:
-            game_state['paddle_x'] = self.rect.x
-
-    def update(self):
-        """Updates paddle position based on keyboard input (desktop) and WebSocket input."""
-        global game_state, game_state_lock, control_queue
-
-        # 1. Handle Keyboard Input (for direct desktop play)
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_LEFT]:
-            self.rect.x -= self.speed
-        if keys[pygame.K_RIGHT]:
-            self.rect.x += self.speed
-
-        # 2. Handle WebSocket Input (from web clients)
-        with game_state_lock:
-            # Process all pending controls from the queue
-            while control_queue:
-                control = control_queue.pop(0) # Get the oldest control
-                if control == 'left':
-                    self.rect.x -= self.speed
-                elif control == 'right':
-                    self.rect.x += self.speed
-
-        # Keep paddle within screen bounds
-        if self.rect.left < 0:
-            self.rect.left = 0
-        if self.rect.right > SCREEN_WIDTH:
-            self.rect.right = SCREEN_WIDTH
-
-        # Update the shared game_state with the paddle's current position
-        with game_state_lock:
-            game_state['paddle_x'] = self.rect.x
-
-class FallingSquare(pygame.sprite.Sprite):
-    """A single falling square."""
-    def __init__(self, square_id):
-        super().__init__()
-        self.image = pygame.Surface([SQUARE_SIZE, SQUARE_SIZE])
-        self.image.fill(GREEN)
-        self.rect = self.image.get_rect()
-        # Random initial X position, starting above the screen
-        self.rect.x = random.randrange(0, SCREEN_WIDTH - SQUARE_SIZE)
-        self.rect.y = random.randrange(-100, -SQUARE_SIZE)
-        self.speed = FALL_SPEED
-        self.id = square_id # Unique ID to help client track individual squares
-
-    def update(self):
-        """Moves the square downwards."""
-        self.rect.y += self.speed
-        # Squares that go off-screen will be handled by the game loop, not here.
+FPS = 60 # Desktop window frames per second
+BROADCAST_RATE = 60 # WebSocket state updates per second
+MAX_CATCHUP_TICKS = 10 # Most simulation ticks run in one pass after a stall
+PORT = 5001 # WebSocket port (the router's port when sharding across workers)
+PARENT_POLL_INTERVAL = 1.0 # Seconds between a child process's checks that its parent is alive
+
+# --- Rooms (shared between Pygame thread and WebSocket server) ---
+# Every room is an independent match with its own state, input queue and
+# clients; the desktop window shows and controls the default room. In a
+# gateway process this is a GatewayRooms relaying to the simulation process
+rooms = RoomManager()
+
+# --- Sharding (set in worker processes only) ---
+# When the server runs as one of several workers, rooms owned by other
+# workers are not hosted here: clients asking for them are redirected
+shard_map = None
+worker_index = None
 
 # --- WebSocket Server Logic ---
-connected_clients = set() # To keep track of all connected WebSocket clients
+def hosted_here(room_name):
+    """True if this process owns `room_name` (always, unless it is a shard worker)."""
+    return shard_map is None or shard_map.owner(room_name) == worker_index
 
 # IMPORTANT: All functions involving 'await' or 'async for' MUST be 'async def'
-async def register(websocket):
-    """Registers a new WebSocket client."""
-    connected_clients.add(websocket)
-    print(f"Client connected: {websocket.remote_address}. Total clients: {len(connected_clients)}")
-
-async def unregister(websocket):
+async def register(websocket, room_name):
+    """Registers a new WebSocket client in a room and returns the room."""
+    room = rooms.join(websocket, room_name)
+    print(f"Client connected: {websocket.remote_address} to room '{room.name}'. "
+          f"Room clients: {len(room.clients)}, rooms: {len(rooms)}")
+    return room
+
+async def unregister(websocket, room):
     """Unregisters a disconnected WebSocket client."""
-    connected_clients.remove(websocket)
-    print(f"Client disconnected: {websocket.remote_address}. Total clients: {len(connected_clients)}")
-
-async def websocket_handler(websocket, path):
-    """Handles incoming WebSocket messages from a client."""
-    await register(websocket) # Register the new client
+    rooms.leave(websocket, room)
+    print(f"Client disconnected: {websocket.remote_address} from room '{room.name}'. "
+          f"Room clients: {len(room.clients)}, rooms: {len(rooms)}")
+
+async def websocket_handler(websocket):
+    """
+    Handles incoming WebSocket messages from a client. The client starts in the
+    room named by the URL path and can switch with {'type': 'join', 'room': name}.
+    Clients asking for a room owned by another shard worker are sent a
+    {'type': 'redirect'} message naming that worker's URL.
+    """
+    room_name = room_name_from_path(websocket.request.path)
+    if not hosted_here(room_name):
+        await websocket.send(shard_map.redirect_message(room_name, websocket))
+        return
+    room = await register(websocket, room_name) # Register the new client
     try:
         # Loop indefinitely to receive messages from this client
         async for message in websocket:
             data = json.loads(message)
             if data.get('type') == 'control':
-                direction = data.get('direction')
-                # Add the control input to the shared queue for the Pygame thread
-                with game_state_lock:
-                    control_queue.append(direction)
-            # You could add handling for other message types here (e.g., 'restart_request')
+                # Add the control input to the room's queue for the simulation thread;
+                # 'tick' is the latest state frame the client had seen, for lag compensation
+                seen_tick = data.get('tick')
+                room.push_control(websocket, data.get('direction'),
+                                  seen_tick if isinstance(seen_tick, int) else None)
+            elif data.get('type') == 'join':
+                name = clean_room_name(data.get('room'))
+                if not hosted_here(name):
+                    await websocket.send(shard_map.redirect_message(name, websocket))
+                elif name != room.name:
+                    await unregister(websocket, room)
+                    room = await register(websocket, name)
+            elif data.get('type') == 'restart':
+                room.restart()
     except websockets.exceptions.ConnectionClosedOK:
         # This exception is raised when a client closes the connection normally
         print(f"Client {websocket.remote_address} connection closed normally.")
@@ -141,35 +99,58 @@ async def websocket_handler(websocket, path):
         print(f"WebSocket error with {websocket.remote_address}: {e}")
     finally:
         # Ensure client is unregistered when connection closes for any reason
-        await unregister(websocket)
-
-async def send_game_state_to_clients():
-    """Continuously sends the current game state to all connected clients."""
-    global game_state
+        await unregister(websocket, room)
+
+async def broadcast():
+    """Sends each room's latest state frame to the clients in that room; returns the number of messages."""
+    sends = []
+    for room in rooms.snapshot():
+        clients = list(room.clients)
+        message = room.client_message() # Published by the simulation thread; never waits for a tick
+        if clients and message is not None:
+            sends.extend(client.send(message) for client in clients)
+
+    # Send the messages to all currently connected clients concurrently
+    if sends:
+        await asyncio.gather(*sends, return_exceptions=True)
+    return len(sends)
+
+async def send_game_state_to_clients(broadcast_rate=BROADCAST_RATE):
+    """Continuously sends each room's game state to the clients in that room."""
     while True:
-        # Send updates at the defined FPS rate
-        await asyncio.sleep(1/FPS)
-
-        if connected_clients:
-            with game_state_lock:
-                # Prepare the game state for JSON serialization.
-                # Convert Pygame sprite objects into simple dictionaries.
-                client_squares = [{'x': sq.rect.x, 'y': sq.rect.y, 'id': sq.id} for sq in game_state['squares']]
-                current_state_for_client = {
-                    'paddle_x': game_state['paddle_x'],
-                    'squares': client_squares,
-                    'score': game_state['score'],
-                    'lives': game_state['lives'],
-                    'game_over': game_state['game_over']
-                }
-            message = json.dumps(current_state_for_client)
-
-            # Send the message to all currently connected clients concurrently
-            if connected_clients:
-                await asyncio.gather(*[client.send(message) for client in connected_clients], return_exceptions=True)
+        # Send updates at the broadcast rate, independently of the simulation tick rate
+        await asyncio.sleep(1/broadcast_rate)
+        await broadcast()
+
+def new_event_loop(use_uvloop=False):
+    """
+    Returns a new event loop for the WebSocket server: with use_uvloop, a
+    uvloop one (faster sockets and scheduling) if uvloop is installed,
+    otherwise asyncio's own loop.
+    """
+    if use_uvloop:
+        try:
+            import uvloop
+        except ImportError:
+            print("uvloop is not installed (pip install uvloop); using the asyncio event loop")
+        else:
+            return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+async def start_websocket_server(broadcast_rate=BROADCAST_RATE, port=PORT, reuse_port=False):
+    """
+    Starts the WebSocket server and the state sender on the running event
+    loop; returns the server. With reuse_port, the listening socket is bound
+    with SO_REUSEPORT so other processes can accept on the same port.
+    """
+    server = await websockets.serve(websocket_handler, "0.0.0.0", port, reuse_port=reuse_port)
+    print(f"WebSocket server successfully started on {server.sockets[0].getsockname()}")
+    # The sender task runs concurrently with the server; keep a reference so it is not collected
+    server.sender = asyncio.create_task(send_game_state_to_clients(broadcast_rate))
+    return server
 
 # THIS IS THE CORRECTED FUNCTION
-def run_websocket_server(loop):
+def run_websocket_server(loop, broadcast_rate=BROADCAST_RATE, port=PORT, reuse_port=False):
     """Function to run the WebSocket server and state sender in a separate thread."""
     asyncio.set_event_loop(loop) # Set the event loop for this specific thread
 
@@ -179,14 +160,9 @@ def run_websocket_server(loop):
         This function will start the server and schedule background tasks.
         """
         try:
-            # Start the WebSocket server. 'await' here ensures that the server
-            # is fully initialized within the context of a running loop.
-            server = await websockets.serve(websocket_handler, "0.0.0.0", 5001)
-            print(f"WebSocket server successfully started on {server.sockets[0].getsockname()}")
-
-            # Create and schedule the game state sender task.
-            # This task will run concurrently with the WebSocket server.
-            asyncio.create_task(send_game_state_to_clients())
+            # Start the WebSocket server and the game state sender task. 'await' here ensures
+            # that the server is fully initialized within the context of a running loop.
+            server = await start_websocket_server(broadcast_rate, port, reuse_port)
 
             # Keep this async function alive indefinitely. This ensures the
             # WebSocket server and sender task continue running.
@@ -206,119 +182,267 @@ def run_websocket_server(loop):
         print(f"Fatal error in WebSocket thread's asyncio loop: {e}")
         # The thread will likely terminate here.
 
-# --- Pygame Game Loop Function ---
-def game():
-    """Main Pygame game loop, runs on the main thread."""
-    global game_state, game_state_lock, control_queue
-
+def client_label(client):
+    """
+    Names a room's client for stats: "host:port" for a WebSocket,
+    "gateway-<n>/<id>" for a gateway client's (gateway, client id) key.
+    """
+    if isinstance(client, tuple):
+        gateway, client_id = client
+        return f"gateway-{gateway}/{client_id}"
+    address = getattr(client, 'remote_address', None) or (id(client),)
+    return ':'.join(map(str, address))
+
+def server_stats(view=None, ticks=0):
+    """
+    Returns the server's counters: ticks run, rooms, clients, control input
+    queues, lag compensation and the desktop window's render caches. Input
+    queue totals cover every client; clients that had inputs dropped are
+    listed individually.
+    """
+    all_rooms = rooms.snapshot()
+    inputs = {'queued': 0, 'high_water': 0, 'received': 0, 'dropped': 0, 'flooding': {}}
+    rewind = {'window_ticks': 0, 'squares': 0, 'bytes': 0, 'rewind_catches': 0}
+    for room in all_rooms:
+        room_rewind = room.rewind_stats()
+        rewind['window_ticks'] = max(rewind['window_ticks'], room_rewind['window_ticks'])
+        for key in ('squares', 'bytes', 'rewind_catches'):
+            rewind[key] += room_rewind[key]
+        for client, queue in room.input_stats().items():
+            inputs['queued'] += queue['depth']
+            inputs['high_water'] = max(inputs['high_water'], queue['high_water'])
+            inputs['received'] += queue['received']
+            inputs['dropped'] += queue['dropped']
+            if queue['dropped']:
+                inputs['flooding'][f"{room.name}/{client_label(client)}"] = queue
+    stats = {'ticks': ticks, 'rooms': len(all_rooms),
+             'clients': sum(len(room.clients) for room in all_rooms), 'inputs': inputs, 'rewind': rewind}
+    if view is not None:
+        stats['render'] = view.stats()
+    return stats
+
+# --- Simulation and Pygame Game Loop Functions ---
+class DesktopControls:
+    """Desktop keyboard input, written by the window thread and read by the simulation thread."""
+    def __init__(self):
+        self.key_move = 0.0 # Paddle pixels per tick from the held arrow keys
+
+
+class TickClock:
+    """
+    Fixed-timestep pacing for the simulation loops: wall-clock time since the
+    previous pass is added to an accumulator and spent in whole ticks of
+    1/tick_rate seconds. At most MAX_CATCHUP_TICKS are kept, so a long stall
+    is caught up without spiralling. realtime=False makes every pass one
+    tick with no pacing (for benchmarks).
+    """
+    def __init__(self, tick_rate=TICK_RATE, realtime=True):
+        self.dt = 1.0 / tick_rate
+        self.realtime = realtime
+        self.accumulator = 0.0
+        self.previous = time.perf_counter()
+
+    def due(self):
+        """Returns the number of ticks due since the previous call."""
+        now = time.perf_counter()
+        self.accumulator = min(self.accumulator + now - self.previous, MAX_CATCHUP_TICKS * self.dt)
+        self.previous = now
+        if not self.realtime:
+            return 1
+        steps = int(self.accumulator / self.dt)
+        self.accumulator -= steps * self.dt
+        return steps
+
+    def wait(self):
+        """Returns the seconds until the next tick is due (0 without pacing)."""
+        return max(0.0, self.dt - self.accumulator) if self.realtime else 0.0
+
+
+def simulate(tick_rate=TICK_RATE, max_ticks=None, realtime=True, controls=None, stop=None,
+             stats_interval=0, view=None, gateways=None):
+    """
+    Ticks every room until `stop` (a threading.Event) is set or max_ticks
+    ticks have run; returns the number of ticks simulated.
+
+    The simulation advances in fixed steps of 1/tick_rate seconds paced by a
+    TickClock: each pass runs as many ticks as wall-clock time demands, then
+    sleeps until the next tick is due. realtime=False runs one tick per pass
+    with no pacing (for benchmarks). The default room also takes the desktop
+    keyboard input in `controls`. With a stats_interval, server_stats() is
+    printed every that many seconds. With `gateways` (a GatewayLink), client
+    events from the gateway processes are applied before each pass and the
+    rooms' frames handed to them after it.
+    """
+    clock = TickClock(tick_rate, realtime)
+    ticks = 0
+    last_stats = time.perf_counter()
+    while not (stop is not None and stop.is_set()):
+        # Work out how many fixed ticks are due since the last pass
+        steps = clock.due()
+        if max_ticks is not None:
+            steps = min(steps, max_ticks - ticks)
+
+        # Game logic updates: every room runs the same number of ticks; WebSocket
+        # controls received since the last pass apply to each room's first tick
+        if gateways:
+            gateways.apply_inputs()
+        rooms.step_all(steps, controls.key_move if controls else 0.0)
+        ticks += steps
+        if gateways and steps:
+            gateways.publish()
+
+        if max_ticks is not None and ticks >= max_ticks:
+            break
+
+        if stats_interval and clock.previous - last_stats >= stats_interval:
+            last_stats = clock.previous
+            stats = server_stats(view, ticks)
+            if gateways:
+                stats['gateways'] = gateways.stats()
+            print(f"Stats: {json.dumps(stats)}")
+
+        if realtime:
+            # Sleep until the next tick is due
+            time.sleep(clock.wait())
+    return ticks
+
+async def simulate_async(tick_rate=TICK_RATE, max_ticks=None, stats_interval=0):
+    """
+    simulate() as a task on the WebSocket server's event loop (single-thread
+    mode): passes run between message handlers on the same thread, so
+    controls reach the rooms with no thread switch and no room lock is ever
+    contended. Returns the number of ticks simulated.
+    """
+    clock = TickClock(tick_rate)
+    ticks = 0
+    last_stats = time.perf_counter()
+    while max_ticks is None or ticks < max_ticks:
+        steps = clock.due()
+        if max_ticks is not None:
+            steps = min(steps, max_ticks - ticks)
+        rooms.step_all(steps)
+        ticks += steps
+
+        if stats_interval and clock.previous - last_stats >= stats_interval:
+            last_stats = clock.previous
+            print(f"Stats: {json.dumps(server_stats(None, ticks))}")
+
+        # Hand the loop to the WebSocket handlers and sender until the next tick is due
+        await asyncio.sleep(clock.wait())
+    return ticks
+
+async def run_single_thread(tick_rate=TICK_RATE, broadcast_rate=BROADCAST_RATE, port=PORT, max_ticks=None,
+                            stats_interval=0):
+    """Runs the WebSocket server, state sender and simulation as tasks on one event loop; returns ticks simulated."""
+    server = await start_websocket_server(broadcast_rate, port)
+    try:
+        return await simulate_async(tick_rate, max_ticks, stats_interval)
+    finally:
+        server.sender.cancel()
+        server.close()
+
+def game(headless=False, tick_rate=TICK_RATE, fps=FPS, max_ticks=None, realtime=True, stats_interval=0):
+    """
+    Runs the simulation of every room and, unless headless, the desktop window
+    showing the default room. Arguments are as for simulate(); returns the
+    number of ticks that were simulated.
+
+    With headless=True no window, font or display surface is created: the
+    simulation runs on this thread and the paddle is driven purely by
+    WebSocket input. Otherwise the simulation runs on its own thread at
+    tick_rate and publishes a snapshot of the default room after the first
+    batch of ticks following each frame, while this thread polls the
+    keyboard and draws the latest snapshot at `fps` frames per second. A slow frame therefore no longer
+    postpones ticks until it is drawn: the simulation only waits for its
+    turn at the GIL, which Python hands over every sys.getswitchinterval()
+    seconds (5ms by default), so passes can still run a few milliseconds
+    late while a frame is rendering. A low fps makes a cheap preview.
+    """
+    if rooms.tick_rate != tick_rate:
+        rooms.set_tick_rate(tick_rate)
+    if headless:
+        return simulate(tick_rate, max_ticks, realtime, stats_interval=stats_interval)
+
+    # pygame.init() also installs SDL's SIGINT/SIGTERM handlers, which turn
+    # signals into QUIT events; headless runs never poll events, so they
+    # skip it and stay killable with Ctrl+C
     pygame.init()
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Catch the Falling Squares (Desktop Server)")
     clock = pygame.time.Clock()
-    font = pygame.font.Font(None, FONT_SIZE)
-
-    # Pygame sprite groups for managing game objects
-    all_sprites = pygame.sprite.Group()
-    falling_squares_pygame_group = pygame.sprite.Group() # Dedicated group for falling squares
-
-    paddle = Paddle() # Create the player's paddle
-    all_sprites.add(paddle) # Add paddle to the all_sprites group
-
-    # Custom event to trigger spawning new squares
-    SPAWN_SQUARE = pygame.USEREVENT + 1
-    pygame.time.set_timer(SPAWN_SQUARE, 1000) # Spawn a new square every 1000ms (1 second)
-
-    square_id_counter = 0 # Unique ID counter for new squares (for client tracking)
-
-    running = True
-    while running:
+    # Squares are simulated in a struct-of-arrays store and drawn with pooled
+    # sprites; only the regions that changed are repainted each frame
+    view = DesktopView(screen, pygame.font.Font(None, FONT_SIZE))
+
+    shown_room = rooms.get(DEFAULT_ROOM)
+    shown_room.start_publishing()
+    frame_state = GameState(tick_rate, record=False) # Latest published snapshot, restored for drawing
+    key_step = PADDLE_SPEED / tick_rate # Paddle motion per tick while an arrow key is held
+    controls = DesktopControls()
+    stop = threading.Event()
+    result = {}
+    simulation_thread = threading.Thread(
+        target=lambda: result.update(ticks=simulate(tick_rate, max_ticks, realtime, controls, stop,
+                                                    stats_interval, view)),
+        name="simulation", daemon=True)
+    simulation_thread.start()
+
+    while simulation_thread.is_alive():
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                running = False # Exit game if window is closed
-            if event.type == SPAWN_SQUARE and not game_state['game_over']:
-                # Spawn a new square and add it to sprite groups
-                square_id_counter += 1
-                new_square = FallingSquare(f"sq_{square_id_counter}")
-                all_sprites.add(new_square)
-                falling_squares_pygame_group.add(new_square)
-
-        # Game logic updates (only if game is not over)
-        with game_state_lock: # Ensure thread safety when accessing shared game_state
-            if not game_state['game_over']:
-                all_sprites.update() # Call update() method on all sprites
-
-                # Check for collisions between paddle and falling squares
-                # 'True' means the square will be removed from the group if caught
-                caught_squares = pygame.sprite.spritecollide(paddle, falling_squares_pygame_group, True)
-                for square in caught_squares:
-                    game_state['score'] += 1 # Increase score for each caught square
-
-                # Check for squares that went off screen (missed)
-                missed_squares_to_remove = []
-                for square in falling_squares_pygame_group:
-                    if square.rect.top > SCREEN_HEIGHT:
-                        game_state['lives'] -= 1 # Lose a life if square is missed
-                        missed_squares_to_remove.append(square) # Mark for removal
-                        if game_state['lives'] <= 0:
-                            game_state['game_over'] = True # Game over if no lives left
-                for square in missed_squares_to_remove:
-                    square.kill() # Remove missed squares from all sprite groups
-
-                # Update the 'squares' list in shared game_state for the client
-                # Convert Pygame sprite objects back into simple dictionaries for JSON
-                game_state['squares'] = [{'x': sq.rect.x, 'y': sq.rect.y, 'id': sq.id} for sq in falling_squares_pygame_group]
-
-                if game_state['lives'] <= 0:
-                    game_state['game_over'] = True
+                stop.set() # Exit game if window is closed
+        # Handle Keyboard Input (for direct desktop play)
+        keys = pygame.key.get_pressed()
+        controls.key_move = (keys[pygame.K_RIGHT] - keys[pygame.K_LEFT]) * key_step
 
         # --- Drawing ---
-        screen.fill(BLACK) # Clear screen with black background
-        all_sprites.draw(screen) # Draw all sprites
-
-        # Display score and lives on the desktop screen
-        score_text = font.render(f"Score: {game_state['score']}", True, WHITE)
-        lives_text = font.render(f"Lives: {game_state['lives']}", True, WHITE)
-        screen.blit(score_text, (10, 10))
-        screen.blit(lives_text, (SCREEN_WIDTH - lives_text.get_width() - 10, 10))
+        frame_state.restore(shown_room.latest_snapshot())
+        view.draw(frame_state) # Repaint what changed and update those parts of the display
 
         # Game Over screen logic
-        if game_state['game_over']:
-            game_over_text = font.render("GAME OVER!", True, RED)
-            restart_text = font.render("Press 'R' to Restart or 'Q' to Quit", True, WHITE)
-            text_rect = game_over_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 20))
-            restart_rect = restart_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 20))
-            screen.blit(game_over_text, text_rect)
-            screen.blit(restart_text, restart_rect)
-
-            keys = pygame.key.get_pressed()
+        if frame_state.game_over:
             if keys[pygame.K_r]:
-                # Reset game state
-                with game_state_lock:
-                    game_state['score'] = 0
-                    game_state['lives'] = INITIAL_LIVES
-                    game_state['game_over'] = False
-                    game_state['squares'] = [] # Clear client's squares too
-
-                # Reset Pygame sprite groups and re-create paddle
-                all_sprites.empty()
-                falling_squares_pygame_group.empty()
-                paddle = Paddle() # Create a new paddle instance
-                all_sprites.add(paddle)
-                # No need to explicitly update game_state['paddle_x'] here, Paddle.__init__ handles it
+                # Reset game state (this also clears the client's squares)
+                shown_room.restart()
 
             elif keys[pygame.K_q]:
-                running = False # Quit game on 'Q' press
+                stop.set() # Quit game on 'Q' press
 
-        pygame.display.flip() # Update the full display Surface to the screen
-        clock.tick(FPS) # Control frame rate
+        clock.tick(fps) # Control frame rate
 
+    stop.set()
+    simulation_thread.join()
+    shown_room.stop_publishing()
     pygame.quit() # Uninitialize Pygame modules
+    return result.get('ticks', 0)
+
+def serve(headless=False, tick_rate=TICK_RATE, fps=FPS, broadcast_rate=BROADCAST_RATE, port=PORT,
+          record_dir=None, stats_interval=0, game_options=None, single_thread=False, use_uvloop=False):
+    """
+    Runs the WebSocket server on a daemon thread and the game loop on this thread.
+    With a record_dir, each room streams its game to a replay file there.
+    game_options (spawn settings, starting lives) apply to every room's GameState.
+    single_thread=True instead runs the server and a headless simulation
+    together on one asyncio event loop (see run_single_thread()). use_uvloop
+    runs the event loop on uvloop when it is installed.
+    """
+    exit_on_sigterm() # SIGTERM exits normally, so replay files are finished
+    rooms.set_tick_rate(tick_rate)
+    rooms.set_game_options(game_options)
+    rooms.set_record_dir(record_dir)
+
+    if single_thread:
+        loop = new_event_loop(use_uvloop)
+        try:
+            loop.run_until_complete(run_single_thread(tick_rate, broadcast_rate, port, stats_interval=stats_interval))
+        finally:
+            loop.close()
+        return
 
-if __name__ == "__main__":
     # 1. Create a new event loop for the WebSocket thread
-    websocket_loop = asyncio.new_event_loop()
+    websocket_loop = new_event_loop(use_uvloop)
     # 2. Start the WebSocket server in a separate daemon thread
-    websocket_thread = threading.Thread(target=run_websocket_server, args=(websocket_loop,))
+    websocket_thread = threading.Thread(target=run_websocket_server, args=(websocket_loop, broadcast_rate, port))
     websocket_thread.daemon = True # Daemon threads exit when the main program exits
     websocket_thread.start()
 
@@ -326,4 +450,236 @@ if __name__ == "__main__":
     time.sleep(0.1)
 
     # 4. Run the Pygame game loop in the main thread
-    game()
\ No newline at end of file
+    game(headless=headless, tick_rate=tick_rate, fps=fps, stats_interval=stats_interval)
+
+def exit_on_sigterm():
+    """
+    Makes SIGTERM (how systemd, docker and kill stop a service) raise
+    SystemExit in the main thread, so `finally` blocks stop child processes
+    and release shared resources as they do on Ctrl+C.
+    """
+    def handle_sigterm(signum, frame):
+        raise SystemExit(128 + signum)
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+def watch_parent(parent_pid):
+    """
+    Starts a daemon thread that interrupts this (child) process once its
+    parent `parent_pid` has gone, even if the parent was killed too hard to
+    stop its children, so orphans never keep a port or a room.
+    """
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(PARENT_POLL_INTERVAL)
+        print(f"Parent process {parent_pid} exited; stopping")
+        os.kill(os.getpid(), signal.SIGINT) # KeyboardInterrupt in the main thread, for a normal shutdown
+        time.sleep(5)
+        os._exit(1) # The main thread did not stop
+    threading.Thread(target=watch, name="parent-watch", daemon=True).start()
+
+def stop_processes(processes, timeout=5.0):
+    """
+    Terminates child processes and waits for them to exit, killing any still
+    running after `timeout` seconds (a SIGTERM arriving while Python runs a
+    finalizer is reported and ignored rather than raised).
+    """
+    for process in processes:
+        process.terminate()
+    deadline = time.perf_counter() + timeout
+    for process in processes:
+        process.join(max(0.0, deadline - time.perf_counter()))
+        if process.exitcode is None:
+            process.kill()
+            process.join()
+
+def serve_worker(index, workers, port, options):
+    """Entry point of a shard worker process: a headless server for its share of the rooms."""
+    global shard_map, worker_index
+    watch_parent(os.getppid())
+    shard_map = ShardMap(workers, port)
+    worker_index = index
+    try:
+        serve(headless=True, port=shard_map.port(index), **options)
+    except KeyboardInterrupt:
+        pass # Ctrl+C, or the supervisor is gone
+    finally:
+        finish_replays() # Process children skip atexit, which does this otherwise
+
+def supervise(workers, port=PORT, **options):
+    """
+    Starts `workers` shard worker processes, each owning a subset of the rooms,
+    and runs the front-door router on `port` in this process. `options` are
+    passed on to each worker's serve(). Workers are stopped when the
+    supervisor exits, including on SIGTERM, and stop themselves if it dies.
+    """
+    exit_on_sigterm()
+    processes = []
+    try:
+        for index in range(workers):
+            process = multiprocessing.Process(target=serve_worker, name=f"worker-{index}",
+                                              args=(index, workers, port, options))
+            process.daemon = True # Workers exit with the supervisor
+            process.start()
+            processes.append(process)
+        run_router(ShardMap(workers, port))
+    finally:
+        stop_processes(processes)
+
+def port_in_use(port):
+    """Returns True if something on this host already accepts connections on `port`."""
+    try:
+        socket.create_connection(('localhost', port), timeout=1).close()
+        return True
+    except OSError:
+        return False
+
+async def flush_gateway_inputs(tick_rate=TICK_RATE):
+    """Sends the gateway's coalesced controls (and any backlogged joins and leaves) to the simulation every tick."""
+    while True:
+        await asyncio.sleep(1/tick_rate)
+        try:
+            rooms.flush()
+        except Exception as e:
+            # Keep flushing: a failure here must not strand every later input in the gateway
+            print(f"Error sending gateway inputs: {e}")
+
+def serve_gateway(index, names, port, tick_rate=TICK_RATE, broadcast_rate=BROADCAST_RATE, use_uvloop=False,
+                  reuse_port=False):
+    """
+    Entry point of a gateway process: the WebSocket server and state sender
+    for clients on `port`, with the rooms replaced by a GatewayRooms on the
+    shared memory rings called `names` (frame ring, input ring).
+    """
+    global rooms
+    watch_parent(os.getppid())
+    frame_name, input_name = names
+    rooms = GatewayRooms(FrameRing.attach(frame_name), InputRing.attach(input_name))
+    print(f"Gateway {index} relaying to the simulation process")
+    loop = new_event_loop(use_uvloop)
+    flusher = loop.create_task(flush_gateway_inputs(tick_rate)) # Runs once the server's loop does
+    try:
+        run_websocket_server(loop, broadcast_rate, port, reuse_port)
+    except KeyboardInterrupt:
+        pass # Ctrl+C, or the simulation process is gone
+
+def serve_gateways(gateways, port=PORT, tick_rate=TICK_RATE, broadcast_rate=BROADCAST_RATE, record_dir=None,
+                   stats_interval=0, game_options=None, use_uvloop=False, max_ticks=None, reuse_port=False):
+    """
+    Runs a headless simulation of every room in this process and `gateways`
+    gateway processes for the WebSocket clients, gateway i on port + i. Each
+    pass writes the rooms' frames to a shared memory FrameRing the gateways
+    broadcast from, and client events come back through one InputRing per
+    gateway (see gateway.py), so sockets, JSON and sends never compete with
+    the simulation for its interpreter. With reuse_port every gateway
+    listens on `port` itself (SO_REUSEPORT) and the kernel spreads incoming
+    connections, and so handshakes, between them. Returns the number of
+    ticks simulated.
+
+    Gateways are stopped and the shared memory released when this returns,
+    including on SIGTERM; gateways stop themselves if this process is
+    killed outright. If a gateway exits on its own (say its port was taken)
+    the simulation stops and RuntimeError is raised.
+
+    SO_REUSEPORT lets a second set of gateways bind next to gateways left
+    over from an earlier server (the kernel would then hand some clients to
+    a different game), so with reuse_port RuntimeError is raised up front if
+    anything already listens on `port`.
+    """
+    if reuse_port and port_in_use(port):
+        raise RuntimeError(f"port {port} is already in use (a running server, or stale gateways "
+                           "from one that was killed?); not sharing it with --reuse-port")
+    exit_on_sigterm()
+    rooms.set_tick_rate(tick_rate)
+    rooms.set_game_options(game_options)
+    rooms.set_record_dir(record_dir)
+    link = GatewayLink(rooms, gateways)
+    processes = []
+    stop = threading.Event()
+    try:
+        for index in range(gateways):
+            process = multiprocessing.Process(target=serve_gateway, name=f"gateway-{index}",
+                                              args=(index, link.names(index), port if reuse_port else port + index,
+                                                    tick_rate, broadcast_rate, use_uvloop, reuse_port))
+            process.daemon = True # Gateways exit with the simulation
+            process.start()
+            processes.append(process)
+
+        def watch_gateways():
+            multiprocessing.connection.wait([process.sentinel for process in processes])
+            stop.set()
+        threading.Thread(target=watch_gateways, name="gateway-watch", daemon=True).start()
+
+        ticks = simulate(tick_rate, max_ticks, stop=stop, stats_interval=stats_interval, gateways=link)
+        for process in processes:
+            if process.exitcode is not None:
+                raise RuntimeError(f"{process.name} exited (code {process.exitcode}); simulation stopped")
+        return ticks
+    finally:
+        stop.set()
+        stop_processes(processes)
+        link.close()
+
+def parse_args(argv=None):
+    """Parses the server's command line options."""
+    parser = argparse.ArgumentParser(description="Catch the Falling Squares game server")
+    parser.add_argument('--headless', action='store_true',
+                        help="run the simulation without opening a Pygame window")
+    parser.add_argument('--tick-rate', type=int, default=TICK_RATE,
+                        help="simulation ticks per second (game speed is unaffected)")
+    parser.add_argument('--fps', type=int, default=FPS,
+                        help="desktop window frames per second")
+    parser.add_argument('--broadcast-rate', type=int, default=BROADCAST_RATE,
+                        help="WebSocket state updates per second")
+    parser.add_argument('--port', type=int, default=PORT,
+                        help="WebSocket port (with --workers, the router port; workers use the next ports)")
+    parser.add_argument('--single-thread', action='store_true',
+                        help="run the simulation as a task on the WebSocket server's event loop (implies --headless)")
+    parser.add_argument('--uvloop', action='store_true',
+                        help="run the WebSocket event loop on uvloop if it is installed")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="shard rooms across this many headless worker processes")
+    parser.add_argument('--gateways', type=int, default=0,
+                        help="simulate in this process and serve clients from this many gateway processes "
+                             "on --port and the next ports, linked by shared memory (implies --headless)")
+    parser.add_argument('--reuse-port', action='store_true',
+                        help="with --gateways, every gateway accepts connections on --port itself (SO_REUSEPORT)")
+    parser.add_argument('--record-dir',
+                        help="stream a replay file of every room's game to this directory")
+    parser.add_argument('--spawn-interval', type=float, default=SPAWN_INTERVAL,
+                        help="seconds between square spawns")
+    parser.add_argument('--spawn-count', type=int, default=SPAWN_COUNT,
+                        help="squares spawned each interval")
+    parser.add_argument('--lives', type=int, default=INITIAL_LIVES,
+                        help="lives at the start of each match")
+    parser.add_argument('--stress', type=int, metavar='SQUARES',
+                        help="stress mode: spawn enough squares every tick to keep about SQUARES falling, "
+                             "with lives that never run out (overrides the three options above)")
+    parser.add_argument('--rewind-window', type=float, default=REWIND_WINDOW,
+                        help="seconds of client lag compensated when catching squares (0 turns it off)")
+    parser.add_argument('--stats-interval', type=float, default=0,
+                        help="print server stats (rooms, clients, render cache hit rates) every this many seconds")
+    args = parser.parse_args(argv)
+    if args.gateways and args.workers:
+        parser.error("--gateways and --workers cannot be combined")
+    if args.reuse_port and not args.gateways:
+        parser.error("--reuse-port needs --gateways")
+    if args.reuse_port and not hasattr(socket, 'SO_REUSEPORT'):
+        parser.error("--reuse-port is not supported on this platform")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    game_options = dict(spawn_interval=args.spawn_interval, spawn_count=args.spawn_count,
+                        initial_lives=args.lives)
+    if args.stress:
+        game_options = swarm_options(args.stress, args.tick_rate)
+    game_options['rewind_window'] = args.rewind_window
+    options = dict(tick_rate=args.tick_rate, broadcast_rate=args.broadcast_rate, record_dir=args.record_dir,
+                   stats_interval=args.stats_interval, game_options=game_options, use_uvloop=args.uvloop)
+    if args.workers > 0:
+        supervise(args.workers, port=args.port, single_thread=args.single_thread, **options)
+    elif args.gateways > 0:
+        serve_gateways(args.gateways, port=args.port, reuse_port=args.reuse_port, **options)
+    else:
+        serve(headless=args.headless, fps=args.fps, port=args.port, single_thread=args.single_thread, **options)
@@ -0,0 +1,222 @@
+"""
+Gymnasium-style environments for training paddle-control agents.
+
+CatchEnv wraps one simulation.GameState; VectorCatchEnv steps many matches
+per call through batchsim.BatchSimulator with the same rules. SyncVectorEnv
+and AsyncVectorEnv batch any list of single environments, in this process
+or one subprocess per environment. The API follows Gymnasium (reset returns
+(obs, info), step returns (obs, reward, terminated, truncated, info)) but
+Gymnasium itself is not required.
+
+Actions are 0 (stay), 1 (left) and 2 (right); a held direction moves the
+paddle at desktop arrow-key speed for one tick. Observations are
+dictionaries with the paddle's x, the (x, y) of the OBS_SQUARES lowest
+squares (lowest first, zero padded) and a mask of which rows are real.
+The reward is the number of squares caught during the step, and an episode
+terminates at game over.
+"""
+import multiprocessing
+import random
+
+import numpy as np
+
+from batchsim import BatchSimulator
+from simulation import PADDLE_SPEED, TICK_RATE, GameState
+
+OBS_SQUARES = 8 # Squares included in each observation
+ACTION_MOVES = np.array([0.0, -1.0, 1.0]) # Paddle direction for actions stay, left, right
+
+
+def _empty_obs(batch_shape=()):
+    return {
+        'paddle_x': np.zeros(batch_shape, dtype=np.float32),
+        'squares': np.zeros(batch_shape + (OBS_SQUARES, 2), dtype=np.float32),
+        'mask': np.zeros(batch_shape + (OBS_SQUARES,), dtype=bool),
+    }
+
+
+class CatchEnv:
+    """A single match driven one tick per step()."""
+    def __init__(self, tick_rate=TICK_RATE, max_episode_ticks=None, seed=None):
+        self.tick_rate = tick_rate
+        self.max_episode_ticks = max_episode_ticks
+        self.paddle_step = PADDLE_SPEED / tick_rate
+        self._seeds = random.Random(seed)
+        self.state = None
+
+    def _obs(self):
+        obs = _empty_obs()
+        obs['paddle_x'][()] = self.state.paddle_x
+        xs, ys = self.state.squares.lowest(OBS_SQUARES)
+        obs['squares'][:len(xs), 0] = xs
+        obs['squares'][:len(xs), 1] = ys
+        obs['mask'][:len(xs)] = True
+        return obs
+
+    def reset(self, seed=None, options=None):
+        """Starts a new match; `seed` fixes its spawn sequence."""
+        if seed is not None:
+            self._seeds.seed(seed)
+        self.state = GameState(self.tick_rate, self._seeds.randrange(2 ** 32), record=False)
+        return self._obs(), {}
+
+    def step(self, action):
+        """Advances one tick; returns (obs, reward, terminated, truncated, info)."""
+        state = self.state
+        score = state.score
+        state.step(ACTION_MOVES[int(action)] * self.paddle_step)
+        truncated = self.max_episode_ticks is not None and state.tick >= self.max_episode_ticks
+        return self._obs(), state.score - score, state.game_over, truncated, {'score': state.score}
+
+    def close(self):
+        pass
+
+
+class VectorCatchEnv:
+    """
+    `num_envs` matches stepped together as arrays. Finished matches are reset
+    within the same step (the returned observation is already the new
+    match's); info['final_score'] holds the score they ended with.
+    """
+    def __init__(self, num_envs, tick_rate=TICK_RATE, max_episode_ticks=None, seed=None):
+        self.num_envs = num_envs
+        self.tick_rate = tick_rate
+        self.max_episode_ticks = max_episode_ticks
+        self.paddle_step = PADDLE_SPEED / tick_rate
+        self._seed = seed
+        self.sim = None
+
+    def _obs(self):
+        sim = self.sim
+        obs = _empty_obs((self.num_envs,))
+        obs['paddle_x'][:] = sim.paddle_x
+        y = np.where(sim.alive, sim.base + sim.offset[:, None], -np.inf)
+        order = np.argsort(-y, axis=1, kind='stable')[:, :OBS_SQUARES]
+        rows = np.arange(self.num_envs)[:, None]
+        obs['mask'][:, :order.shape[1]] = sim.alive[rows, order]
+        obs['squares'][:, :order.shape[1], 0] = np.where(obs['mask'][:, :order.shape[1]], sim.x[rows, order], 0)
+        obs['squares'][:, :order.shape[1], 1] = np.where(obs['mask'][:, :order.shape[1]], y[rows, order], 0)
+        return obs
+
+    def reset(self, seed=None, options=None):
+        """Starts new matches in every environment."""
+        seeds = random.Random(self._seed if seed is None else seed)
+        self.sim = BatchSimulator(self.num_envs, self.tick_rate,
+                                  seeds=[seeds.randrange(2 ** 32) for _ in range(self.num_envs)])
+        self._seeds = seeds
+        return self._obs(), {}
+
+    def step(self, actions):
+        """Advances every match one tick; returns batched (obs, rewards, terminated, truncated, info)."""
+        sim = self.sim
+        score = sim.score.copy()
+        sim.step(ACTION_MOVES[np.asarray(actions)] * self.paddle_step)
+        rewards = sim.score - score
+        terminated = sim.game_over.copy()
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        if self.max_episode_ticks is not None:
+            truncated = ~terminated & (sim.ticks_played >= self.max_episode_ticks)
+        info = {'final_score': np.where(terminated | truncated, sim.score, 0)}
+        done = terminated | truncated
+        if done.any():
+            for g in np.flatnonzero(done).tolist():
+                sim.rngs[g] = random.Random(self._seeds.randrange(2 ** 32))
+            sim.reset(done)
+        return self._obs(), rewards, terminated, truncated, info
+
+    def close(self):
+        pass
+
+
+def _stack(results):
+    """Turns a list of single-env step results into batched arrays, as VectorCatchEnv returns them."""
+    obs, rewards, terminated, truncated, infos = zip(*results)
+    batched = {key: np.stack([o[key] for o in obs]) for key in obs[0]}
+    return (batched, np.array(rewards), np.array(terminated), np.array(truncated),
+            {'final_score': np.array([i.get('final_score', 0) for i in infos])})
+
+
+def _step_autoreset(env, action):
+    """Steps a single env, resetting it in place when its episode ends."""
+    obs, reward, terminated, truncated, info = env.step(action)
+    if terminated or truncated:
+        info = dict(info, final_score=info['score'])
+        obs, _ = env.reset()
+    return obs, reward, terminated, truncated, info
+
+
+class SyncVectorEnv:
+    """Steps a list of single environments one after another in this process."""
+    def __init__(self, env_fns):
+        self.envs = [fn() for fn in env_fns]
+        self.num_envs = len(self.envs)
+
+    def reset(self, seed=None, options=None):
+        obs = [env.reset(seed=None if seed is None else seed + i)[0] for i, env in enumerate(self.envs)]
+        return {key: np.stack([o[key] for o in obs]) for key in obs[0]}, {}
+
+    def step(self, actions):
+        return _stack([_step_autoreset(env, action) for env, action in zip(self.envs, actions)])
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+def _worker(pipe, env_fn):
+    """Subprocess loop of AsyncVectorEnv: runs commands from the parent on one environment."""
+    env = env_fn()
+    try:
+        while True:
+            command, data = pipe.recv()
+            if command == 'step':
+                pipe.send(_step_autoreset(env, data))
+            elif command == 'reset':
+                pipe.send(env.reset(seed=data)[0])
+            elif command == 'close':
+                break
+    finally:
+        env.close()
+        pipe.close()
+
+
+class AsyncVectorEnv:
+    """
+    Runs each environment in its own subprocess and steps them in parallel.
+    The env_fns must be picklable (module-level functions or functools.partial)
+    on platforms that spawn rather than fork.
+    """
+    def __init__(self, env_fns):
+        self.num_envs = len(env_fns)
+        self.pipes = []
+        self.processes = []
+        for env_fn in env_fns:
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker, args=(child, env_fn), daemon=True)
+            process.start()
+            child.close()
+            self.pipes.append(parent)
+            self.processes.append(process)
+
+    def reset(self, seed=None, options=None):
+        for i, pipe in enumerate(self.pipes):
+            pipe.send(('reset', None if seed is None else seed + i))
+        obs = [pipe.recv() for pipe in self.pipes]
+        return {key: np.stack([o[key] for o in obs]) for key in obs[0]}, {}
+
+    def step_async(self, actions):
+        for pipe, action in zip(self.pipes, actions):
+            pipe.send(('step', action))
+
+    def step_wait(self):
+        return _stack([pipe.recv() for pipe in self.pipes])
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        for pipe in self.pipes:
+            pipe.send(('close', None))
+        for process in self.processes:
+            process.join()
@@ -0,0 +1,441 @@
+import collections
+import struct
+import time
+from multiprocessing import shared_memory
+
+from rooms import DEFAULT_ROOM, TICK_MODULUS
+
+FRAME_SLOTS = 8 # Frames kept in the frame ring; a gateway must copy one before this many more are written
+FRAME_SLOT_BYTES = 1 << 20 # Room frames published in one tick must fit in this many bytes
+INPUT_CAPACITY = 4096 # Records a gateway can have waiting for the simulation; later ones wait in the gateway
+MAX_CONTROL_COUNT = 0xffff # Most 'left' (or 'right') inputs one control record carries
+
+# Frame ring: the newest sequence number, then FRAME_SLOTS slots of (sequence, length, payload)
+FRAME_HEADER = struct.Struct('<Q')
+FRAME_SLOT = struct.Struct('<QI4x')
+FRAME_SLOTS_START = 64
+READ_RETRIES = 4 # Attempts at copying the newest frame while the simulation overwrites it
+TRUNCATION_REPORT_INTERVAL = 5.0 # Seconds between reports of rooms left out of full slots
+
+# Frame payload: room count, then per room its name and client frame
+ROOM_COUNT = struct.Struct('<I')
+ROOM_NAME = struct.Struct('<H')
+ROOM_FRAME = struct.Struct('<I')
+
+# Input ring: records written by the gateway, then records read by the simulation
+INPUT_HEAD = struct.Struct('<Q')
+INPUT_TAIL = struct.Struct('<Q')
+INPUT_TAIL_AT = 64
+INPUT_RECORDS_START = 128
+INPUT_ROOM_BYTES = 256 # Room name bytes a record holds; enough for MAX_ROOM_NAME characters
+INPUT_RECORD = struct.Struct(f'<BHHIqH{INPUT_ROOM_BYTES}s') # kind, lefts, rights, client, seen tick (-1: none), room
+JOIN, LEAVE, CONTROL, RESTART = range(4) # Record kinds; restarts name the room rather than a client
+
+
+class FrameRing:
+    """
+    The simulation process's latest room frames in shared memory, for gateway
+    processes to read. One writer (the simulation) and any number of readers.
+
+    Each write goes to the next of FRAME_SLOTS slots: the slot's sequence
+    number is zeroed, the payload written, the slot stamped with its new
+    sequence number and only then the ring's newest sequence number advanced.
+    A reader copies the newest slot and keeps the copy only if the slot still
+    carries the sequence number it started with, so it never sees a torn
+    frame and never makes the writer wait (a seqlock). This relies on other
+    cores seeing the writer's stores in program order, as x86-64 guarantees.
+    """
+    def __init__(self, shm, slots=FRAME_SLOTS, slot_bytes=FRAME_SLOT_BYTES):
+        self.shm = shm
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.sequence = FRAME_HEADER.unpack_from(shm.buf, 0)[0] # Newest sequence number written or read
+        self.truncated = 0 # Writes that left out rooms because they did not fit in a slot
+        self.first_room = 0 # Where the next write starts in the rooms, so left-out rooms take turns
+        self.reported = None # When rooms left out were last reported
+
+    @classmethod
+    def create(cls, slots=FRAME_SLOTS, slot_bytes=FRAME_SLOT_BYTES):
+        """Allocates a new, empty ring."""
+        size = FRAME_SLOTS_START + slots * (FRAME_SLOT.size + slot_bytes)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        shm.buf[:FRAME_SLOTS_START] = bytes(FRAME_SLOTS_START)
+        return cls(shm, slots, slot_bytes)
+
+    @classmethod
+    def attach(cls, name, slots=FRAME_SLOTS, slot_bytes=FRAME_SLOT_BYTES):
+        """Opens the ring called `name` created by another process."""
+        return cls(shared_memory.SharedMemory(name=name), slots, slot_bytes)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def slot_offset(self, sequence):
+        return FRAME_SLOTS_START + sequence % self.slots * (FRAME_SLOT.size + self.slot_bytes)
+
+    def write(self, frames):
+        """
+        Publishes {room name: client frame} as the newest frame. Rooms that do
+        not fit in the slot are left out, counted and reported; each write
+        starts with the first room the previous one left out, so while the
+        slot is too small the rooms take turns rather than the same ones
+        never being published.
+        """
+        buf = self.shm.buf
+        sequence = self.sequence + 1
+        offset = self.slot_offset(sequence)
+        FRAME_SLOT.pack_into(buf, offset, 0, 0)
+        start = offset + FRAME_SLOT.size
+        end = start + self.slot_bytes
+        position = start + ROOM_COUNT.size
+        count = 0
+        items = list(frames.items())
+        first = self.first_room % len(items) if items else 0
+        left_out = [] # (turn, name, size) of the rooms that did not fit
+        for turn, (name, frame) in enumerate(items[first:] + items[:first]):
+            encoded = name.encode('utf-8')
+            size = ROOM_NAME.size + len(encoded) + ROOM_FRAME.size + len(frame)
+            if position + size > end:
+                left_out.append((turn, name, size))
+                continue
+            ROOM_NAME.pack_into(buf, position, len(encoded))
+            position += ROOM_NAME.size
+            buf[position:position + len(encoded)] = encoded
+            position += len(encoded)
+            ROOM_FRAME.pack_into(buf, position, len(frame))
+            position += ROOM_FRAME.size
+            buf[position:position + len(frame)] = frame
+            position += len(frame)
+            count += 1
+        ROOM_COUNT.pack_into(buf, start, count)
+        FRAME_SLOT.pack_into(buf, offset, sequence, position - start)
+        FRAME_HEADER.pack_into(buf, 0, sequence)
+        self.sequence = sequence
+        if left_out:
+            self.truncated += 1
+            # Start the next write at the first room left out that fits a slot on its own
+            fitting = [turn for turn, _, size in left_out if size <= self.slot_bytes - ROOM_COUNT.size]
+            if fitting:
+                self.first_room = first + fitting[0]
+            self.report_left_out(left_out, len(items))
+
+    def report_left_out(self, left_out, rooms):
+        """Prints which rooms a write left out, at most every TRUNCATION_REPORT_INTERVAL seconds."""
+        now = time.perf_counter()
+        if self.reported is not None and now - self.reported < TRUNCATION_REPORT_INTERVAL:
+            return
+        self.reported = now
+        names = ', '.join(repr(name) for _, name, _ in left_out[:5]) + (', ...' if len(left_out) > 5 else '')
+        print(f"Frame ring slot full ({self.slot_bytes} bytes): left out {len(left_out)} of {rooms} rooms "
+              f"({names}); they are published on later ticks in turn")
+        for _, name, size in left_out:
+            if size > self.slot_bytes - ROOM_COUNT.size:
+                print(f"Room {name!r} frame ({size} bytes) can never fit in a frame ring slot")
+
+    def read(self):
+        """
+        Returns {room name: client frame} of the newest frame if one was
+        written since the previous read(), else None.
+        """
+        buf = self.shm.buf
+        for _ in range(READ_RETRIES):
+            sequence = FRAME_HEADER.unpack_from(buf, 0)[0]
+            if sequence == self.sequence:
+                return None
+            offset = self.slot_offset(sequence)
+            stamped, length = FRAME_SLOT.unpack_from(buf, offset)
+            if stamped != sequence:
+                continue # Being overwritten; the header has moved on by now
+            start = offset + FRAME_SLOT.size
+            payload = bytes(buf[start:start + length])
+            if FRAME_SLOT.unpack_from(buf, offset)[0] == sequence:
+                self.sequence = sequence
+                return decode_frames(payload)
+        return None
+
+    def stats(self):
+        return {'frames': self.sequence, 'truncated': self.truncated}
+
+    def close(self, unlink=False):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def decode_frames(payload):
+    """Decodes a frame ring payload into {room name: client frame}."""
+    frames = {}
+    position = ROOM_COUNT.size
+    for _ in range(ROOM_COUNT.unpack_from(payload, 0)[0]):
+        length = ROOM_NAME.unpack_from(payload, position)[0]
+        position += ROOM_NAME.size
+        name = payload[position:position + length].decode('utf-8')
+        position += length
+        length = ROOM_FRAME.unpack_from(payload, position)[0]
+        position += ROOM_FRAME.size
+        frames[name] = payload[position:position + length]
+        position += length
+    return frames
+
+
+class InputRing:
+    """
+    One gateway's client events for the simulation process, in shared memory:
+    joins, leaves, controls and restarts as fixed-size records. A
+    single-producer, single-consumer ring: only the gateway writes records and
+    the head count, only the simulation writes the tail count, so neither
+    side locks. When INPUT_CAPACITY records are waiting push() refuses more;
+    GatewayRooms keeps them until the simulation's next pass makes room.
+    """
+    def __init__(self, shm, capacity=INPUT_CAPACITY):
+        self.shm = shm
+        self.capacity = capacity
+
+    @classmethod
+    def create(cls, capacity=INPUT_CAPACITY):
+        """Allocates a new, empty ring."""
+        shm = shared_memory.SharedMemory(create=True, size=INPUT_RECORDS_START + capacity * INPUT_RECORD.size)
+        shm.buf[:INPUT_RECORDS_START] = bytes(INPUT_RECORDS_START)
+        return cls(shm, capacity)
+
+    @classmethod
+    def attach(cls, name, capacity=INPUT_CAPACITY):
+        """Opens the ring called `name` created by another process."""
+        return cls(shared_memory.SharedMemory(name=name), capacity)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def push(self, record):
+        """Appends one encode_record() record (gateway side); returns False, writing nothing, if the ring is full."""
+        buf = self.shm.buf
+        head = INPUT_HEAD.unpack_from(buf, 0)[0]
+        if head - INPUT_TAIL.unpack_from(buf, INPUT_TAIL_AT)[0] >= self.capacity:
+            return False
+        offset = INPUT_RECORDS_START + head % self.capacity * INPUT_RECORD.size
+        buf[offset:offset + INPUT_RECORD.size] = record
+        INPUT_HEAD.pack_into(buf, 0, head + 1) # Publish the record only once it is written
+        return True
+
+    def drain(self):
+        """Returns the waiting records (simulation side) as (kind, client, room, lefts, rights, seen_tick) tuples."""
+        buf = self.shm.buf
+        head = INPUT_HEAD.unpack_from(buf, 0)[0]
+        tail = INPUT_TAIL.unpack_from(buf, INPUT_TAIL_AT)[0]
+        records = []
+        for index in range(tail, head):
+            kind, lefts, rights, client, seen_tick, length, room = INPUT_RECORD.unpack_from(
+                buf, INPUT_RECORDS_START + index % self.capacity * INPUT_RECORD.size)
+            records.append((kind, client, room[:length].decode('utf-8'), lefts, rights,
+                            None if seen_tick < 0 else seen_tick))
+        INPUT_TAIL.pack_into(buf, INPUT_TAIL_AT, head)
+        return records
+
+    def stats(self):
+        head = INPUT_HEAD.unpack_from(self.shm.buf, 0)[0]
+        return {'received': head, 'depth': head - INPUT_TAIL.unpack_from(self.shm.buf, INPUT_TAIL_AT)[0]}
+
+    def close(self, unlink=False):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def encode_record(kind, client, room='', lefts=0, rights=0, seen_tick=None):
+    """
+    Packs one input ring record. Raises ValueError, before anything is
+    queued, for a record that cannot be packed (say a room name that is not
+    encodable or too long).
+    """
+    try:
+        encoded = room.encode('utf-8')
+        if len(encoded) > INPUT_ROOM_BYTES:
+            raise ValueError(f"name is {len(encoded)} bytes long")
+        return INPUT_RECORD.pack(kind, lefts, rights, client, -1 if seen_tick is None else seen_tick % TICK_MODULUS,
+                                 len(encoded), encoded)
+    except (ValueError, struct.error) as e: # UnicodeEncodeError is a ValueError
+        raise ValueError(f"cannot encode input record for room {room!r}: {e}") from None
+
+
+class GatewayLink:
+    """
+    The simulation process's end of the gateways: a FrameRing all of them
+    read and one InputRing per gateway. Gateway clients are known to the
+    rooms as (gateway, client id) pairs.
+    """
+    def __init__(self, rooms, gateways):
+        self.rooms = rooms
+        self.frames = FrameRing.create()
+        self.inputs = [InputRing.create() for _ in range(gateways)]
+        self.members = {} # (gateway, client id) -> Room the client is in
+
+    def names(self, gateway):
+        """Returns the shared memory names gateway number `gateway` attaches to."""
+        return self.frames.name, self.inputs[gateway].name
+
+    def apply_inputs(self):
+        """Applies every gateway's waiting client events to the rooms."""
+        for gateway, ring in enumerate(self.inputs):
+            for kind, client, room_name, lefts, rights, seen_tick in ring.drain():
+                key = (gateway, client)
+                room = self.members.get(key)
+                if kind == RESTART:
+                    room = self.rooms.get(room_name)
+                    if room is not None:
+                        room.restart()
+                elif kind == JOIN:
+                    if room is not None:
+                        self.rooms.leave(key, room)
+                    self.members[key] = self.rooms.join(key, room_name)
+                elif room is None:
+                    continue
+                elif kind == LEAVE:
+                    del self.members[key]
+                    self.rooms.leave(key, room)
+                elif kind == CONTROL:
+                    room.push_control(key, 'left', seen_tick, lefts)
+                    room.push_control(key, 'right', seen_tick, rights)
+
+    def publish(self):
+        """Writes the frame of every room with gateway clients to the frame ring."""
+        frames = {}
+        for room in self.rooms.snapshot():
+            frame = room.client_message()
+            if room.clients and frame is not None:
+                frames[room.name] = frame
+        self.frames.write(frames)
+
+    def stats(self):
+        return {**self.frames.stats(), 'inputs': [ring.stats() for ring in self.inputs]}
+
+    def close(self):
+        self.frames.close(unlink=True)
+        for ring in self.inputs:
+            ring.close(unlink=True)
+
+
+class GatewayRoom:
+    """
+    A gateway process's view of one room: its local WebSocket clients and the
+    latest frame the simulation published for it. Controls and restarts are
+    forwarded to the simulation through the gateway's GatewayRooms.
+    """
+    def __init__(self, name, gateway_rooms):
+        self.name = name
+        self.clients = set()
+        self.gateway_rooms = gateway_rooms
+
+    def push_control(self, client, direction, seen_tick=None):
+        self.gateway_rooms.push_control(client, direction, seen_tick)
+
+    def restart(self):
+        self.gateway_rooms.send(RESTART, 0, self.name)
+
+    def client_message(self):
+        """Returns the room's latest frame read from the frame ring, or None."""
+        return self.gateway_rooms.frames.get(self.name)
+
+
+class GatewayRooms:
+    """
+    Stands in for the RoomManager in a gateway process, so the WebSocket
+    handler and broadcaster run unchanged: rooms only hold the local clients,
+    membership changes and controls go to the simulation through an
+    InputRing, and snapshot() picks up the newest frames from the FrameRing.
+
+    Joins, leaves and restarts are never dropped: what does not fit in the
+    ring waits in `backlog`, in order, until the simulation has drained it.
+    Controls are coalesced like rooms.InputQueue does: each client's 'left'
+    and 'right' inputs are counted and flush() (called once per tick) sends
+    one record per client that moved, so a flooding client costs the ring
+    one record a tick. Counts wait while membership records are backlogged,
+    so a client's controls never overtake its join.
+    """
+    def __init__(self, frame_ring, input_ring):
+        self.frame_ring = frame_ring
+        self.input_ring = input_ring
+        self.frames = {} # Room name -> latest client frame
+        self.client_ids = {} # WebSocket -> id the simulation knows it by
+        self.next_id = 0
+        self.backlog = collections.deque() # Membership records waiting for room in the ring
+        self.controls = {} # Client id -> [lefts, rights, seen tick] since the last flush
+        self.rooms = {}
+        self.get_or_create(DEFAULT_ROOM)
+
+    def __len__(self):
+        return len(self.rooms)
+
+    def get(self, name):
+        return self.rooms.get(name)
+
+    def get_or_create(self, name):
+        room = self.rooms.get(name)
+        if room is None:
+            room = self.rooms[name] = GatewayRoom(name, self)
+        return room
+
+    def send(self, kind, client_id, room=''):
+        """
+        Queues a join, leave or restart for the simulation and pushes what
+        fits. Raises ValueError, queueing nothing, if the record cannot be
+        packed, so a bad record never blocks the ones behind it.
+        """
+        self.backlog.append(encode_record(kind, client_id, room))
+        self.push_backlog()
+
+    def push_backlog(self):
+        """Moves backlogged records into the ring in order; returns True once none are left."""
+        while self.backlog:
+            if not self.input_ring.push(self.backlog[0]):
+                return False
+            self.backlog.popleft()
+        return True
+
+    def push_control(self, client, direction, seen_tick=None):
+        """Counts a 'left'/'right' input from a client, for the next flush()."""
+        client_id = self.client_ids.get(client)
+        if client_id is None or direction not in ('left', 'right'):
+            return
+        counts = self.controls.get(client_id)
+        if counts is None:
+            counts = self.controls[client_id] = [0, 0, None]
+        side = 0 if direction == 'left' else 1
+        counts[side] = min(counts[side] + 1, MAX_CONTROL_COUNT)
+        counts[2] = seen_tick
+
+    def flush(self):
+        """Sends each client's controls since the last flush as one record; what does not fit waits."""
+        if not self.push_backlog():
+            return
+        for client_id, (lefts, rights, seen_tick) in list(self.controls.items()):
+            if not self.input_ring.push(encode_record(CONTROL, client_id, '', lefts, rights, seen_tick)):
+                return
+            del self.controls[client_id]
+
+    def join(self, client, name):
+        """Adds a client to the named room and tells the simulation (ValueError if the name cannot be sent)."""
+        client_id = (self.next_id + 1) % 2 ** 32 # Record field is a uint32
+        self.send(JOIN, client_id, name)
+        self.client_ids[client] = self.next_id = client_id
+        room = self.get_or_create(name)
+        room.clients.add(client)
+        return room
+
+    def leave(self, client, room):
+        """Removes a client from its room and tells the simulation."""
+        room.clients.discard(client)
+        client_id = self.client_ids.pop(client, None)
+        if client_id is not None:
+            self.controls.pop(client_id, None)
+            self.send(LEAVE, client_id)
+        if not room.clients and room.name != DEFAULT_ROOM:
+            self.rooms.pop(room.name, None)
+
+    def snapshot(self):
+        """Reads the newest frames, if any, and returns a list of the local rooms."""
+        frames = self.frame_ring.read()
+        if frames is not None:
+            self.frames = frames
+        return list(self.rooms.values())
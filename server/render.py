@@ -0,0 +1,251 @@
+"""
+Desktop window rendering. The sprites hold no game state of their own: each
+frame they are moved to mirror the shown room's GameState, and only the
+ones that changed are repainted.
+"""
+from collections import OrderedDict
+
+import pygame
+
+from simulation import SCREEN_WIDTH, SCREEN_HEIGHT, PADDLE_WIDTH, PADDLE_HEIGHT, PADDLE_Y, SQUARE_SIZE
+
+MAX_SQUARE_SPRITES = 500 # Larger boards are drawn in one bulk blit per frame instead of as sprites
+
+# --- Colors ---
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+GREEN = (0, 255, 0)
+
+
+class Paddle(pygame.sprite.DirtySprite):
+    """Desktop view of the paddle."""
+    _layer = 1
+
+    def __init__(self):
+        super().__init__()
+        self.image = pygame.Surface([PADDLE_WIDTH, PADDLE_HEIGHT]).convert()
+        self.image.fill(BLUE)
+        self.rect = self.image.get_rect()
+        self.rect.y = PADDLE_Y
+
+    def follow(self, paddle_x):
+        """Moves the sprite to the simulated paddle position."""
+        x = int(paddle_x)
+        if self.rect.x != x:
+            self.rect.x = x
+            self.dirty = 1
+
+
+class FallingSquare(pygame.sprite.DirtySprite):
+    """Desktop view of one falling square, drawn with its pool's shared image."""
+    _layer = 0
+
+    def __init__(self, image):
+        super().__init__()
+        self.image = image
+        self.rect = image.get_rect()
+        self.square_id = None # Simulated square this sprite currently shows
+        self.seen = 0 # Last SquarePool.sync() frame that saw the square
+
+
+class SquarePool:
+    """
+    Recycles FallingSquare sprites as squares spawn and disappear, so drawing
+    a busy board allocates nothing once the pool has grown to the largest
+    number of squares seen at once. Every sprite shares one pre-filled,
+    display-format image.
+
+    Stats: `hits` are sprites reused from the free list, `misses` are new
+    sprites allocated, `high_water` is the most sprites in use at once.
+    """
+    def __init__(self, image=None, group=None):
+        if image is None:
+            image = pygame.Surface([SQUARE_SIZE, SQUARE_SIZE]).convert()
+            image.fill(GREEN)
+        self.image = image
+        self.free = [] # Released sprites waiting for reuse
+        self.active = {} # Square id -> sprite showing it
+        self.group = pygame.sprite.Group() if group is None else group # Sprites to draw
+        self.frame = 0
+        self.hits = 0
+        self.misses = 0
+        self.high_water = 0
+
+    def acquire(self, square_id):
+        """Returns a sprite for a newly visible square, reusing a free one if possible."""
+        if self.free:
+            sprite = self.free.pop()
+            self.hits += 1
+        else:
+            sprite = FallingSquare(self.image)
+            self.misses += 1
+        sprite.square_id = square_id
+        sprite.dirty = 1
+        self.active[square_id] = sprite
+        self.group.add(sprite)
+        self.high_water = max(self.high_water, len(self.active))
+        return sprite
+
+    def release(self, sprite):
+        """Returns a sprite whose square was caught, missed or cleared to the free list."""
+        del self.active[sprite.square_id]
+        self.group.remove(sprite)
+        self.free.append(sprite)
+
+    def clear(self):
+        """Releases every active sprite."""
+        for sprite in list(self.active.values()):
+            self.release(sprite)
+
+    def sync(self, squares):
+        """Makes the pool's sprites mirror the squares in a SquareStore."""
+        self.frame += 1
+        frame = self.frame
+        active = self.active
+        xs, ys = squares.positions()
+        for square_id, x, y in zip(squares.ids().tolist(), xs.tolist(), ys.tolist()):
+            sprite = active.get(square_id) or self.acquire(square_id)
+            if sprite.rect.topleft != (x, y):
+                sprite.rect.topleft = (x, y)
+                sprite.dirty = 1
+            sprite.seen = frame
+        if len(active) > len(squares):
+            for sprite in [sprite for sprite in active.values() if sprite.seen != frame]:
+                self.release(sprite)
+
+    def stats(self):
+        """Returns the pool's counters as a dictionary."""
+        return {'hits': self.hits, 'misses': self.misses, 'high_water': self.high_water,
+                'active': len(self.active), 'free': len(self.free)}
+
+
+class TextCache:
+    """
+    Rendered text surfaces keyed by (text, color), so HUD lines are only
+    rendered the first time each value appears; score, lives and the banners
+    repeat across frames and matches. The least recently used entries are
+    dropped beyond `max_entries` (the score keeps producing new values).
+    """
+    def __init__(self, font, max_entries=256):
+        self.font = font
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, color):
+        """Returns the rendered surface for `text`, rendering it only on a cache miss."""
+        key = (text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self.surfaces[key] = self.font.render(text, True, color)
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def stats(self):
+        """Returns the cache's counters as a dictionary."""
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.surfaces),
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+class TextSprite(pygame.sprite.DirtySprite):
+    """A line of HUD text drawn from a TextCache; repainted only when its surface changes."""
+    _layer = 2
+
+    def __init__(self, cache, color, **anchor):
+        super().__init__()
+        self.cache = cache
+        self.color = color
+        self.anchor = anchor # get_rect() keyword placing the text, e.g. topleft=(10, 10)
+        self.image = None
+        self.set_text('')
+
+    def set_text(self, text):
+        image = self.cache.render(text, self.color)
+        if image is not self.image:
+            self.image = image
+            self.rect = image.get_rect(**self.anchor)
+            self.dirty = 1
+
+
+class DesktopView:
+    """
+    Draws a game into the window with dirty rectangles: each frame only the
+    regions where sprites moved, appeared, disappeared or changed are cleared
+    to the background, redrawn and pushed to the display with
+    pygame.display.update(rects). full_redraw=True repaints and flips the
+    whole window every frame instead (the old behaviour, for comparison).
+
+    Boards with more than MAX_SQUARE_SPRITES squares (stress matches) change
+    almost everywhere every frame, so there the squares are blitted in bulk
+    onto a copy of the background and the whole window is repainted.
+    """
+    def __init__(self, screen, font, full_redraw=False):
+        self.screen = screen
+        self.full_redraw = full_redraw
+        self.background = pygame.Surface(screen.get_size()).convert()
+        self.background.fill(BLACK)
+        self.swarm_background = self.background.copy() # Background with a large board blitted on
+        self.swarm = False # Whether the last frame was drawn in bulk
+        self.group = pygame.sprite.LayeredDirty()
+        self.group.clear(screen, self.background)
+        self.pool = SquarePool(group=self.group)
+        self.paddle = Paddle()
+        self.text_cache = TextCache(font)
+        self.score_text = TextSprite(self.text_cache, WHITE, topleft=(10, 10))
+        self.lives_text = TextSprite(self.text_cache, WHITE, topright=(SCREEN_WIDTH - 10, 10))
+        self.game_over_text = TextSprite(self.text_cache, RED, center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 20))
+        self.restart_text = TextSprite(self.text_cache, WHITE, center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 20))
+        self.banners = (self.game_over_text, self.restart_text)
+        for banner in self.banners:
+            banner.visible = 0
+        self.group.add(self.paddle, self.score_text, self.lives_text, *self.banners)
+        self.repainted = 0 # Pixels pushed to the display by the last draw()
+        screen.blit(self.background, (0, 0))
+        pygame.display.flip()
+
+    def draw(self, state):
+        """Brings the window up to date with a GameState; returns the updated rectangles."""
+        background = self.background
+        swarm = len(state.squares) > MAX_SQUARE_SPRITES
+        if swarm:
+            self.pool.clear()
+            background = self.swarm_background
+            background.blit(self.background, (0, 0))
+            xs, ys = state.squares.positions()
+            image = self.pool.image
+            background.blits([(image, (x, y)) for x, y in zip(xs.tolist(), ys.tolist())], doreturn=False)
+        else:
+            self.pool.sync(state.squares)
+        full_redraw = self.full_redraw or swarm or self.swarm
+        self.swarm = swarm
+        self.paddle.follow(state.paddle_x)
+        self.score_text.set_text(f"Score: {state.score}")
+        self.lives_text.set_text(f"Lives: {state.lives}")
+        if state.game_over:
+            self.game_over_text.set_text("GAME OVER!")
+            self.restart_text.set_text("Press 'R' to Restart or 'Q' to Quit")
+        for banner in self.banners:
+            if banner.visible != state.game_over:
+                banner.visible = int(state.game_over)
+        if full_redraw:
+            self.group.repaint_rect(self.screen.get_rect())
+        rects = self.group.draw(self.screen, background)
+        if full_redraw:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+        self.repainted = sum(rect.w * rect.h for rect in rects)
+        return rects
+
+    def stats(self):
+        """Returns the square pool and HUD text cache counters."""
+        return {'square_pool': self.pool.stats(), 'text_cache': self.text_cache.stats()}
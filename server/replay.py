@@ -0,0 +1,485 @@
+"""
+Compact binary replay files and deterministic replay of recorded games.
+
+A replay file (.ctsr) is a header followed by a stream of chunks:
+
+    header   b'CTSR', version, tick rate, seed, keyframe interval
+    'K'      keyframe: the full game state after some tick, as written by
+             GameState.snapshot()
+    'R'      tick records: the paddle moves, rewinds and restarts logged
+             since the previous chunk, each stored as a varint tick delta,
+             a kind byte and (for moves) a zigzag varint or a float or (for
+             rewinds) a varint
+    'E'      end: total ticks and the final score, lives and game over flag
+    'I'      seek index: the tick and file offset of every keyframe
+    footer   offset of the 'I' chunk and b'CTSI'
+
+Every chunk is a tag byte, a varint payload length and the payload, so a file
+cut short by a crash can still be read by scanning its chunks. Seeking to
+tick t bisects the index for the last keyframe at or before t, restores it
+and re-simulates at most one keyframe interval of ticks.
+
+Files are written by ReplayWriter, which only takes snapshots and input log
+entries on the calling (simulation) thread; creating the file, record encoding
+and disk writes happen on a background thread. Each keyframe is flushed to
+disk as it is written, so a file whose process was killed keeps its header
+and keyframes. Open files are finished at exit, or by finish_replays() in
+processes that skip atexit (multiprocessing children).
+
+Usage (from the server directory):
+    python replay.py recordings/room-default-1234.ctsr [--seek TICK]
+"""
+import argparse
+import atexit
+import bisect
+import os
+import queue
+import struct
+import threading
+import time
+
+from simulation import GameState, snapshot_tick
+
+MAGIC = b'CTSR'
+INDEX_MAGIC = b'CTSI'
+VERSION = 4 # Keyframes are version 3 GameState.snapshot() payloads
+KEYFRAME_INTERVAL = 600 # Ticks between keyframes (10 seconds at 60 ticks/sec)
+
+HEADER = struct.Struct('<4sBHqI') # magic, version, tick rate, seed, keyframe interval
+FOOTER = struct.Struct('<Q4s') # index chunk offset, index magic
+
+MOVE_INT, MOVE_FLOAT, RESET, REWIND = 0, 1, 2, 3 # Tick record kinds; a rewind precedes its move
+
+
+# --- Varints ---
+def write_varint(out, value):
+    """Appends an unsigned LEB128 varint to the bytearray `out`."""
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    """Reads an unsigned varint from `data` at `pos`; returns (value, new pos)."""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def zigzag(value):
+    """Maps a signed int to an unsigned one (0, -1, 1, -2... -> 0, 1, 2, 3...)."""
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+
+# --- Chunk payloads ---
+def encode_records(entries, last_tick):
+    """Encodes input log entries as tick records; returns (payload, tick of the last entry)."""
+    out = bytearray()
+    write_varint(out, len(entries))
+    for tick, kind, value in entries:
+        write_varint(out, tick - last_tick)
+        last_tick = tick
+        if kind == 'reset':
+            out.append(RESET)
+        elif kind == 'rewind':
+            out.append(REWIND)
+            write_varint(out, value)
+        elif value == int(value): # Keyboard and web moves are whole pixels
+            out.append(MOVE_INT)
+            write_varint(out, zigzag(int(value)))
+        else:
+            out.append(MOVE_FLOAT)
+            out += struct.pack('<d', value)
+    return out, last_tick
+
+
+def decode_records(payload, last_tick):
+    """Decodes a tick records payload into (tick, kind, pixels or rewound ticks) tuples."""
+    count, pos = read_varint(payload, 0)
+    records = []
+    for _ in range(count):
+        delta, pos = read_varint(payload, pos)
+        last_tick += delta
+        kind = payload[pos]
+        pos += 1
+        value = None
+        if kind == MOVE_INT:
+            value, pos = read_varint(payload, pos)
+            value = float(unzigzag(value))
+        elif kind == REWIND:
+            value, pos = read_varint(payload, pos)
+        elif kind == MOVE_FLOAT:
+            value, = struct.unpack_from('<d', payload, pos)
+            pos += 8
+        records.append((last_tick, kind, value))
+    return records
+
+
+# --- Writing ---
+class _BackgroundWriter:
+    """
+    One daemon thread shared by every open ReplayWriter, so the simulation
+    thread only ever appends to a queue. Open writers are finished at exit.
+    """
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.open_writers = set()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        atexit.register(self.shutdown)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            writer, method, args = item
+            if writer.failed:
+                continue
+            try:
+                getattr(writer, method)(*args)
+            except Exception as e: # A failing file must not stop the others
+                print(f"Replay writer for {writer.path} failed: {e}")
+                writer.failed = True
+                if writer.file is not None:
+                    writer.file.close()
+                    writer.file = None
+
+    def shutdown(self):
+        if not self.thread.is_alive():
+            return
+        for writer in list(self.open_writers):
+            writer.close()
+        self.queue.put(None)
+        self.thread.join()
+
+
+_background = None
+_background_lock = threading.Lock()
+
+
+def _background_writer():
+    global _background
+    with _background_lock:
+        if _background is None:
+            _background = _BackgroundWriter()
+        return _background
+
+
+def finish_replays():
+    """Finishes every open replay file and waits until they are written, as happens at exit."""
+    with _background_lock:
+        background = _background
+    if background is not None:
+        background.shutdown()
+
+
+class ReplayWriter:
+    """
+    Streams one game into a replay file. Call capture() after every batch of
+    ticks (with the game's lock held): it takes the new input log entries
+    (emptying state.input_log) and, every `keyframe_interval` ticks, a snapshot
+    of the state. close() appends the end, index and footer chunks. Even the
+    file is created on the background thread, so a slow disk never holds up
+    the caller (which may hold a room or room manager lock).
+    """
+    def __init__(self, path, state, keyframe_interval=KEYFRAME_INTERVAL):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.next_keyframe = state.tick
+        self.final = None # (ticks, score, lives, game_over) as of the last capture
+        self.closed = False
+        self.file = None # Opened by _open() on the background thread
+        self.failed = False # Set on the background thread once writing failed
+        self.background = _background_writer()
+        self.last_tick = state.tick # Base of the next record's tick delta
+        self.index = [] # (tick, offset) of every keyframe written
+        self.background.open_writers.add(self)
+        self.background.queue.put((self, '_open', (state.tick_rate, state.seed)))
+        self.capture(state)
+
+    def capture(self, state):
+        """Hands the ticks run since the last capture to the background thread."""
+        if self.closed:
+            return
+        post = self.background.queue.put
+        if state.input_log:
+            entries, state.input_log = state.input_log, []
+            post((self, '_write_records', (entries,)))
+        if state.tick >= self.next_keyframe:
+            post((self, '_write_keyframe', (state.tick, state.snapshot())))
+            self.next_keyframe = state.tick + self.keyframe_interval
+        self.final = (state.tick, state.score, state.lives, state.game_over)
+
+    def close(self):
+        """Finishes the file in the background; later captures are ignored."""
+        if not self.closed:
+            self.closed = True
+            self.background.open_writers.discard(self)
+            self.background.queue.put((self, '_finish', ()))
+
+    # Everything below runs on the background thread
+    def _open(self, tick_rate, seed):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.file = open(self.path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, tick_rate, seed, self.keyframe_interval))
+        self.position = HEADER.size
+
+    def _chunk(self, tag, payload):
+        header = bytearray(tag)
+        write_varint(header, len(payload))
+        self.file.write(header)
+        self.file.write(payload)
+        self.position += len(header) + len(payload)
+
+    def _write_records(self, entries):
+        payload, self.last_tick = encode_records(entries, self.last_tick)
+        self._chunk(b'R', payload)
+
+    def _write_keyframe(self, tick, snapshot):
+        self.index.append((tick, self.position))
+        self.last_tick = tick
+        self._chunk(b'K', snapshot)
+        self.file.flush() # A killed process still leaves a readable file up to here
+
+    def _finish(self):
+        ticks, score, lives, game_over = self.final
+        end = bytearray()
+        for value in (ticks, zigzag(score), zigzag(lives), game_over):
+            write_varint(end, value)
+        self._chunk(b'E', end)
+        index_offset = self.position
+        index = bytearray()
+        write_varint(index, len(self.index))
+        last_tick = last_offset = 0
+        for tick, offset in self.index:
+            write_varint(index, tick - last_tick)
+            write_varint(index, offset - last_offset)
+            last_tick, last_offset = tick, offset
+        self._chunk(b'I', index)
+        self.file.write(FOOTER.pack(index_offset, INDEX_MAGIC))
+        self.file.close()
+        self.file = None
+
+
+# --- Reading ---
+class ReplayReader:
+    """
+    Reads a replay file. seek(tick) returns the game state after any tick;
+    states() plays the whole game tick by tick.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        if len(self.data) < HEADER.size:
+            raise ValueError(f"{path} is cut short inside its header ({len(self.data)} bytes)")
+        magic, version, self.tick_rate, self.seed, self.keyframe_interval = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} replay file")
+        self.final = None
+        if not self._read_index():
+            self._scan()
+        if not self.keyframes:
+            raise ValueError(f"{path} has no keyframes")
+        self.keyframe_ticks = [tick for tick, _ in self.keyframes]
+
+    def _chunks(self, pos):
+        """Yields (tag, payload, offset) for every complete chunk from `pos` on."""
+        data = self.data
+        while pos < len(data) and data[pos:pos + 1] in (b'K', b'R', b'E'):
+            try:
+                length, start = read_varint(data, pos + 1)
+            except IndexError:
+                return
+            if start + length > len(data):
+                return # Cut short while writing
+            yield data[pos:pos + 1], memoryview(data)[start:start + length], pos
+            pos = start + length
+
+    def _read_index(self):
+        """Loads the trailing seek index; returns False if the file has none."""
+        if len(self.data) < HEADER.size + FOOTER.size:
+            return False
+        index_offset, magic = FOOTER.unpack_from(self.data, len(self.data) - FOOTER.size)
+        if magic != INDEX_MAGIC or self.data[index_offset:index_offset + 1] != b'I':
+            return False
+        _, pos = read_varint(self.data, index_offset + 1)
+        count, pos = read_varint(self.data, pos)
+        self.keyframes = []
+        tick = offset = 0
+        for _ in range(count):
+            delta, pos = read_varint(self.data, pos)
+            tick += delta
+            delta, pos = read_varint(self.data, pos)
+            offset += delta
+            self.keyframes.append((tick, offset))
+        # The end chunk sits right before the index
+        for tag, payload, _ in self._chunks(self.keyframes[-1][1] if self.keyframes else HEADER.size):
+            if tag == b'E':
+                self._read_end(payload)
+        return True
+
+    def _scan(self):
+        """Rebuilds the index by walking every chunk (files left unfinished by a crash)."""
+        self.keyframes = []
+        last_tick = 0
+        for tag, payload, offset in self._chunks(HEADER.size):
+            if tag == b'K':
+                last_tick = snapshot_tick(payload)
+                self.keyframes.append((last_tick, offset))
+            elif tag == b'R':
+                last_tick = decode_records(payload, last_tick)[-1][0]
+            elif tag == b'E':
+                self._read_end(payload)
+        if self.final is None:
+            self.ticks = last_tick
+
+    def _read_end(self, payload):
+        values = []
+        pos = 0
+        for _ in range(4):
+            value, pos = read_varint(payload, pos)
+            values.append(value)
+        self.ticks = values[0]
+        self.final = {'score': unzigzag(values[1]), 'lives': unzigzag(values[2]), 'game_over': bool(values[3])}
+
+    def _ticks_from(self, keyframe):
+        """
+        Restores keyframe number `keyframe` and yields the (same, mutated)
+        GameState after every following tick up to the end of the game.
+        """
+        tick, offset = self.keyframes[keyframe]
+        chunks = self._chunks(offset)
+        state = GameState.from_snapshot(next(chunks)[1], record=False)
+        last_tick = tick
+        for tag, payload, _ in chunks:
+            if tag == b'K': # Later keyframes are only needed for seeking
+                last_tick = snapshot_tick(payload)
+                continue
+            if tag != b'R':
+                continue
+            records = decode_records(payload, last_tick)
+            if records:
+                last_tick = records[-1][0]
+            rewind = 0
+            for record_tick, kind, value in records:
+                # Moves apply on their own tick; restarts after it
+                while state.tick < record_tick - (kind != RESET):
+                    state.step()
+                    yield state
+                if kind == RESET:
+                    state.reset()
+                elif kind == REWIND:
+                    rewind = value
+                else:
+                    state.step(value, rewind)
+                    rewind = 0
+                    yield state
+        while state.tick < self.ticks:
+            state.step()
+            yield state
+
+    def seek(self, tick):
+        """Returns a new GameState as it was right after `tick`."""
+        if not self.keyframe_ticks[0] <= tick <= self.ticks:
+            raise ValueError(f"tick {tick} is outside {self.keyframe_ticks[0]}..{self.ticks}")
+        keyframe = bisect.bisect_right(self.keyframe_ticks, tick) - 1
+        if self.keyframe_ticks[keyframe] == tick:
+            return GameState.from_snapshot(next(self._chunks(self.keyframes[keyframe][1]))[1], record=False)
+        for state in self._ticks_from(keyframe):
+            if state.tick == tick:
+                return state
+
+    def states(self):
+        """Replays the whole game, yielding the (same, mutated) GameState after every tick."""
+        return self._ticks_from(0)
+
+
+def _recorded_game(recording):
+    """Returns a fresh GameState with a recording's settings."""
+    options = {key: recording[key] for key in ('spawn_interval', 'spawn_count', 'initial_lives', 'rewind_window')
+               if key in recording}
+    return GameState(recording['tick_rate'], recording['seed'], record=False, **options)
+
+
+def replay_ticks(recording):
+    """
+    Replays an in-memory recording (GameState.recording()), yielding the
+    (same, mutated) GameState after every tick. Restarts logged after tick t
+    are applied before tick t + 1; those logged after the last tick are
+    applied once the generator is exhausted.
+    """
+    state = _recorded_game(recording)
+    inputs = recording['inputs']
+    i = 0
+    for tick in range(1, recording['ticks'] + 1):
+        while i < len(inputs) and inputs[i][1] == 'reset' and inputs[i][0] < tick:
+            state.reset()
+            i += 1
+        rewind = 0
+        if i < len(inputs) and inputs[i][0] == tick and inputs[i][1] == 'rewind':
+            rewind = inputs[i][2]
+            i += 1
+        move = 0.0
+        if i < len(inputs) and inputs[i][0] == tick and inputs[i][1] == 'move':
+            move = inputs[i][2]
+            i += 1
+        state.step(move, rewind)
+        yield state
+    while i < len(inputs): # Restarts after the last tick
+        state.reset()
+        i += 1
+
+
+def replay(recording):
+    """Replays an in-memory recording to the end and returns the final GameState."""
+    state = _recorded_game(recording)
+    for state in replay_ticks(recording):
+        pass
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded game and check its final state")
+    parser.add_argument('path')
+    parser.add_argument('--seek', type=int, help="only restore the state after this tick and print it")
+    args = parser.parse_args()
+
+    try:
+        reader = ReplayReader(args.path)
+    except ValueError as e:
+        parser.exit(1, f"{e}\n")
+    print(f"{args.path}: {reader.ticks} ticks at {reader.tick_rate} ticks/sec, "
+          f"{len(reader.keyframes)} keyframes, {len(reader.data):,} bytes")
+    start = time.perf_counter()
+    if args.seek is not None:
+        state = reader.seek(args.seek)
+        elapsed = time.perf_counter() - start
+        print(f"seeked to tick {state.tick} in {elapsed * 1000:.2f}ms: {state.to_client_state()}")
+        return
+    state = None
+    for state in reader.states():
+        pass
+    if state is None: # Recorded no ticks after the first keyframe
+        state = reader.seek(reader.ticks)
+    elapsed = time.perf_counter() - start
+    ticks = reader.ticks - reader.keyframe_ticks[0]
+    final = {'score': state.score, 'lives': state.lives, 'game_over': state.game_over}
+    print(f"replayed {ticks} ticks in {elapsed:.3f}s "
+          f"({ticks / max(elapsed, 1e-9):,.0f} ticks/sec): {final}")
+    if reader.final is not None and final != reader.final:
+        raise SystemExit(f"replay diverged: recorded {reader.final}")
+
+
+if __name__ == '__main__':
+    main()
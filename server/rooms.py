@@ -0,0 +1,382 @@
+import os
+import threading
+import urllib.parse
+
+from replay import ReplayWriter
+from simulation import PADDLE_NUDGE, TICK_RATE, GameState
+
+DEFAULT_ROOM = 'default' # Room shown in the desktop window and joined by clients connecting to "/"
+MAX_ROOM_NAME = 64 # Longest accepted room name
+MAX_QUEUED_INPUTS = 64 # Most net control inputs a client can apply in one tick; the excess is dropped
+TICK_MODULUS = 2 ** 32 # Client frames carry the tick modulo this
+
+
+def room_name_from_path(path):
+    """
+    Maps a connection URL path such as "/abc" to a room name ("/" is the
+    default room). The path is percent-decoded, so "/caf%C3%A9" (as browsers
+    send "/café") and a redirect URL for "x?y" name the room they were built from.
+    """
+    return clean_room_name(urllib.parse.unquote(path.split('?', 1)[0].strip('/')))
+
+
+def clean_room_name(name):
+    """
+    Truncates a client-supplied room name, falling back to the default room.
+    Characters UTF-8 cannot encode (lone surrogates, which JSON "\\ud800"
+    escapes can produce) become '?', so every room name can be encoded.
+    """
+    name = str(name or '')[:MAX_ROOM_NAME].encode('utf-8', 'replace').decode('utf-8')
+    return name or DEFAULT_ROOM
+
+
+class InputQueue:
+    """
+    One client's control inputs, coalesced as they arrive: instead of a list
+    of messages it counts the 'left' and 'right' inputs received, and each
+    tick applies the net count since the previous tick, so a tick costs the
+    same however many messages a client sent. The net count is capped at
+    `capacity` inputs either way; the excess is counted as dropped.
+
+    The WebSocket thread only writes the received counts and the simulation
+    thread (holding the room lock) only the drained ones, so neither takes a
+    lock to push or drain. Stats: `received` and `dropped` inputs, and
+    `high_water`, the most inputs received between two ticks.
+
+    Inputs may be stamped with the tick of the latest state frame the client
+    had seen when sending them; `seen_tick` keeps the latest stamp, for lag
+    compensation.
+    """
+    def __init__(self, capacity=MAX_QUEUED_INPUTS):
+        self.capacity = capacity
+        self.lefts = 0 # Inputs received, written by push() only
+        self.rights = 0
+        self.drained_lefts = 0 # Inputs already applied or cleared, written by drain() and clear() only
+        self.drained_rights = 0
+        self.dropped = 0
+        self.high_water = 0
+        self.seen_tick = None # Tick stamp of the latest input (modulo TICK_MODULUS), if stamped
+
+    def push(self, control, seen_tick=None, count=1):
+        """Counts `count` 'left'/'right' inputs; anything else is ignored."""
+        if not count:
+            return
+        self.seen_tick = seen_tick
+        if control == 'left':
+            self.lefts += count
+        elif control == 'right':
+            self.rights += count
+
+    def drain(self):
+        """Returns the net input since the last call, right minus left, capped at `capacity` either way."""
+        lefts, rights = self.lefts, self.rights
+        new_lefts, new_rights = lefts - self.drained_lefts, rights - self.drained_rights
+        self.drained_lefts, self.drained_rights = lefts, rights
+        self.high_water = max(self.high_water, new_lefts + new_rights)
+        net = new_rights - new_lefts
+        if abs(net) > self.capacity:
+            self.dropped += abs(net) - self.capacity
+            net = self.capacity if net > 0 else -self.capacity
+        return net
+
+    def clear(self):
+        """Discards the inputs received since the last drain()."""
+        self.drained_lefts, self.drained_rights = self.lefts, self.rights
+
+    def stats(self):
+        """Returns the pending inputs and counters as a dictionary."""
+        received = self.lefts + self.rights
+        return {'depth': received - self.drained_lefts - self.drained_rights, 'high_water': self.high_water,
+                'received': received, 'dropped': self.dropped}
+
+
+class Published:
+    """
+    What a room's latest step() left for other threads to read: the tick it
+    reached, the latest GameState.snapshot() (while the room is publishing
+    snapshots, else None; it can be from an earlier step, see
+    Room.latest_snapshot()) and the binary client frame (while the room has
+    clients, else None). Never modified once created; the room replaces it
+    as a whole.
+    """
+    __slots__ = ('tick', 'snapshot', 'frame')
+
+    def __init__(self, tick, snapshot=None, frame=None):
+        self.tick = tick
+        self.snapshot = snapshot
+        self.frame = frame
+
+
+class Room:
+    """
+    One independent match: its own game state, per-client input queues,
+    connected clients and tick counter. The lock guards the state between the simulation thread
+    and rare changes from other threads (restarts, restores, recording); the
+    simulation thread holds it for each step.
+
+    Reads never take the lock (read-copy-update): after every step the
+    simulation thread builds a new Published with the client frame and, when
+    the desktop window asked for one, a snapshot, and swaps it into `published` in one
+    reference assignment, which is atomic. The broadcaster and renderer read
+    whichever Published is current and never block a tick, and a tick never
+    waits for them. Control inputs go through one InputQueue per client,
+    which needs no lock either.
+
+    With a record_dir, the game is streamed to a replay file there as it is
+    played, <record_dir>/room-<name>-<seed>.ctsr, which is finished when the
+    room is dropped or its game replaced. `game_options` are passed on to
+    GameState (spawn settings, starting lives, lag compensation window).
+    """
+    def __init__(self, name, tick_rate=TICK_RATE, record_dir=None, game_options=None):
+        self.name = name
+        # Inputs are only logged for a replay file; ReplayWriter.capture() empties the log
+        self.state = GameState(tick_rate, record=bool(record_dir), **(game_options or {}))
+        self.inputs = {} # Client -> InputQueue of controls received, applied on the next tick
+        self.clients = set() # WebSocket connections watching and controlling this room
+        self.lock = threading.Lock()
+        self.record_dir = record_dir
+        self.replay = None # ReplayWriter streaming this game to record_dir
+        self.publish_snapshots = False # Whether step() publishes snapshots (for the desktop window)
+        self.snapshot_wanted = False # Set by latest_snapshot(): the next step() builds a new snapshot
+        self.published = Published(self.state.tick) # Replaced, never modified, after each step
+        if record_dir:
+            self.open_replay()
+
+    def push_control(self, client, direction, seen_tick=None, count=1):
+        """
+        Queues a 'left'/'right' control input from a web client, without taking
+        the lock. `seen_tick` is the tick of the latest state frame the client
+        had received, if it sent one; `count` repeats the input (gateways send
+        counts already coalesced).
+        """
+        queue = self.inputs.get(client)
+        if queue is None:
+            queue = self.inputs[client] = InputQueue()
+        queue.push(direction, seen_tick, count)
+
+    def drain_controls(self):
+        """
+        Takes every client's net input since the last tick and returns the
+        resulting paddle displacement in pixels and the ticks to rewind it by:
+        how far behind the next tick the laggiest moving client's view was
+        (GameState.step() caps it). Must be called with the room lock held.
+        """
+        move = 0
+        rewind = 0
+        next_tick = self.state.tick + 1
+        for queue in list(self.inputs.values()):
+            net = queue.drain()
+            seen_tick = queue.seen_tick
+            if net and seen_tick is not None:
+                lag = (next_tick - seen_tick) % TICK_MODULUS
+                if lag < TICK_MODULUS // 2: # Ticks from the future are not rewound
+                    rewind = max(rewind, lag)
+            move += net
+        return move * PADDLE_NUDGE, rewind
+
+    def input_stats(self):
+        """Returns {client: InputQueue.stats()} for the clients that have sent controls."""
+        return {client: queue.stats() for client, queue in list(self.inputs.items())}
+
+    def rewind_stats(self):
+        """Returns the game's lag compensation window and history size (see GameState.rewind_stats())."""
+        return self.state.rewind_stats()
+
+    def step(self, ticks, key_move=0.0):
+        """
+        Runs `ticks` simulation ticks. Queued web controls apply to the first
+        tick; `key_move` (desktop keyboard) applies to every tick. With no
+        ticks due nothing happens, and queued controls wait for the next tick.
+        """
+        if not ticks:
+            return
+        with self.lock:
+            move, rewind = self.drain_controls()
+            for _ in range(ticks):
+                self.state.step(move + key_move, rewind)
+                move = rewind = 0
+            if self.replay:
+                self.replay.capture(self.state)
+            self.publish()
+
+    def publish(self):
+        """Swaps in a new Published for the current state. Must be called with the room lock held."""
+        state = self.state
+        snapshot = None
+        if self.publish_snapshots:
+            snapshot = self.published.snapshot
+            if self.snapshot_wanted or snapshot is None:
+                self.snapshot_wanted = False # Before building, so a request arriving meanwhile is kept
+                snapshot = state.snapshot()
+        self.published = Published(state.tick, snapshot, state.to_client_frame() if self.clients else None)
+
+    def start_publishing(self):
+        """Makes step() publish snapshots of the state for latest_snapshot() readers."""
+        with self.lock:
+            self.publish_snapshots = True
+            self.snapshot_wanted = True
+            self.publish()
+
+    def stop_publishing(self):
+        with self.lock:
+            self.publish_snapshots = False
+
+    def latest_snapshot(self):
+        """
+        Returns the latest published snapshot (start_publishing() first) and
+        asks for a new one after the next step. Snapshots are only built on
+        request, so they cost the simulation one per frame drawn rather than
+        one per pass; the one returned was taken at the first step after the
+        previous call, which at the default 60 fps is at most a tick old.
+        """
+        self.snapshot_wanted = True
+        return self.published.snapshot
+
+    def restart(self):
+        """Starts a new match in this room once the current one is over."""
+        with self.lock:
+            if self.state.game_over:
+                self.state.restart()
+
+    def snapshot(self):
+        """Returns a GameState.snapshot() of this room's game."""
+        with self.lock:
+            return self.state.snapshot()
+
+    def restore(self, snapshot):
+        """
+        Replaces this room's game with one restored from `snapshot` (possibly
+        taken in another room or process), dropping pending controls. A replay
+        file being recorded is finished and a new one started from the restored tick.
+        """
+        with self.lock:
+            self.close_replay()
+            self.state.restore(snapshot)
+            for queue in list(self.inputs.values()):
+                queue.clear()
+            if self.record_dir:
+                self.open_replay()
+            self.publish()
+
+    def recording_path(self):
+        """Returns the file this room's replay is recorded to."""
+        safe_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in self.name)
+        start = f"-t{self.state.tick}" if self.state.tick else '' # Recordings started mid-game
+        return os.path.join(self.record_dir, f"room-{safe_name}-{self.state.seed}{start}.ctsr")
+
+    def open_replay(self):
+        """Starts streaming the current game to record_dir. Must be called with the room lock held."""
+        self.replay = ReplayWriter(self.recording_path(), self.state)
+
+    def close_replay(self):
+        """Finishes the replay file, if any. Must be called with the room lock held."""
+        if self.replay:
+            self.replay.capture(self.state)
+            self.replay.close()
+            self.replay = None
+
+    def set_record_dir(self, record_dir):
+        """Moves recording to a new directory (None stops recording)."""
+        with self.lock:
+            self.close_replay()
+            self.record_dir = record_dir
+            self.state.record = bool(record_dir)
+            self.state.input_log = []
+            if record_dir:
+                self.open_replay()
+
+    def replace_state(self, state):
+        """Swaps in a new game, finishing the old one's replay file and starting one for the new game."""
+        with self.lock:
+            self.close_replay()
+            self.state = state
+            state.record = bool(self.record_dir)
+            if self.record_dir:
+                self.open_replay()
+            self.publish()
+
+    def client_message(self):
+        """
+        Returns the binary state frame published after the latest step, or None
+        if no step has run since the room's first client joined.
+        """
+        return self.published.frame
+
+
+class RoomManager:
+    """
+    All rooms hosted by this process, keyed by name. The default room always
+    exists; other rooms are created when the first client joins them and
+    removed when the last one leaves.
+    """
+    def __init__(self, tick_rate=TICK_RATE, record_dir=None, game_options=None):
+        self.tick_rate = tick_rate
+        self.record_dir = record_dir
+        self.game_options = dict(game_options or {}) # GameState options of every room
+        self.rooms = {}
+        self.lock = threading.Lock() # Guards the rooms dictionary, not the rooms themselves
+        self.get_or_create(DEFAULT_ROOM)
+
+    def __len__(self):
+        return len(self.rooms)
+
+    def get(self, name):
+        """Returns the room called `name`, or None."""
+        return self.rooms.get(name)
+
+    def get_or_create(self, name):
+        """Returns the room called `name`, creating it if needed."""
+        with self.lock:
+            room = self.rooms.get(name)
+            if room is None:
+                room = self.rooms[name] = Room(name, self.tick_rate, self.record_dir, self.game_options)
+            return room
+
+    def join(self, client, name):
+        """Adds a client to the named room and returns the room."""
+        room = self.get_or_create(name)
+        room.clients.add(client)
+        return room
+
+    def leave(self, client, room):
+        """Removes a client from its room, dropping the room if it is now empty."""
+        room.clients.discard(client)
+        room.inputs.pop(client, None)
+        with self.lock:
+            dropped = not room.clients and room.name != DEFAULT_ROOM
+            if dropped:
+                self.rooms.pop(room.name, None)
+        if dropped:
+            with room.lock:
+                room.close_replay()
+
+    def set_record_dir(self, record_dir):
+        """Sets where every room (existing and future) saves its replay recordings."""
+        with self.lock:
+            self.record_dir = record_dir
+            for room in self.rooms.values():
+                room.set_record_dir(record_dir)
+
+    def set_tick_rate(self, tick_rate):
+        """Switches every room (existing and future) to a new tick rate, restarting their matches."""
+        with self.lock:
+            self.tick_rate = tick_rate
+            for room in self.rooms.values():
+                room.replace_state(GameState(tick_rate, **self.game_options))
+
+    def set_game_options(self, game_options):
+        """Switches every room (existing and future) to new GameState options, restarting their matches."""
+        with self.lock:
+            self.game_options = dict(game_options or {})
+            for room in self.rooms.values():
+                room.replace_state(GameState(self.tick_rate, **self.game_options))
+
+    def snapshot(self):
+        """Returns a list of the current rooms, safe to iterate while rooms come and go."""
+        with self.lock:
+            return list(self.rooms.values())
+
+    def step_all(self, ticks, default_key_move=0.0):
+        """Runs `ticks` ticks in every room; keyboard input only drives the default room."""
+        for room in self.snapshot():
+            room.step(ticks, default_key_move if room.name == DEFAULT_ROOM else 0.0)
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import urllib.parse
+import zlib
+
+import websockets
+
+from rooms import room_name_from_path
+
+
+class ShardMap:
+    """
+    Assigns every room to one of `workers` worker processes. Worker i serves
+    its rooms on port base_port + 1 + i; base_port itself is the front-door
+    router. The assignment is a stable hash of the room name, so the router
+    and every worker agree on it without talking to each other.
+    """
+    def __init__(self, workers, base_port):
+        self.workers = workers
+        self.base_port = base_port
+
+    def owner(self, room_name):
+        """Returns the index of the worker that owns `room_name`."""
+        return zlib.crc32(room_name.encode('utf-8')) % self.workers
+
+    def port(self, worker):
+        """Returns the port worker number `worker` listens on."""
+        return self.base_port + 1 + worker
+
+    def redirect_url(self, room_name, host_header):
+        """
+        Returns the URL a client should reconnect to for `room_name`, reusing
+        the host name the client used to reach us (from the Host header). The
+        room name is percent-encoded, so '?', '#' and '/' in it survive the trip.
+        """
+        host = (host_header or 'localhost').rsplit(':', 1)[0]
+        return f"ws://{host}:{self.port(self.owner(room_name))}/{urllib.parse.quote(room_name, safe='')}"
+
+    def redirect_message(self, room_name, websocket):
+        """Returns the JSON 'redirect' message sending a client to the owner of `room_name`."""
+        url = self.redirect_url(room_name, websocket.request.headers.get('Host'))
+        return json.dumps({'type': 'redirect', 'room': room_name, 'url': url})
+
+
+def run_router(shard_map, host="0.0.0.0"):
+    """
+    Runs the front-door router until the process exits. Each client is told
+    which worker owns the room in its URL path and then disconnected; it
+    reconnects to that worker directly, so game traffic never passes through
+    the router and throughput scales with the number of workers.
+    """
+    async def router_handler(websocket):
+        room_name = room_name_from_path(websocket.request.path)
+        await websocket.send(shard_map.redirect_message(room_name, websocket))
+        await websocket.close()
+
+    async def start_router():
+        server = await websockets.serve(router_handler, host, shard_map.base_port)
+        print(f"Router successfully started on {server.sockets[0].getsockname()} "
+              f"for {shard_map.workers} workers")
+        await server.wait_closed()
+
+    asyncio.run(start_router())
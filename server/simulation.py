@@ -0,0 +1,549 @@
+import random
+import struct
+from collections import deque
+
+import numpy as np
+
+# --- Game Constants ---
+SCREEN_WIDTH = 800
+SCREEN_HEIGHT = 600
+PADDLE_WIDTH = 100
+PADDLE_HEIGHT = 20
+PADDLE_Y = SCREEN_HEIGHT - 10 - PADDLE_HEIGHT # Top edge of the paddle
+SQUARE_SIZE = 30
+INITIAL_LIVES = 3
+
+# Speeds are in pixels per second so the game plays the same at any tick rate
+TICK_RATE = 60 # Simulation steps per second
+FALL_SPEED = 180 # Falling squares (3 pixels per tick at 60 Hz)
+PADDLE_SPEED = 480 # Paddle while a desktop arrow key is held (8 pixels per tick at 60 Hz)
+PADDLE_NUDGE = 8 # Pixels the paddle moves per web 'control' message
+SPAWN_INTERVAL = 1.0 # Seconds between new falling squares
+SPAWN_COUNT = 1 # Squares spawned each interval
+REWIND_WINDOW = 0.25 # Seconds of lag compensated for web clients' paddle moves
+GRID_CELL = SQUARE_SIZE # Width of the x columns used by the multi-paddle broad-phase
+GRID_COLUMNS = -(-SCREEN_WIDTH // GRID_CELL)
+
+# --- Snapshot Layout ---
+SNAPSHOT_VERSION = 3
+# version, tick_rate, seed, spawn_interval_ticks, spawn_count, initial_lives, rewind_ticks, tick,
+# paddle_x, score, lives, game_over, spawn_countdown, square_id_counter, fall offset, square count;
+# then the RNG state, the square arrays, and the missed square history: tick count, square
+# count of each tick, then the x and base arrays of all its squares
+SNAPSHOT = struct.Struct('<BHqIIqIqdqq?qqdI')
+RNG_STATE = struct.Struct('<i625I?d') # Mersenne Twister version, state words, has gauss_next, gauss_next
+
+
+def snapshot_tick(snapshot):
+    """Returns the tick a GameState.snapshot() was taken after, without restoring it."""
+    return SNAPSHOT.unpack_from(snapshot)[7]
+
+EMPTY = np.zeros(0) # Stands in for a tick without missed squares when writing snapshots
+
+# --- Client Frame Layout ---
+# Binary state message sent to web clients: frame type, tick, paddle_x, score, lives,
+# game_over, square count; then int16 x, int16 y and uint32 id arrays (all little-endian)
+STATE_FRAME = 1
+CLIENT_FRAME = struct.Struct('<BIhdd?I')
+
+
+def swarm_options(live_squares, tick_rate=TICK_RATE):
+    """
+    Returns GameState options for a stress match that keeps about
+    `live_squares` squares falling at once: a batch spawns every tick and
+    lives never run out.
+    """
+    lifetime = (SCREEN_HEIGHT + 65) / (FALL_SPEED / tick_rate) # Ticks from an average spawn height to the bottom
+    return {'spawn_interval': 1 / tick_rate, 'spawn_count': max(1, round(live_squares / lifetime)),
+            'initial_lives': 2 ** 62}
+
+
+class SquareStore:
+    """
+    Falling squares stored as a struct of contiguous NumPy arrays, ordered by y.
+
+    All squares in a store fall at the same speed, so their vertical order
+    never changes once spawned. Each square keeps its x, id and `base` y (its
+    y minus the store's running fall offset), and moving every square is a
+    single addition to that offset. Live squares occupy slots [head, tail),
+    sorted by base y with the highest square first, which turns catch and
+    miss detection into binary searches for the paddle band and the bottom
+    edge: only the k squares inside those regions are ever touched.
+
+    New squares spawn near the top and are inserted near `head`; missed
+    squares are dropped by moving `tail`, so neither end needs to shift the
+    whole array.
+
+    For several paddles the band is further split into x columns of width
+    GRID_CELL: each square's column is fixed at spawn (squares never move
+    sideways) and travels with it, so each paddle only tests the squares in
+    the columns it overlaps.
+    """
+    FIELDS = ('x', 'base', 'id', 'col')
+
+    def __init__(self, speed, capacity=64):
+        self.speed = speed # Pixels every square falls per tick
+        self.offset = 0.0 # Total distance fallen since the store was cleared
+        self.head = self.tail = capacity // 2 # Room to insert at either end
+        self.x = np.zeros(capacity, dtype=np.float64)
+        self.base = np.zeros(capacity, dtype=np.float64)
+        self.id = np.zeros(capacity, dtype=np.int64)
+        self.col = np.zeros(capacity, dtype=np.int64) # Broad-phase column of each square
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def _recentre(self, extra=1):
+        """
+        Moves the live squares back to the middle of the arrays, growing them
+        until at least `extra` free slots are left at the front.
+        """
+        n = len(self)
+        capacity = len(self.x)
+        while (n + extra) * 2 + 2 > capacity:
+            capacity *= 2
+        head = (capacity - n) // 2
+        for name in self.FIELDS:
+            old = getattr(self, name)
+            new = old if capacity == len(old) else np.zeros(capacity, dtype=old.dtype)
+            new[head:head + n] = old[self.head:self.tail]
+            setattr(self, name, new)
+        self.head, self.tail = head, head + n
+
+    def spawn(self, x, y, square_id):
+        """Adds one square with its top-left corner at (x, y)."""
+        if self.head == 0:
+            self._recentre()
+        base = y - self.offset
+        # Squares above the new one (usually few or none) shift up one slot
+        at = self.head + int(np.searchsorted(self.base[self.head:self.tail], base, 'right'))
+        self.head -= 1
+        for name in self.FIELDS:
+            arr = getattr(self, name)
+            arr[self.head:at - 1] = arr[self.head + 1:at]
+        self.x[at - 1] = x
+        self.base[at - 1] = base
+        self.id[at - 1] = square_id
+        self.col[at - 1] = int(x // GRID_CELL)
+
+    def spawn_many(self, xs, ys, square_ids):
+        """
+        Adds a batch of squares. Only the existing squares above the lowest new
+        one are touched, so spawning near the top stays cheap at any size.
+        """
+        count = len(xs)
+        if count == 0:
+            return
+        if self.head < count:
+            self._recentre(count)
+        bases = np.asarray(ys, dtype=np.float64) - self.offset
+        order = np.argsort(bases, kind='stable')
+        bases = bases[order]
+        # Existing squares at or above the lowest new square are merged with the batch
+        at = self.head + int(np.searchsorted(self.base[self.head:self.tail], bases[-1], 'right'))
+        merge = None
+        if at > self.head:
+            merge = np.argsort(np.concatenate((self.base[self.head:at], bases)), kind='stable')
+        new_head = self.head - count
+        xs = np.asarray(xs, dtype=np.float64)[order]
+        for name, new in (('x', xs),
+                          ('base', bases),
+                          ('id', np.asarray(square_ids, dtype=np.int64)[order]),
+                          ('col', (xs // GRID_CELL).astype(np.int64))):
+            arr = getattr(self, name)
+            if merge is None: # Whole batch is above every existing square
+                arr[new_head:self.head] = new
+            else:
+                arr[new_head:at] = np.concatenate((arr[self.head:at], new))[merge]
+        self.head = new_head
+
+    def clear(self):
+        """Removes every square."""
+        self.offset = 0.0
+        self.head = self.tail = len(self.x) // 2
+
+    def live(self):
+        """Returns copies of the live squares' (x, base, id) arrays, highest square first."""
+        head, tail = self.head, self.tail
+        return self.x[head:tail].copy(), self.base[head:tail].copy(), self.id[head:tail].copy()
+
+    def load(self, xs, bases, ids, offset):
+        """Replaces every square with ones exported by live(), at fall offset `offset`."""
+        self.clear()
+        if self.head < len(xs):
+            self._recentre(len(xs))
+        self.offset = offset
+        self.tail = self.head + len(xs)
+        self.x[self.head:self.tail] = xs
+        self.base[self.head:self.tail] = bases
+        self.id[self.head:self.tail] = ids
+        self.col[self.head:self.tail] = (self.x[self.head:self.tail] // GRID_CELL).astype(np.int64)
+
+    def move(self):
+        """Advances every square by one tick of the fall speed."""
+        self.offset += self.speed
+
+    def _band(self, top, bottom):
+        """Returns the slot range of squares whose top edge y satisfies top < y < bottom."""
+        base = self.base[self.head:self.tail]
+        lo = int(np.searchsorted(base, top - self.offset, 'right'))
+        hi = int(np.searchsorted(base, bottom - self.offset, 'left'))
+        return self.head + lo, self.head + hi
+
+    def _remove_from_band(self, lo, hi, keep):
+        """Deletes the squares in slots [lo, hi) where `keep` is False; the squares below close the gap."""
+        removed = hi - lo - int(np.count_nonzero(keep))
+        if removed:
+            for name in self.FIELDS:
+                arr = getattr(self, name)
+                kept = arr[lo:hi][keep]
+                below = arr[hi:self.tail].copy()
+                arr[lo:lo + len(kept)] = kept
+                arr[lo + len(kept):self.tail - removed] = below
+            self.tail -= removed
+        return removed
+
+    def catch(self, left, top, width, height):
+        """
+        Kills every square overlapping the given rectangle and returns how many
+        were caught. Uses the same strict-overlap test as pygame.Rect.colliderect,
+        but only on squares in the rectangle's vertical band.
+        """
+        lo, hi = self._band(top - SQUARE_SIZE, top + height)
+        if lo == hi:
+            return 0
+        x = self.x[lo:hi]
+        return self._remove_from_band(lo, hi, (x >= left + width) | (x + SQUARE_SIZE <= left))
+
+    def catch_paddles(self, lefts, top, width, height):
+        """
+        Catches squares for several same-sized paddles on one row, whose left
+        edges are `lefts`, and returns how many each paddle caught. A square
+        touching several paddles goes to the first of them, as if catch() had
+        been called for each paddle in turn.
+        """
+        if len(lefts) == 1:
+            return [self.catch(lefts[0], top, width, height)]
+        lo, hi = self._band(top - SQUARE_SIZE, top + height)
+        if lo == hi:
+            return [0] * len(lefts)
+        # Bucket the band's squares by column: bucket c is order[starts[c]:starts[c + 1]]
+        x = self.x[lo:hi]
+        col = self.col[lo:hi]
+        order = np.argsort(col, kind='stable')
+        starts = np.searchsorted(col[order], np.arange(GRID_COLUMNS + 1))
+        # Each paddle's candidates are the contiguous run of buckets it overlaps;
+        # expand them into (paddle, square) pairs in paddle order
+        lefts = np.asarray(lefts, dtype=np.float64)
+        first = np.clip((lefts - SQUARE_SIZE) // GRID_CELL, 0, GRID_COLUMNS - 1).astype(np.int64)
+        last = np.clip((lefts + width) // GRID_CELL, 0, GRID_COLUMNS - 1).astype(np.int64)
+        begin = starts[first]
+        lengths = starts[last + 1] - begin
+        pair_paddle = np.repeat(np.arange(len(lefts)), lengths)
+        pair_slot = np.arange(len(pair_paddle)) + np.repeat(begin - (np.cumsum(lengths) - lengths), lengths)
+        candidates = order[pair_slot]
+        cx = x[candidates]
+        pair_left = lefts[pair_paddle]
+        hit = (cx < pair_left + width) & (cx + SQUARE_SIZE > pair_left)
+        # A square touched by several paddles belongs to the first one
+        owner = np.full(hi - lo, len(lefts))
+        np.minimum.at(owner, candidates[hit], pair_paddle[hit])
+        keep = owner == len(lefts)
+        counts = np.bincount(owner[~keep], minlength=len(lefts))
+        self._remove_from_band(lo, hi, keep)
+        return counts.tolist()
+
+    def miss(self, bottom=SCREEN_HEIGHT):
+        """Kills every square whose top edge is below `bottom`; returns how many."""
+        base = self.base[self.head:self.tail]
+        keep = self.head + int(np.searchsorted(base, bottom - self.offset, 'right'))
+        missed = self.tail - keep
+        self.tail = keep
+        return missed
+
+    def take_missed(self, bottom=SCREEN_HEIGHT):
+        """Like miss(), but returns copies of the killed squares' (x, base) arrays."""
+        base = self.base[self.head:self.tail]
+        keep = self.head + int(np.searchsorted(base, bottom - self.offset, 'right'))
+        if keep == self.tail:
+            return EMPTY, EMPTY
+        missed = self.x[keep:self.tail].copy(), self.base[keep:self.tail].copy()
+        self.tail = keep
+        return missed
+
+    def ids(self):
+        """Returns the ids of the live squares, in the same order as positions()."""
+        return self.id[self.head:self.tail]
+
+    def positions(self):
+        """Returns (x, y) integer pixel arrays for drawing."""
+        head, tail = self.head, self.tail
+        return (np.floor(self.x[head:tail]).astype(np.int64),
+                np.floor(self.base[head:tail] + self.offset).astype(np.int64))
+
+    def lowest(self, count):
+        """Returns float (x, y) arrays of the `count` lowest squares, lowest first."""
+        start = max(self.head, self.tail - count)
+        return self.x[start:self.tail][::-1], self.base[start:self.tail][::-1] + self.offset
+
+    def to_client_list(self):
+        """Converts the live squares into the dictionaries sent to web clients."""
+        xs, ys = self.positions()
+        return [{'x': x, 'y': y, 'id': f"sq_{i}"}
+                for x, y, i in zip(xs.tolist(), ys.tolist(), self.ids().tolist())]
+
+
+class GameState:
+    """
+    Authoritative state and rules of one match, advanced in fixed timesteps.
+
+    Each call to step() advances the game by exactly 1/tick_rate seconds and
+    increments `tick`, independently of how often (or how late) it is called,
+    so rendering, broadcasting and wall-clock stalls never change game speed.
+
+    The game draws spawn positions from its own RNG seeded with `seed`, and
+    (with record=True) logs every paddle move and restart against the tick it
+    happened on. The seed, tick rate and input log are all that is needed to
+    replay the game exactly (see replay.py).
+
+    spawn_count squares spawn every spawn_interval seconds and each match
+    starts with initial_lives; swarm_options() turns these up for stress runs.
+
+    Paddle moves can be lag compensated (see step()) by up to rewind_window
+    seconds. Live squares' past positions follow from their current ones,
+    since every square falls at the same speed; squares that fell off the
+    bottom are kept for rewind_window seconds in `missed`, a ring buffer of
+    one (x, base) pair of arrays per tick, whose size rewind_stats() reports.
+    """
+    def __init__(self, tick_rate=TICK_RATE, seed=None, record=True, spawn_interval=SPAWN_INTERVAL,
+                 spawn_count=SPAWN_COUNT, initial_lives=INITIAL_LIVES, rewind_window=REWIND_WINDOW):
+        self.tick_rate = tick_rate
+        self.seed = random.randrange(2 ** 63) if seed is None else seed
+        self.rng = random.Random(self.seed) # Source of square spawn positions
+        self.record = record
+        self.input_log = [] # (tick, 'move', pixels), (tick, 'rewind', ticks) and (tick, 'reset', None) entries
+        self.fall_step = FALL_SPEED / tick_rate # Square motion per tick
+        self.spawn_interval_ticks = max(1, round(spawn_interval * tick_rate))
+        self.spawn_count = spawn_count
+        self.initial_lives = initial_lives
+        self.rewind_ticks = round(rewind_window * tick_rate) # Most ticks a paddle move is rewound by
+        self.missed = deque(maxlen=self.rewind_ticks) # (x, base) arrays of squares missed on recent ticks
+        self.rewind_catches = 0 # Squares caught only thanks to lag compensation (a stat, not in snapshots)
+        self.squares = SquareStore(self.fall_step)
+        self.tick = 0
+        self.reset()
+
+    def restart(self):
+        """Starts a new match, recording the restart in the input log."""
+        if self.record:
+            self.input_log.append((self.tick, 'reset', None))
+        self.reset()
+
+    def reset(self):
+        """Starts a new match: full lives, no squares, paddle centred."""
+        self.paddle_x = float(SCREEN_WIDTH // 2 - PADDLE_WIDTH // 2)
+        self.squares.clear()
+        self.missed.clear()
+        self.score = 0
+        self.lives = self.initial_lives
+        self.game_over = False
+        self.spawn_countdown = self.spawn_interval_ticks
+        self.square_id_counter = 0 # Unique ID counter for new squares (for client tracking)
+
+    def spawn_square(self):
+        """Spawns one falling square at a random x position, starting above the screen."""
+        self.square_id_counter += 1
+        self.squares.spawn(self.rng.randrange(0, SCREEN_WIDTH - SQUARE_SIZE),
+                           self.rng.randrange(-100, -SQUARE_SIZE),
+                           self.square_id_counter)
+
+    def spawn_squares(self, count):
+        """Spawns `count` squares, drawing the same random numbers as `count` spawn_square() calls."""
+        if count == 1:
+            self.spawn_square()
+            return
+        randrange = self.rng.randrange
+        xs = []
+        ys = []
+        for _ in range(count):
+            xs.append(randrange(0, SCREEN_WIDTH - SQUARE_SIZE))
+            ys.append(randrange(-100, -SQUARE_SIZE))
+        first = self.square_id_counter + 1
+        self.square_id_counter += count
+        self.squares.spawn_many(xs, ys, np.arange(first, first + count))
+
+    def step(self, paddle_move=0.0, rewind=0):
+        """
+        Advances the game by one tick, moving the paddle by `paddle_move` pixels first.
+        Nothing but the tick counter changes once the game is over.
+
+        A move made by a player who saw the game `rewind` ticks ago (at most
+        rewind_ticks) is lag compensated: the paddle at its new position
+        also catches the squares that passed through it during those ticks,
+        including ones that have since fallen off the bottom, whose lost
+        lives are given back.
+        """
+        self.tick += 1
+        if self.game_over:
+            return
+        rewind = min(rewind, self.rewind_ticks) if paddle_move else 0
+        if paddle_move and self.record:
+            if rewind:
+                self.input_log.append((self.tick, 'rewind', rewind))
+            self.input_log.append((self.tick, 'move', paddle_move))
+
+        self.spawn_countdown -= 1
+        if self.spawn_countdown <= 0:
+            self.spawn_countdown = self.spawn_interval_ticks
+            self.spawn_squares(self.spawn_count)
+
+        # Keep paddle within screen bounds
+        self.paddle_x = min(max(self.paddle_x + paddle_move, 0.0), float(SCREEN_WIDTH - PADDLE_WIDTH))
+
+        squares = self.squares
+        squares.move()
+        # Caught squares score a point, squares that fell off screen cost a life
+        self.score += sum(squares.catch_paddles([self.paddle_x], PADDLE_Y, PADDLE_WIDTH, PADDLE_HEIGHT))
+        if rewind:
+            self.catch_rewound(rewind)
+        if self.rewind_ticks:
+            xs, bases = squares.take_missed(SCREEN_HEIGHT)
+            self.missed.append((xs, bases) if len(xs) else None)
+            self.lives -= len(xs)
+        else:
+            self.lives -= squares.miss(SCREEN_HEIGHT)
+
+        if self.lives <= 0:
+            self.game_over = True
+
+    def catch_rewound(self, rewind):
+        """
+        Catches, at the paddle's current position, every square that overlapped
+        it at some point in the last `rewind` ticks. Squares fall in straight
+        lines, so those are the ones now in the paddle's band stretched down
+        by `rewind` ticks of falling.
+        """
+        height = PADDLE_HEIGHT + rewind * self.fall_step
+        caught = self.squares.catch(self.paddle_x, PADDLE_Y, PADDLE_WIDTH, height)
+        self.score += caught
+        self.rewind_catches += caught
+        # Missed squares keep their base y, so base + offset is where they would be now
+        top = PADDLE_Y - SQUARE_SIZE - self.squares.offset
+        bottom = PADDLE_Y + height - self.squares.offset
+        left = self.paddle_x
+        for i, entry in enumerate(self.missed):
+            if entry is None:
+                continue
+            xs, bases = entry
+            hit = ((bases > top) & (bases < bottom) & (xs < left + PADDLE_WIDTH) & (xs + SQUARE_SIZE > left))
+            caught = int(np.count_nonzero(hit))
+            if caught:
+                self.missed[i] = (xs[~hit], bases[~hit]) if caught < len(xs) else None
+                self.score += caught
+                self.lives += caught
+                self.rewind_catches += caught
+
+    def rewind_stats(self):
+        """Returns the lag compensation window and the size of the missed square history."""
+        entries = [entry for entry in list(self.missed) if entry is not None]
+        return {'window_ticks': self.rewind_ticks,
+                'squares': sum(len(xs) for xs, _ in entries),
+                'bytes': sum(xs.nbytes + bases.nbytes for xs, bases in entries),
+                'rewind_catches': self.rewind_catches}
+
+    def snapshot(self):
+        """
+        Returns the whole running game as compact bytes: settings, tick,
+        paddle, score, lives, spawn timer, square id counter, RNG state, every
+        square and the missed square history. The input log is not included.
+        """
+        version, words, gauss_next = self.rng.getstate()
+        xs, bases, ids = self.squares.live()
+        missed = [entry or (EMPTY, EMPTY) for entry in self.missed]
+        counts = np.array([len(missed_xs) for missed_xs, _ in missed], dtype=np.uint32)
+        return b''.join((
+            SNAPSHOT.pack(SNAPSHOT_VERSION, self.tick_rate, self.seed, self.spawn_interval_ticks,
+                          self.spawn_count, self.initial_lives, self.rewind_ticks, self.tick,
+                          self.paddle_x, self.score, self.lives, self.game_over, self.spawn_countdown,
+                          self.square_id_counter, self.squares.offset, len(xs)),
+            RNG_STATE.pack(version, *words, gauss_next is not None, gauss_next or 0.0),
+            xs.tobytes(), bases.tobytes(), ids.tobytes(),
+            struct.pack('<I', len(counts)), counts.tobytes(),
+            *(missed_xs.tobytes() for missed_xs, _ in missed),
+            *(missed_bases.tobytes() for _, missed_bases in missed)))
+
+    def restore(self, snapshot):
+        """Puts the game back exactly as it was when `snapshot` was taken, settings and seed included."""
+        (version, tick_rate, self.seed, self.spawn_interval_ticks, self.spawn_count, self.initial_lives,
+         rewind_ticks, self.tick, self.paddle_x, self.score, self.lives, self.game_over, self.spawn_countdown,
+         self.square_id_counter, offset, count) = SNAPSHOT.unpack_from(snapshot)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported snapshot version {version}")
+        if rewind_ticks != self.rewind_ticks:
+            self.rewind_ticks = rewind_ticks
+            self.missed = deque(maxlen=rewind_ticks)
+        if tick_rate != self.tick_rate:
+            self.tick_rate = tick_rate
+            self.fall_step = self.squares.speed = FALL_SPEED / tick_rate
+        rng_version, *words, has_gauss, gauss_next = RNG_STATE.unpack_from(snapshot, SNAPSHOT.size)
+        self.rng.setstate((rng_version, tuple(words), gauss_next if has_gauss else None))
+        pos = SNAPSHOT.size + RNG_STATE.size
+        self.squares.load(np.frombuffer(snapshot, np.float64, count, pos),
+                          np.frombuffer(snapshot, np.float64, count, pos + 8 * count),
+                          np.frombuffer(snapshot, np.int64, count, pos + 16 * count), offset)
+        pos += 24 * count
+        ticks, = struct.unpack_from('<I', snapshot, pos)
+        counts = np.frombuffer(snapshot, np.uint32, ticks, pos + 4).tolist()
+        xs_pos = pos + 4 + 4 * ticks
+        bases_pos = xs_pos + 8 * sum(counts)
+        self.missed.clear()
+        for n in counts:
+            self.missed.append((np.frombuffer(snapshot, np.float64, n, xs_pos).copy(),
+                                np.frombuffer(snapshot, np.float64, n, bases_pos).copy()) if n else None)
+            xs_pos += 8 * n
+            bases_pos += 8 * n
+
+    @classmethod
+    def from_snapshot(cls, snapshot, record=True):
+        """Returns a new GameState restored from `snapshot`."""
+        tick_rate, seed = SNAPSHOT.unpack_from(snapshot)[1:3]
+        state = cls(tick_rate, seed, record)
+        state.restore(snapshot)
+        return state
+
+    def recording(self):
+        """Returns everything needed to replay this game up to the current tick, as plain data."""
+        return {
+            'tick_rate': self.tick_rate,
+            'seed': self.seed,
+            'spawn_interval': self.spawn_interval_ticks / self.tick_rate,
+            'spawn_count': self.spawn_count,
+            'initial_lives': self.initial_lives,
+            'rewind_window': self.rewind_ticks / self.tick_rate,
+            'ticks': self.tick,
+            'inputs': [list(entry) for entry in self.input_log],
+            'final': {'score': self.score, 'lives': self.lives, 'game_over': self.game_over},
+        }
+
+    def to_client_state(self):
+        """Returns the JSON-ready dictionary sent to web clients."""
+        return {
+            'tick': self.tick,
+            'paddle_x': int(self.paddle_x),
+            'squares': self.squares.to_client_list(),
+            'score': self.score,
+            'lives': self.lives,
+            'game_over': self.game_over
+        }
+
+    def to_client_frame(self):
+        """
+        Returns the binary state message sent to web clients (see CLIENT_FRAME):
+        a fixed header and three packed arrays, so serializing tens of
+        thousands of squares costs a few array copies.
+        """
+        xs, ys = self.squares.positions()
+        header = CLIENT_FRAME.pack(STATE_FRAME, self.tick & 0xffffffff, int(self.paddle_x),
+                                   self.score, self.lives, self.game_over, len(xs))
+        return b''.join((header, xs.astype('<i2').tobytes(), ys.astype('<i2').tobytes(),
+                         self.squares.ids().astype('<u4').tobytes()))
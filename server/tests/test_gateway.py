@@ -0,0 +1,226 @@
+"""
+Round-trip tests for the shared memory protocol between the simulation and
+gateway processes (gateway.py): frame ring, input ring, record encoding and
+the gateway side's membership backlog and control coalescing.
+
+Usage (from the server directory):
+    python -m unittest discover tests
+"""
+import contextlib
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gateway import (
+    CONTROL, INPUT_ROOM_BYTES, JOIN, LEAVE, RESTART, ROOM_COUNT, ROOM_FRAME, ROOM_NAME, FrameRing, GatewayLink,
+    GatewayRooms, InputRing, decode_frames, encode_record,
+)
+from rooms import DEFAULT_ROOM, MAX_ROOM_NAME, TICK_MODULUS, RoomManager, clean_room_name
+
+
+class SharedMemoryTestCase(unittest.TestCase):
+    """Closes (and unlinks) the rings a test created, even when it fails."""
+    def ring(self, ring_class, **sizes):
+        """Returns (writer, reader): a new ring and a second attachment to it."""
+        ring = ring_class.create(**sizes)
+        other = ring_class.attach(ring.name, **sizes)
+        self.addCleanup(ring.close, unlink=True)
+        self.addCleanup(other.close)
+        return ring, other
+
+
+class FrameRingTest(SharedMemoryTestCase):
+    def test_round_trip(self):
+        writer, reader = self.ring(FrameRing, slots=4, slot_bytes=4096)
+        self.assertIsNone(reader.read())
+        frames = {'default': b'\x01frame', 'café': bytes(range(256))}
+        writer.write(frames)
+        self.assertEqual(reader.read(), frames)
+        self.assertIsNone(reader.read()) # Nothing new since
+        writer.write({})
+        self.assertEqual(reader.read(), {})
+
+    def test_wraparound(self):
+        writer, reader = self.ring(FrameRing, slots=3, slot_bytes=256)
+        for sequence in range(1, 11):
+            writer.write({'room': sequence.to_bytes(4, 'little')})
+            if sequence % 2:
+                self.assertEqual(reader.read(), {'room': sequence.to_bytes(4, 'little')})
+        # A reader that fell more than a ring behind still gets the newest frame
+        self.assertEqual(reader.read(), {'room': (10).to_bytes(4, 'little')})
+        self.assertEqual(writer.stats(), {'frames': 10, 'truncated': 0})
+
+    def test_full_slot_rotates_rooms_left_out(self):
+        writer, reader = self.ring(FrameRing, slots=2, slot_bytes=1000)
+        frames = {name: name.encode() * 200 for name in ('r1', 'r2', 'r3')} # Two fit in a slot
+        published = {name: 0 for name in frames}
+        for _ in range(6):
+            with contextlib.redirect_stdout(io.StringIO()):
+                writer.write(frames)
+            for name in reader.read():
+                published[name] += 1
+        self.assertEqual(writer.stats()['truncated'], 6)
+        self.assertEqual(published, {'r1': 4, 'r2': 4, 'r3': 4})
+
+    def test_room_too_large_for_a_slot(self):
+        writer, reader = self.ring(FrameRing, slots=2, slot_bytes=100)
+        for _ in range(3):
+            with contextlib.redirect_stdout(io.StringIO()) as report:
+                writer.write({'big': bytes(200), 'small': b'x'})
+            self.assertEqual(reader.read(), {'small': b'x'})
+        self.assertEqual(report.getvalue(), '') # Reported on the first write only
+
+    def test_decode_frames(self):
+        payload = bytearray(ROOM_COUNT.pack(2))
+        for name, frame in (('a', b'12'), ('bé', b'')):
+            encoded = name.encode('utf-8')
+            payload += ROOM_NAME.pack(len(encoded)) + encoded + ROOM_FRAME.pack(len(frame)) + frame
+        self.assertEqual(decode_frames(bytes(payload)), {'a': b'12', 'bé': b''})
+        self.assertEqual(decode_frames(ROOM_COUNT.pack(0)), {})
+
+
+class InputRingTest(SharedMemoryTestCase):
+    def test_round_trip(self):
+        gateway, simulation = self.ring(InputRing, capacity=8)
+        self.assertTrue(gateway.push(encode_record(JOIN, 1, 'café')))
+        self.assertTrue(gateway.push(encode_record(CONTROL, 1, '', 3, 65535, TICK_MODULUS + 5)))
+        self.assertTrue(gateway.push(encode_record(CONTROL, 1, lefts=1)))
+        self.assertTrue(gateway.push(encode_record(RESTART, 0, 'café')))
+        self.assertTrue(gateway.push(encode_record(LEAVE, 1)))
+        self.assertEqual(simulation.drain(), [
+            (JOIN, 1, 'café', 0, 0, None),
+            (CONTROL, 1, '', 3, 65535, 5),
+            (CONTROL, 1, '', 1, 0, None),
+            (RESTART, 0, 'café', 0, 0, None),
+            (LEAVE, 1, '', 0, 0, None),
+        ])
+        self.assertEqual(simulation.drain(), [])
+        self.assertEqual(simulation.stats(), {'received': 5, 'depth': 0})
+
+    def test_full_ring_refuses_records(self):
+        gateway, simulation = self.ring(InputRing, capacity=4)
+        for client in range(4):
+            self.assertTrue(gateway.push(encode_record(JOIN, client, 'room')))
+        self.assertFalse(gateway.push(encode_record(JOIN, 4, 'room')))
+        self.assertEqual(gateway.stats(), {'received': 4, 'depth': 4})
+        self.assertEqual([record[1] for record in simulation.drain()], [0, 1, 2, 3])
+        self.assertTrue(gateway.push(encode_record(JOIN, 4, 'room')))
+
+    def test_wraparound(self):
+        gateway, simulation = self.ring(InputRing, capacity=3)
+        received = []
+        for client in range(10):
+            self.assertTrue(gateway.push(encode_record(LEAVE, client)))
+            if client % 2:
+                received += [record[1] for record in simulation.drain()]
+        self.assertEqual(received, list(range(10)))
+
+    def test_records_that_cannot_be_packed(self):
+        for room in ('\ud800', 'x' * (INPUT_ROOM_BYTES + 1), 'é' * (INPUT_ROOM_BYTES // 2 + 1)):
+            with self.assertRaises(ValueError):
+                encode_record(JOIN, 1, room)
+        with self.assertRaises(ValueError):
+            encode_record(CONTROL, 1, lefts=1 << 16) # Counts are 16-bit
+        self.assertEqual(len(encode_record(JOIN, 1, 'x' * INPUT_ROOM_BYTES)), len(encode_record(LEAVE, 1)))
+
+    def test_clean_room_names_always_pack(self):
+        for name in ('\ud800', 'a\udfffb', '𝄞' * 100, None):
+            encode_record(JOIN, 1, clean_room_name(name))
+        self.assertEqual(clean_room_name('\ud800'), '?')
+        self.assertEqual(len(clean_room_name('𝄞' * 100)), MAX_ROOM_NAME)
+
+
+class GatewayRoomsTest(SharedMemoryTestCase):
+    def setUp(self):
+        frames, _ = self.ring(FrameRing, slots=2, slot_bytes=256)
+        self.ring_capacity = 4
+        gateway_ring, self.simulation = self.ring(InputRing, capacity=self.ring_capacity)
+        self.rooms = GatewayRooms(frames, gateway_ring)
+
+    def test_membership_waits_in_backlog(self):
+        clients = [object() for _ in range(self.ring_capacity + 2)]
+        for client in clients:
+            self.rooms.join(client, 'room')
+        self.assertEqual(len(self.rooms.backlog), 2)
+        self.rooms.push_control(clients[0], 'left')
+        self.rooms.flush()
+        self.assertEqual(len(self.rooms.controls), 1) # Held back until the joins are through
+
+        records = self.simulation.drain()
+        self.rooms.flush()
+        records += self.simulation.drain()
+        self.assertEqual([record[0] for record in records], [JOIN] * len(clients) + [CONTROL])
+        self.assertEqual([record[1] for record in records[:-1]], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(records[-1], (CONTROL, 1, '', 1, 0, None))
+        self.assertFalse(self.rooms.backlog)
+
+    def test_controls_coalesce_per_flush(self):
+        client = object()
+        self.rooms.join(client, DEFAULT_ROOM)
+        for direction in ('left', 'left', 'right', 'up', 'left'):
+            self.rooms.push_control(client, direction, 7)
+        self.rooms.push_control(object(), 'left') # Not a member
+        self.rooms.flush()
+        self.assertEqual(self.simulation.drain(),
+                         [(JOIN, 1, DEFAULT_ROOM, 0, 0, None), (CONTROL, 1, '', 3, 1, 7)])
+        self.rooms.flush()
+        self.assertEqual(self.simulation.drain(), [])
+
+    def test_leave_discards_pending_controls(self):
+        client = object()
+        room = self.rooms.join(client, 'room')
+        self.rooms.push_control(client, 'right')
+        self.rooms.leave(client, room)
+        self.rooms.flush()
+        self.assertEqual([record[0] for record in self.simulation.drain()], [JOIN, LEAVE])
+        self.assertIsNone(self.rooms.get('room')) # Emptied rooms are dropped, bar the default one
+
+    def test_unpackable_join_changes_nothing(self):
+        client = object()
+        with self.assertRaises(ValueError):
+            self.rooms.join(client, '\ud800')
+        self.assertFalse(self.rooms.backlog)
+        self.assertNotIn(client, self.rooms.client_ids)
+        self.assertIsNone(self.rooms.get('\ud800'))
+        self.rooms.join(object(), 'room') # Later clients are unaffected
+        self.assertEqual(self.simulation.drain(), [(JOIN, 1, 'room', 0, 0, None)])
+
+
+class GatewayLinkTest(unittest.TestCase):
+    def setUp(self):
+        self.rooms = RoomManager()
+        self.link = GatewayLink(self.rooms, 1)
+        self.addCleanup(self.link.close)
+        frame_name, input_name = self.link.names(0)
+        self.gateway = GatewayRooms(FrameRing.attach(frame_name), InputRing.attach(input_name))
+        self.addCleanup(self.gateway.frame_ring.close)
+        self.addCleanup(self.gateway.input_ring.close)
+
+    def test_events_reach_the_simulation_and_frames_come_back(self):
+        client = object()
+        self.gateway.join(client, 'room')
+        for _ in range(3):
+            self.gateway.push_control(client, 'left')
+        self.gateway.flush()
+        self.link.apply_inputs()
+        room = self.rooms.get('room')
+        self.assertEqual(room.clients, {(0, 1)})
+        paddle = room.state.paddle_x
+        room.step(1)
+        self.assertLess(room.state.paddle_x, paddle)
+
+        self.link.publish()
+        self.gateway.snapshot()
+        self.assertEqual(self.gateway.get('room').client_message(), room.client_message())
+
+        self.gateway.leave(client, self.gateway.get('room'))
+        self.link.apply_inputs()
+        self.assertEqual(room.clients, set())
+        self.assertEqual(self.link.members, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,8 +15,20 @@ const CLIENT_DISPLAY_HEIGHT = 240;
 const SERVER_SCREEN_WIDTH = 800;
 const SERVER_SCREEN_HEIGHT = 600;
 
+// Binary state frames (see CLIENT_FRAME in server/simulation.py): a 28-byte
+// header followed by the squares' int16 x, int16 y and uint32 id arrays
+const STATE_FRAME = 1;
+const FRAME_HEADER_SIZE = 28;
+
 // --- DOM Elements ---
 let socket;
+// URL currently connected to: a sharded server's router redirects clients to
+// the worker process that owns their room
+let serverUrl = WS_SERVER_URL;
+let redirected = false;
+// Tick of the latest state frame shown, sent with controls so the server can
+// compensate for the time it took to reach us and for the control to get back
+let lastTick = null;
 const statusDiv = document.getElementById('status');
 const scoreSpan = document.getElementById('score');
 const livesSpan = document.getElementById('lives');
@@ -24,6 +36,7 @@ const paddleElement = document.getElementById('paddle');
 const squaresContainer = document.getElementById('squares-container');
 const gameOverlay = document.getElementById('game-overlay');
 const overlayText = gameOverlay.querySelector('p:last-child'); // The message below "GAME OVER!"
+const restartButton = document.getElementById('restartButton');
 
 // --- WebSocket Connection Logic ---
 function connectWebSocket() {
@@ -34,20 +47,44 @@ function connectWebSocket() {
 
     statusDiv.textContent = 'Connecting...';
     // Attempt to connect to the WebSocket server
-    socket = new WebSocket(WS_SERVER_URL);
+    socket = new WebSocket(serverUrl);
+    socket.binaryType = 'arraybuffer'; // Game state arrives as binary frames
 
     socket.onopen = (event) => {
         statusDiv.textContent = 'Connected to game server.';
+        lastTick = null; // Ticks are per room
         gameOverlay.classList.add('hidden'); // Hide overlay on connect
         console.log('WebSocket opened:', event);
     };
 
     socket.onmessage = (event) => {
-        const gameState = JSON.parse(event.data);
-        updateGameDisplay(gameState);
+        if (event.data instanceof ArrayBuffer) {
+            const gameState = decodeStateFrame(event.data);
+            if (gameState) {
+                lastTick = gameState.tick;
+                updateGameDisplay(gameState);
+            }
+            return;
+        }
+        const message = JSON.parse(event.data);
+        if (message.type === 'redirect') {
+            // Reconnect straight away to the worker that owns our room
+            serverUrl = message.url;
+            redirected = true;
+            socket.close();
+            return;
+        }
+        // Game state only arrives as binary frames; ignore any other JSON message
+        console.warn('Ignoring unexpected message:', message.type);
     };
 
     socket.onclose = (event) => {
+        if (redirected) {
+            redirected = false;
+            connectWebSocket();
+            return;
+        }
+        serverUrl = WS_SERVER_URL; // Go back through the router in case the worker went away
         statusDiv.textContent = `Disconnected. Code: ${event.code}. Reason: ${event.reason || 'Unknown'}. Retrying...`;
         gameOverlay.classList.remove('hidden'); // Show overlay on disconnect
         overlayText.textContent = 'Disconnected. Retrying...';
@@ -68,14 +105,42 @@ function connectWebSocket() {
 // --- Send Control Input to Server ---
 function sendControl(direction) {
     if (socket && socket.readyState === WebSocket.OPEN) {
-        // Send a JSON message with the control type and direction
-        socket.send(JSON.stringify({ type: 'control', direction: direction }));
+        // Send a JSON message with the control type, direction and the tick we were looking at
+        socket.send(JSON.stringify({ type: 'control', direction: direction, tick: lastTick }));
     } else {
         console.warn('WebSocket not open. Cannot send control:', direction);
         statusDiv.textContent = 'Not connected. Trying to reconnect...';
     }
 }
 
+// --- Ask the Server for a New Match (once the game is over) ---
+function sendRestart() {
+    if (socket && socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({ type: 'restart' }));
+    }
+}
+
+// --- Decode a Binary State Frame ---
+function decodeStateFrame(buffer) {
+    const view = new DataView(buffer);
+    if (buffer.byteLength < FRAME_HEADER_SIZE || view.getUint8(0) !== STATE_FRAME) {
+        return null;
+    }
+    const count = view.getUint32(24, true);
+    // Copy the arrays out: typed array views need aligned offsets
+    const bytes = new Uint8Array(buffer, FRAME_HEADER_SIZE);
+    return {
+        tick: view.getUint32(1, true),
+        paddle_x: view.getInt16(5, true),
+        score: view.getFloat64(7, true),
+        lives: view.getFloat64(15, true),
+        game_over: view.getUint8(23) !== 0,
+        xs: new Int16Array(bytes.slice(0, 2 * count).buffer),
+        ys: new Int16Array(bytes.slice(2 * count, 4 * count).buffer),
+        ids: new Uint32Array(bytes.slice(4 * count, 8 * count).buffer),
+    };
+}
+
 // --- Update Client Display Based on Server Game State ---
 function updateGameDisplay(gameState) {
     scoreSpan.textContent = gameState.score;
@@ -87,29 +152,29 @@ function updateGameDisplay(gameState) {
     const scaledPaddleX = (gameState.paddle_x / SERVER_SCREEN_WIDTH) * CLIENT_DISPLAY_WIDTH;
     paddleElement.style.left = `${scaledPaddleX}px`;
 
-    // Clear old squares from the display
-    squaresContainer.innerHTML = '';
-
-    // Add new squares based on the game state received from the server
-    gameState.squares.forEach(sq => {
+    // Build the new squares off-document and swap them in with one DOM update
+    const fragment = document.createDocumentFragment();
+    const scaleX = CLIENT_DISPLAY_WIDTH / SERVER_SCREEN_WIDTH;
+    const scaleY = CLIENT_DISPLAY_HEIGHT / SERVER_SCREEN_HEIGHT;
+    for (let i = 0; i < gameState.xs.length; i++) {
         const squareDiv = document.createElement('div');
         squareDiv.className = 'square';
 
         // Scale square X and Y coordinates to client's display dimensions
-        const scaledSquareX = (sq.x / SERVER_SCREEN_WIDTH) * CLIENT_DISPLAY_WIDTH;
-        const scaledSquareY = (sq.y / SERVER_SCREEN_HEIGHT) * CLIENT_DISPLAY_HEIGHT;
-
-        squareDiv.style.left = `${scaledSquareX}px`;
-        squareDiv.style.top = `${scaledSquareY}px`;
-        squaresContainer.appendChild(squareDiv);
-    });
+        squareDiv.style.left = `${gameState.xs[i] * scaleX}px`;
+        squareDiv.style.top = `${gameState.ys[i] * scaleY}px`;
+        fragment.appendChild(squareDiv);
+    }
+    squaresContainer.replaceChildren(fragment);
 
     // Show/hide game over overlay
     if (gameState.game_over) {
         gameOverlay.classList.remove('hidden');
-        overlayText.textContent = 'Press "R" on desktop server to restart';
+        overlayText.textContent = 'Press "R" or tap Restart to play again';
+        restartButton.classList.remove('hidden');
     } else {
         gameOverlay.classList.add('hidden');
+        restartButton.classList.add('hidden');
     }
 }
 
@@ -126,6 +191,14 @@ document.getElementById('rightButton').addEventListener('touchstart', (e) => {
     e.preventDefault(); // Prevent default touch behavior
     sendControl('right');
 });
+restartButton.addEventListener('click', sendRestart);
+
+// The server ignores restarts while a game is still running
+document.addEventListener('keydown', (e) => {
+    if (e.key === 'r' || e.key === 'R') {
+        sendRestart();
+    }
+});
 
 // Initial connection attempt when the script loads
 connectWebSocket();
\ No newline at end of file